@@ -0,0 +1,105 @@
+"""Latency, throughput, and peak memory of every /hdf endpoint
+
+Each case runs the same work as one request to the server (manager read,
+then json encoding), minus the http round trip. Run with:
+
+    python -m pytest benchmarks/bench_endpoints.py
+"""
+import tracemalloc
+import pytest
+from h5grove.encoders import orjson_encode
+from h5grove.models import LinkResolution
+
+from jupyterlab_hdf.util import jsonize
+
+pytest.importorskip("pytest_benchmark")
+
+
+def tile(side, size=100):
+    """ixstr/subixstr of a grid tile in the middle of a side x side dataset"""
+    start = side // 2
+    return dict((("ixstr", ":, :"), ("subixstr", f"{start}:{start + size}, {start}:{start + size}")))
+
+
+# (endpoint, file, uri, request params, resolve_links). `side` in a param is replaced by the size of the big datasets
+CASES = dict(
+    (
+        # attrs
+        ("attrs-many", ("attrs", "tree.h5", "/many_attrs", dict(), LinkResolution.NONE)),
+        ("attrs-one", ("attrs", "tree.h5", "/many_attrs", dict((("attr_keys", ["attr00001"]),)), LinkResolution.NONE)),
+        # contents
+        ("contents-wide", ("contents", "tree.h5", "/wide", dict(), LinkResolution.NONE)),
+        ("contents-deep", ("contents", "tree.h5", "/" + "/".join("level%02d" % i for i in range(64)), dict(), LinkResolution.NONE)),
+        ("contents-external-links", ("contents", "links.h5", "/external", dict(), LinkResolution.ONLY_VALID)),
+        ("contents-soft-links", ("contents", "links.h5", "/soft", dict(), LinkResolution.ONLY_VALID)),
+        # meta
+        ("meta-wide", ("meta", "tree.h5", "/wide", dict(), LinkResolution.NONE)),
+        ("meta-many-attrs", ("meta", "tree.h5", "/many_attrs", dict(), LinkResolution.NONE)),
+        ("meta-dataset", ("meta", "big.h5", "/gzip", dict((("ixstr", ":, :"),)), LinkResolution.NONE)),
+        ("meta-external-links", ("meta", "links.h5", "/external", dict(), LinkResolution.ONLY_VALID)),
+        # data
+        *(
+            (f"data-tile-{layout}", ("data", "big.h5", f"/{layout}", "tile", LinkResolution.NONE))
+            for layout in ("contiguous", "chunked", "gzip", "lzf", "rowchunked")
+        ),
+        ("data-slab-contiguous", ("data", "big.h5", "/contiguous", "slab", LinkResolution.NONE)),
+        ("data-slab-gzip", ("data", "big.h5", "/gzip", "slab", LinkResolution.NONE)),
+        ("data-rows", ("data", "big.h5", "/contiguous", dict((("ixstr", "0:64, :"),)), LinkResolution.NONE)),
+        ("data-rows-float32", ("data", "big.h5", "/contiguous", dict((("dtype", "float32"), ("ixstr", "0:64, :"))), LinkResolution.NONE)),
+        ("data-rows-precision", ("data", "big.h5", "/contiguous", dict((("ixstr", "0:64, :"), ("precision", 3))), LinkResolution.NONE)),
+        ("data-cube-plane", ("data", "big.h5", "/cube", dict((("ixstr", "0, :, :"),)), LinkResolution.NONE)),
+        ("data-compound", ("data", "dtypes.h5", "/compound", dict((("ixstr", "0:10000"),)), LinkResolution.NONE)),
+        ("data-compound-columnar", ("data", "dtypes.h5", "/compound", dict((("columnar", True), ("ixstr", "0:10000"))), LinkResolution.NONE)),
+        ("data-compound-fields", ("data", "dtypes.h5", "/compound", dict((("columnar", True), ("fields", ["id", "x"]), ("ixstr", "0:10000"))), LinkResolution.NONE)),
+        ("data-complex", ("data", "dtypes.h5", "/complex", dict((("ixstr", "0:10000"),)), LinkResolution.NONE)),
+        ("data-complex-planes", ("data", "dtypes.h5", "/complex", dict((("columnar", True), ("ixstr", "0:10000"))), LinkResolution.NONE)),
+        ("data-fixed-strings", ("data", "dtypes.h5", "/fixed_strings", dict((("ixstr", "0:10000"),)), LinkResolution.NONE)),
+        ("data-vlen-strings", ("data", "dtypes.h5", "/vlen_strings", dict((("ixstr", "0:10000"),)), LinkResolution.NONE)),
+        ("data-fixed-utf8", ("data", "dtypes.h5", "/fixed_utf8", dict((("ixstr", "0:10000"),)), LinkResolution.NONE)),
+        ("data-vlen-utf8", ("data", "dtypes.h5", "/vlen_utf8", dict((("ixstr", "0:10000"),)), LinkResolution.NONE)),
+        ("data-fixed-utf8-packed", ("data", "dtypes.h5", "/fixed_utf8", dict((("fmt", "binary"), ("ixstr", "0:10000"))), LinkResolution.NONE)),
+        ("data-vlen-utf8-packed", ("data", "dtypes.h5", "/vlen_utf8", dict((("fmt", "binary"), ("ixstr", "0:10000"))), LinkResolution.NONE)),
+        # snippet
+        ("snippet-dataset", ("snippet", "big.h5", "/gzip", dict((("ixstr", "0, :"),)), LinkResolution.NONE)),
+        # storage
+        ("storage-gzip", ("storage", "big.h5", "/gzip", dict(), LinkResolution.NONE)),
+        ("storage-rowchunked", ("storage", "big.h5", "/rowchunked", dict(), LinkResolution.NONE)),
+    )
+)
+
+
+def resolveParams(params, side):
+    if params == "tile":
+        return tile(side)
+    if params == "slab":
+        # the first eighth of the rows, ie 1/8 of a GiB at full scale
+        return dict((("ixstr", f"0:{max(1, side // 8)}, :"),))
+    return params
+
+
+def serve(manager, fpath, uri, params):
+    """Everything a request does, short of http"""
+    result = manager.get(fpath, uri, **params)
+    # binary (fmt="binary") results are sent as they are
+    return result if isinstance(result, bytes) else orjson_encode(result, default=jsonize)
+
+
+@pytest.mark.parametrize("case", CASES.keys())
+def test_endpoint(benchmark, managers, benchSide, case):
+    endpoint, fpath, uri, params, resolve = CASES[case]
+    manager = managers[(endpoint, resolve)]
+    params = resolveParams(params, benchSide)
+
+    # measure peak memory on a separate run, since tracemalloc slows everything down
+    tracemalloc.start()
+    try:
+        nbytes = len(serve(manager, fpath, uri, params))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    benchmark.group = endpoint
+    benchmark.extra_info["output_bytes"] = nbytes
+    benchmark.extra_info["peak_bytes"] = peak
+    benchmark(serve, manager, fpath, uri, params)
+    benchmark.extra_info["throughput_bytes_per_s"] = nbytes / benchmark.stats.stats.mean
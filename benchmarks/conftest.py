@@ -0,0 +1,58 @@
+"""Fixtures for the jupyterlab_hdf benchmarks
+
+Configured through env vars:
+    JHDF_BENCH_SCALE: size of the generated files. 1 means GB-scale datasets
+        and a 100k-child group. Defaults to 0.01
+    JHDF_BENCH_DIR: where to generate (and cache) the fixture files.
+        Defaults to a fresh temp dir
+"""
+import logging
+import os
+import sys
+import pytest
+from h5grove.models import LinkResolution
+
+sys.path.insert(0, os.path.dirname(__file__))
+from genFixtures import bigSide, genFixtures  # noqa: E402
+
+from jupyterlab_hdf.attrs import HdfAttrsManager  # noqa: E402
+from jupyterlab_hdf.contents import HdfContentsManager  # noqa: E402
+from jupyterlab_hdf.data import HdfDataManager  # noqa: E402
+from jupyterlab_hdf.meta import HdfMetaManager  # noqa: E402
+from jupyterlab_hdf.snippet import HdfSnippetManager  # noqa: E402
+from jupyterlab_hdf.storage import HdfStorageManager  # noqa: E402
+
+MANAGERS = dict(
+    (
+        ("attrs", HdfAttrsManager),
+        ("contents", HdfContentsManager),
+        ("data", HdfDataManager),
+        ("meta", HdfMetaManager),
+        ("snippet", HdfSnippetManager),
+        ("storage", HdfStorageManager),
+    )
+)
+
+
+@pytest.fixture(scope="session")
+def benchScale():
+    return float(os.environ.get("JHDF_BENCH_SCALE", 0.01))
+
+
+@pytest.fixture(scope="session")
+def benchSide(benchScale):
+    """Side length of the big square datasets"""
+    return bigSide(benchScale)
+
+
+@pytest.fixture(scope="session")
+def fixtureDir(benchScale, tmp_path_factory):
+    outdir = os.environ.get("JHDF_BENCH_DIR") or tmp_path_factory.mktemp("jhdf-bench")
+    return str(genFixtures(outdir, benchScale))
+
+
+@pytest.fixture(scope="session")
+def managers(fixtureDir):
+    """Managers for every endpoint, keyed by (endpoint, resolve_links)"""
+    log = logging.getLogger("jhdf-bench")
+    return {(ep, resolve): cls(log=log, notebook_dir=fixtureDir, resolve_links=resolve) for ep, cls in MANAGERS.items() for resolve in LinkResolution}
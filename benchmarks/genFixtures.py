@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""Generate realistic (and, at full scale, very large) HDF5 files for
+benchmarking the jupyterlab_hdf endpoints.
+
+Usage: python genFixtures.py OUTDIR [SCALE]
+
+At SCALE=1 the big datasets are ~1 GiB each and the wide group has 100k
+children. The default SCALE=0.01 makes files that generate in seconds.
+"""
+import h5py
+import numpy as np
+import sys
+from pathlib import Path
+
+# bump this whenever the generated files change, so that cached fixtures get rebuilt
+FIXTURE_VERSION = 2
+
+# the names of the generated files, relative to the fixture dir
+FIXTURE_FILES = dict(
+    (
+        ("big", "big.h5"),
+        ("dtypes", "dtypes.h5"),
+        ("links", "links.h5"),
+        ("links_target", "links_target.h5"),
+        ("tree", "tree.h5"),
+    )
+)
+
+
+def scaled(n, scale, nmin=1):
+    return max(nmin, int(n * scale))
+
+
+def bigSide(scale):
+    """Side length of a square float64 dataset of scale GiB"""
+    return scaled(np.sqrt(2 ** 30 / 8), np.sqrt(scale), nmin=256)
+
+
+def genTree(fpath, scale):
+    """A 100k-child group, a deep hierarchy, and an object with many attributes"""
+    with h5py.File(fpath, "w") as f:
+        wide = f.create_group("wide")
+        for i in range(scaled(100000, scale, nmin=100)):
+            # mix of small datasets and empty groups, like a per-sample layout
+            if i % 2:
+                wide.create_group("g%06d" % i)
+            else:
+                wide.create_dataset("d%06d" % i, data=np.arange(4, dtype=np.float32))
+
+        group = f
+        for i in range(64):
+            group = group.create_group("level%02d" % i)
+        group.create_dataset("leaf", data=np.arange(100, dtype=np.int64))
+
+        attrs = f.create_group("many_attrs")
+        for i in range(scaled(5000, scale, nmin=100)):
+            attrs.attrs["attr%05d" % i] = np.arange(i % 8, dtype=np.float64) if i % 3 else "value %d" % i
+
+
+def genBig(fpath, scale):
+    """Large 2D float64 datasets with every common storage layout"""
+    n = bigSide(scale)
+    layouts = dict(
+        (
+            ("contiguous", dict()),
+            ("chunked", dict((("chunks", (256, 256)),))),
+            ("gzip", dict((("chunks", (256, 256)), ("compression", "gzip"), ("shuffle", True)))),
+            ("lzf", dict((("chunks", (256, 256)), ("compression", "lzf")))),
+            # the kind of chunking users should avoid: one row per chunk
+            ("rowchunked", dict((("chunks", (1, n)),))),
+        )
+    )
+
+    cols = np.arange(n, dtype=np.float64)
+    with h5py.File(fpath, "w") as f:
+        for name, kwargs in layouts.items():
+            dset = f.create_dataset(name, shape=(n, n), dtype=np.float64, **kwargs)
+            # write in row blocks, so that generating GB-scale files doesn't need GBs of ram
+            for start in range(0, n, 1024):
+                stop = min(n, start + 1024)
+                rows = np.arange(start, stop, dtype=np.float64)[:, None]
+                dset[start:stop] = np.sin(rows * 0.01) * np.cos(cols * 0.02) * 1000 + rows
+
+        f.create_dataset("cube", data=np.arange(scaled(64, scale ** (1 / 3), nmin=8) ** 3, dtype=np.int32).reshape((scaled(64, scale ** (1 / 3), nmin=8),) * 3))
+
+
+def genDtypes(fpath, scale):
+    """Compound, complex, and string datasets"""
+    n = scaled(1000000, scale, nmin=1000)
+    with h5py.File(fpath, "w") as f:
+        compound = np.zeros(n, dtype=[("id", "<i8"), ("x", "<f8"), ("y", "<f4"), ("flag", "?"), ("label", "S16")])
+        compound["id"] = np.arange(n)
+        compound["x"] = np.linspace(0, 1, n)
+        compound["y"] = np.linspace(1, 0, n)
+        compound["flag"] = np.arange(n) % 2
+        compound["label"] = np.char.add(b"sample_", np.arange(n).astype("S9"))
+        f.create_dataset("compound", data=compound, chunks=True)
+
+        f.create_dataset("complex", data=np.exp(1j * np.linspace(0, 100, n)).astype(np.complex128))
+
+        labels = np.char.add("sample_", np.arange(n).astype("U9"))
+        f.create_dataset("fixed_strings", data=np.char.encode(labels, "utf-8"))
+        f.create_dataset("vlen_strings", data=labels.astype(object), dtype=h5py.string_dtype("utf-8"))
+
+        # same, with non-ascii text
+        labels = np.char.add("échantillon_", np.arange(n).astype("U9"))
+        encoded = np.char.encode(labels, "utf-8")
+        f.create_dataset("fixed_utf8", data=encoded.astype(h5py.string_dtype("utf-8", encoded.dtype.itemsize)))
+        f.create_dataset("vlen_utf8", data=labels.astype(object), dtype=h5py.string_dtype("utf-8"))
+
+
+def genLinks(fpath, targetFpath, scale):
+    """A group full of external links (like a per-run index file), plus soft links"""
+    with h5py.File(targetFpath, "w") as f:
+        runs = f.create_group("runs")
+        for i in range(100):
+            runs.create_dataset("run%03d" % i, data=np.arange(10, dtype=np.float64))
+
+    with h5py.File(fpath, "w") as f:
+        f.create_dataset("data", data=np.arange(10, dtype=np.float64))
+        external = f.create_group("external")
+        soft = f.create_group("soft")
+        for i in range(scaled(10000, scale, nmin=100)):
+            external["run%05d" % i] = h5py.ExternalLink(Path(targetFpath).name, "/runs/run%03d" % (i % 100))
+            soft["run%05d" % i] = h5py.SoftLink("/data")
+        external["broken"] = h5py.ExternalLink("does_not_exist.h5", "/data")
+
+
+def genFixtures(outdir, scale=0.01):
+    """Generate every fixture file in outdir. Files generated by an earlier
+    run with the same scale and FIXTURE_VERSION are reused
+    """
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    stamp = outdir / ".fixtures"
+    stampText = f"{FIXTURE_VERSION} {scale}"
+    if stamp.exists() and stamp.read_text() == stampText and all((outdir / f).exists() for f in FIXTURE_FILES.values()):
+        return outdir
+
+    genTree(outdir / FIXTURE_FILES["tree"], scale)
+    genBig(outdir / FIXTURE_FILES["big"], scale)
+    genDtypes(outdir / FIXTURE_FILES["dtypes"], scale)
+    genLinks(outdir / FIXTURE_FILES["links"], outdir / FIXTURE_FILES["links_target"], scale)
+    stamp.write_text(stampText)
+    return outdir
+
+
+if __name__ == "__main__":
+    genFixtures(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else 0.01)
@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+"""Concurrent load test of a live jupyterlab_hdf server, simulating users
+scrolling through datasets in the grid viewer.
+
+Starts a notebook server with the extension enabled against the generated
+fixture files (or points at an already running server with --url), then
+replays scroll patterns for many concurrent users. Each simulated user
+behaves like the frontend's DatasetModel: it opens a dataset with a meta
+request, then fetches the 100x100 blocks that come into view as it scrolls,
+caching every block it has already seen. Runs entirely offline.
+
+Usage: python loadtest.py [--users 16] [--duration 30] [--pattern mixed] ...
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+import numpy as np
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+
+sys.path.insert(0, os.path.dirname(__file__))
+from genFixtures import FIXTURE_FILES, bigSide, genFixtures  # noqa: E402
+
+BLOCK_SIZE = 100
+DATASETS = ("chunked", "contiguous", "gzip", "lzf", "rowchunked")
+
+# how each pattern moves the viewport. rows and cols are in blocks, think is the pause between moves in seconds
+PATTERNS = dict(
+    (
+        # steady reading, one block row at a time
+        ("scroll", dict((("rows", 1), ("cols", 0), ("think", 0.25)))),
+        # fast flicks of the scroll wheel, which leave lots of requests for blocks that have already scrolled past
+        ("fling", dict((("rows", 5), ("cols", 0), ("think", 0.016)))),
+        # diagonal panning
+        ("pan", dict((("rows", 1), ("cols", 1), ("think", 0.1)))),
+        # dragging the scrollbar to random places
+        ("jump", dict((("rows", None), ("cols", None), ("think", 0.5)))),
+    )
+)
+
+
+def percentile(vals, q):
+    return float(np.percentile(vals, q)) if len(vals) else float("nan")
+
+
+def freePort():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rssBytes(pid):
+    """Resident set size of a process, from /proc"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class Server:
+    """A notebook server with jupyterlab_hdf enabled, running in a subprocess"""
+
+    def __init__(self, rootDir, hdfConfig=None, port=None):
+        self.rootDir = rootDir
+        self.hdfConfig = hdfConfig or dict()
+        self.port = port or freePort()
+        self.token = "jhdf-loadtest"
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.proc = None
+
+    def start(self, timeout=60):
+        self.tmp = tempfile.TemporaryDirectory(prefix="jhdf-loadtest-")
+        cfgPath = os.path.join(self.tmp.name, "jupyter_notebook_config.py")
+        with open(cfgPath, "w") as f:
+            f.write("c.NotebookApp.nbserver_extensions = {'jupyterlab_hdf': True}\n")
+            for key, val in self.hdfConfig.items():
+                f.write(f"c.HdfConfig.{key} = {val!r}\n")
+
+        # keep the user's own jupyter config out of the measurements
+        env = dict(os.environ, JUPYTER_CONFIG_DIR=self.tmp.name, JUPYTER_RUNTIME_DIR=self.tmp.name, JUPYTER_DATA_DIR=self.tmp.name)
+        cmd = [
+            sys.executable,
+            "-m",
+            "notebook",
+            "--no-browser",
+            f"--port={self.port}",
+            "--port-retries=0",
+            f"--NotebookApp.token={self.token}",
+            f"--NotebookApp.notebook_dir={self.rootDir}",
+            f"--config={cfgPath}",
+        ]
+        if hasattr(os, "geteuid") and os.geteuid() == 0:
+            cmd.append("--allow-root")
+        self.log = open(os.path.join(self.tmp.name, "server.log"), "w")
+        self.proc = subprocess.Popen(cmd, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+
+        start = time.monotonic()
+        while time.monotonic() - start < timeout:
+            if self.proc.poll() is not None:
+                self.log.close()
+                with open(self.log.name) as f:
+                    raise RuntimeError(f"server exited with code {self.proc.returncode}:\n{f.read()[-2000:]}")
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=0.5):
+                    return self
+            except OSError:
+                time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"server did not start within {timeout}s")
+
+    def stop(self):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.send_signal(signal.SIGINT)
+            try:
+                self.proc.wait(10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+        if self.proc is not None:
+            self.log.close()
+            self.tmp.cleanup()
+            self.proc = None
+
+    def rss(self):
+        return rssBytes(self.proc.pid) if self.proc is not None else None
+
+
+class Stats:
+    """Latencies and sizes of every request made during a run"""
+
+    def __init__(self):
+        self.latencies = dict()
+        self.errors = dict()
+        self.cancelled = 0
+        self.bytes = 0
+        self.rss = []
+
+    def record(self, endpoint, seconds, nbytes=0, code=200):
+        if code == 200:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            self.bytes += nbytes
+        elif code == 499:
+            # cancelled by the user scrolling past, not a failure
+            self.cancelled += 1
+        else:
+            self.errors[code] = self.errors.get(code, 0) + 1
+
+    def report(self, elapsed):
+        allLatencies = [x for lats in self.latencies.values() for x in lats]
+        rows = dict()
+        for name, lats in sorted(self.latencies.items()) + [("all", allLatencies)]:
+            rows[name] = dict(
+                (
+                    ("count", len(lats)),
+                    ("p50_ms", percentile(lats, 50) * 1000),
+                    ("p95_ms", percentile(lats, 95) * 1000),
+                    ("p99_ms", percentile(lats, 99) * 1000),
+                    ("max_ms", max(lats, default=float("nan")) * 1000),
+                )
+            )
+        rss = [x for x in self.rss if x is not None]
+        return dict(
+            (
+                ("bytes_per_s", self.bytes / elapsed),
+                ("cancelled", self.cancelled),
+                ("elapsed_s", elapsed),
+                ("errors", self.errors),
+                ("latency", rows),
+                ("requests_per_s", len(allLatencies) / elapsed),
+                ("rss_final_bytes", rss[-1] if rss else None),
+                ("rss_peak_bytes", max(rss) if rss else None),
+                ("rss_start_bytes", rss[0] if rss else None),
+            )
+        )
+
+
+class GridUser:
+    """One simulated user scrolling through datasets in the grid viewer"""
+
+    def __init__(self, name, client, url, token, fpath, side, pattern, viewport, rng, stats, cancel=False):
+        self.name = name
+        self.client = client
+        self.url = url
+        self.headers = dict((("Authorization", f"token {token}"),))
+        self.fpath = fpath
+        self.side = side
+        self.nblocks = -(-side // BLOCK_SIZE)
+        self.pattern = PATTERNS[pattern]
+        # size of the visible part of the grid, in blocks. A block partly in view still has to be fetched, hence the +1
+        self.view = tuple(min(self.nblocks, -(-n // BLOCK_SIZE) + 1) for n in viewport)
+        self.rng = rng
+        self.stats = stats
+        self.cancel = cancel
+        self.moves = 0
+
+    async def request(self, endpoint, uri, **params):
+        query = urlencode(dict(uri=uri, **params), doseq=True)
+        start = time.perf_counter()
+        try:
+            response = await self.client.fetch(f"{self.url}/hdf/{endpoint}/{self.fpath}?{query}", headers=self.headers, request_timeout=600)
+            self.stats.record(endpoint, time.perf_counter() - start, len(response.body))
+        except HTTPClientError as e:
+            self.stats.record(endpoint, time.perf_counter() - start, code=e.code)
+
+    async def run(self, stopAt):
+        while time.monotonic() < stopAt:
+            await self.browse(self.rng.choice(DATASETS), stopAt)
+
+    async def browse(self, dset, stopAt):
+        """Open a dataset, then scroll until reaching its end (or running out of time)"""
+        uri = f"/{dset}"
+        await self.request("meta", uri, ixstr=":, :", min_ndim=2)
+
+        # like DatasetModel, every block is fetched at most once per opened dataset
+        fetched = set()
+        pending = []
+        row, col = 0, 0
+        while time.monotonic() < stopAt:
+            key = f"{self.name}-{self.moves}"
+            blocks = [(r, c) for r in range(row, row + self.view[0]) for c in range(col, col + self.view[1]) if (r, c) not in fetched]
+            fetched.update(blocks)
+            if pending and self.cancel:
+                # the blocks of the last viewport that still haven't arrived are now out of view
+                await self.client.fetch(f"{self.url}/hdf/cancel?cancel={self.name}-{self.moves - 1}", method="POST", body="", headers=self.headers, raise_error=False)
+            pending = [p for p in pending if not p.done()]
+            pending.extend(asyncio.ensure_future(self.fetchBlock(uri, r, c, key)) for r, c in blocks)
+            self.moves += 1
+
+            await asyncio.sleep(self.pattern["think"])
+            if self.pattern["rows"] is None:
+                row, col = self.rng.randrange(self.nblocks), self.rng.randrange(self.nblocks)
+            else:
+                row, col = row + self.pattern["rows"], col + self.pattern["cols"]
+            if row >= self.nblocks or col >= self.nblocks:
+                break
+
+        await asyncio.gather(*pending)
+
+    async def fetchBlock(self, uri, rowBlock, colBlock, key):
+        row, col = rowBlock * BLOCK_SIZE, colBlock * BLOCK_SIZE
+        rowStop, colStop = min(row + BLOCK_SIZE, self.side), min(col + BLOCK_SIZE, self.side)
+        params = dict((("ixstr", ":, :"), ("min_ndim", 2), ("subixstr", f"{row}:{rowStop}, {col}:{colStop}")))
+        if self.cancel:
+            params["cancel"] = key
+        await self.request("data", uri, **params)
+
+
+async def sampleRss(server, stats, stopAt, interval=0.25):
+    while time.monotonic() < stopAt:
+        stats.rss.append(server.rss())
+        await asyncio.sleep(interval)
+
+
+async def loadtest(url, token, side, args, server=None):
+    stats = Stats()
+    client = AsyncHTTPClient(max_clients=args.max_connections)
+    rng = random.Random(args.seed)
+    patterns = list(PATTERNS) if args.pattern == "mixed" else [args.pattern]
+    viewport = tuple(int(n) for n in args.viewport.split("x"))
+
+    users = [
+        GridUser(f"user{i}", client, url, token, FIXTURE_FILES["big"], side, rng.choice(patterns), viewport, random.Random(rng.random()), stats, cancel=args.cancel)
+        for i in range(args.users)
+    ]
+
+    start = time.monotonic()
+    stopAt = start + args.duration
+    tasks = [user.run(stopAt) for user in users]
+    if server is not None:
+        tasks.append(sampleRss(server, stats, stopAt))
+    await asyncio.gather(*tasks)
+    if server is not None:
+        stats.rss.append(server.rss())
+
+    report = stats.report(time.monotonic() - start)
+    report["config"] = dict((("cancel", args.cancel), ("duration", args.duration), ("pattern", args.pattern), ("side", side), ("users", args.users), ("viewport", viewport)))
+    return report
+
+
+def formatReport(report):
+    lines = ["{:<8} {:>8} {:>10} {:>10} {:>10} {:>10}".format("endpoint", "count", "p50 ms", "p95 ms", "p99 ms", "max ms")]
+    for name, row in report["latency"].items():
+        lines.append("{:<8} {count:>8} {p50_ms:>10.1f} {p95_ms:>10.1f} {p99_ms:>10.1f} {max_ms:>10.1f}".format(name, **row))
+    lines.append("")
+    lines.append(f"throughput: {report['requests_per_s']:.1f} req/s, {report['bytes_per_s'] / 2 ** 20:.1f} MiB/s over {report['elapsed_s']:.1f}s")
+    if report["cancelled"]:
+        lines.append(f"cancelled: {report['cancelled']} requests for blocks that scrolled out of view")
+    if report["errors"]:
+        lines.append(f"errors: {report['errors']}")
+    if report["rss_peak_bytes"] is not None:
+        lines.append(
+            "server rss: {:.0f} MiB at start, {:.0f} MiB peak, {:.0f} MiB at end".format(report["rss_start_bytes"] / 2 ** 20, report["rss_peak_bytes"] / 2 ** 20, report["rss_final_bytes"] / 2 ** 20)
+        )
+    return "\n".join(lines)
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0], formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--users", type=int, default=16, help="number of concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=30, help="length of the run, in seconds")
+    parser.add_argument("--pattern", choices=list(PATTERNS) + ["mixed"], default="mixed", help="how the users scroll. mixed gives each user a random pattern")
+    parser.add_argument("--viewport", default="60x20", help="visible rows x columns of each user's grid")
+    parser.add_argument("--cancel", action="store_true", help="cancel the requests for blocks that scrolled out of view before arriving")
+    parser.add_argument("--max-connections", type=int, default=64, help="max simultaneous http connections, across all users")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scale", type=float, default=float(os.environ.get("JHDF_BENCH_SCALE", 0.01)), help="size of the fixture files, as in genFixtures.py")
+    parser.add_argument("--fixture-dir", default=os.environ.get("JHDF_BENCH_DIR"), help="where to generate (and cache) the fixture files. Defaults to a temp dir")
+    parser.add_argument("--url", help="run against an already running server instead of starting one. Its root dir must hold the fixture files")
+    parser.add_argument("--token", default="", help="auth token of the server given by --url")
+    parser.add_argument("--hdf-config", action="append", default=[], metavar="KEY=VALUE", help="HdfConfig option for the started server, eg bulk_concurrency=4. Can be repeated")
+    parser.add_argument("--json", action="store_true", help="print the report as json")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parseArgs(argv)
+    side = bigSide(args.scale)
+
+    if args.url:
+        report = asyncio.run(loadtest(args.url.rstrip("/"), args.token, side, args))
+    else:
+        with tempfile.TemporaryDirectory(prefix="jhdf-bench-") as tmpdir:
+            fixtureDir = str(genFixtures(args.fixture_dir or tmpdir, args.scale))
+            hdfConfig = dict((key, json.loads(val)) for key, val in (kv.split("=", 1) for kv in args.hdf_config))
+            server = Server(fixtureDir, hdfConfig).start()
+            try:
+                report = asyncio.run(loadtest(server.url, server.token, side, args, server=server))
+            finally:
+                server.stop()
+
+    print(json.dumps(report, indent=2) if args.json else formatReport(report))
+
+
+if __name__ == "__main__":
+    main()
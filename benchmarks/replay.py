@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+"""Replay a request trace recorded by a jupyterlab_hdf server (see
+`HdfConfig.trace_file`), to measure changes against real traffic.
+
+The trace can be replayed over http against a running server (--url), against
+a server started here (--root DIR --server), or directly against the managers,
+with no http in between (--root DIR). DIR must hold the files named in the
+trace, at the same paths relative to it.
+
+By default requests are sent with the same spacing as when they were recorded.
+--speed 2 replays twice as fast, --max-gap caps the idle time between requests,
+and --speed 0 ignores timing altogether, sending requests as fast as the
+server answers them, --concurrency at a time.
+
+Usage: python replay.py TRACE (--url URL [--token TOKEN] | --root DIR [--server]) [--speed 1] ...
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from urllib.parse import urlencode
+
+from h5grove.encoders import orjson_encode
+from h5grove.models import LinkResolution
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError, HTTPError
+from traitlets.config import Config
+
+sys.path.insert(0, os.path.dirname(__file__))
+from loadtest import Server, Stats, formatReport, sampleRss  # noqa: E402
+
+from jupyterlab_hdf.attrs import HdfAttrsManager  # noqa: E402
+from jupyterlab_hdf.config import HdfConfig  # noqa: E402
+from jupyterlab_hdf.contents import HdfContentsManager  # noqa: E402
+from jupyterlab_hdf.data import HdfDataManager  # noqa: E402
+from jupyterlab_hdf.memory import memoryBudget  # noqa: E402
+from jupyterlab_hdf.meta import HdfMetaManager  # noqa: E402
+from jupyterlab_hdf.scheduler import scheduler  # noqa: E402
+from jupyterlab_hdf.search import HdfSearchManager, searchIndexes  # noqa: E402
+from jupyterlab_hdf.snippet import HdfSnippetManager  # noqa: E402
+from jupyterlab_hdf.storage import HdfStorageManager  # noqa: E402
+from jupyterlab_hdf.trace import HANDLER_PARAMS, TRACE_PARAMS, readTrace  # noqa: E402
+from jupyterlab_hdf.util import jsonize  # noqa: E402
+
+MANAGERS = dict(
+    (
+        ("attrs", HdfAttrsManager),
+        ("contents", HdfContentsManager),
+        ("data", HdfDataManager),
+        ("meta", HdfMetaManager),
+        ("search", HdfSearchManager),
+        ("snippet", HdfSnippetManager),
+        ("storage", HdfStorageManager),
+    )
+)
+
+
+class HttpTarget:
+    """Sends each traced request to a server over http"""
+
+    def __init__(self, url, token, maxConnections):
+        self.url = url.rstrip("/")
+        self.headers = dict((("Authorization", f"token {token}"),))
+        self.client = AsyncHTTPClient(max_clients=maxConnections)
+
+    async def send(self, rec):
+        params = dict(uri=rec["uri"], **{k: rec[k] for k in TRACE_PARAMS if k in rec})
+        try:
+            response = await self.client.fetch(f"{self.url}/hdf/{rec['endpoint']}/{rec['path']}?{urlencode(params, doseq=True)}", headers=self.headers, request_timeout=600)
+            return response.code, len(response.body)
+        except HTTPClientError as e:
+            return e.code, 0
+
+
+class DirectTarget:
+    """Runs each traced request straight through the managers, the same way
+    the handlers do (scheduler lanes, memory budget, json encoding), but
+    without any http
+    """
+
+    def __init__(self, rootDir, hdfConfig):
+        self.blockBytes = hdfConfig.stream_block_bytes
+        log = logging.getLogger("jhdf-replay")
+        resolve = LinkResolution.ONLY_VALID if hdfConfig.resolve_links else LinkResolution.NONE
+        self.managers = {ep: cls(log=log, notebook_dir=rootDir, resolve_links=resolve) for ep, cls in MANAGERS.items()}
+        self.managers["search"].scanLimit = hdfConfig.search_scan_limit
+        searchIndexes.configure(maxFiles=hdfConfig.search_index_files)
+        scheduler.configure(meta=hdfConfig.meta_concurrency, bulk=hdfConfig.bulk_concurrency)
+        memoryBudget.configure(budget=hdfConfig.memory_budget, timeout=hdfConfig.memory_wait, amplification=hdfConfig.memory_amplification)
+
+    async def send(self, rec):
+        kwargs = {k: rec[k] for k in TRACE_PARAMS if k in rec and k not in HANDLER_PARAMS}
+        manager = self.managers[rec["endpoint"]]
+        try:
+            if rec.get("stream") is None:
+                result = await manager.getAsync(rec["path"], rec["uri"], **kwargs)
+                return 200, len(orjson_encode(result, default=jsonize))
+
+            # read block by block, like the handler does (the stream's layout comes first)
+            nbytes = 0
+            stream = manager.streamAsync(rec["path"], rec["uri"], fmt=rec["stream"], blockBytes=self.blockBytes, **kwargs)
+            try:
+                await stream.__anext__()
+                async for block in stream:
+                    nbytes += len(block) if isinstance(block, bytes) else len(orjson_encode(block, default=jsonize))
+            finally:
+                await stream.aclose()
+            return 200, nbytes
+        except HTTPError as e:
+            return e.code, 0
+
+
+async def replay(trace, target, stats, speed=1.0, maxGap=None, concurrency=8):
+    """Send every record of trace to target. Returns the count of responses
+    whose status differs from the recorded one, and the worst lag (in
+    seconds) behind the trace's timing
+    """
+    mismatched = 0
+    lag = 0.0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def send(rec):
+        nonlocal mismatched
+        start = time.perf_counter()
+        code, nbytes = await target.send(rec)
+        stats.record(rec["endpoint"], time.perf_counter() - start, nbytes, code=code)
+        mismatched += code != rec["status"]
+
+    async def sendBounded(rec):
+        async with sem:
+            await send(rec)
+
+    tasks = []
+    start = time.monotonic()
+    offset = 0.0
+    for prev, rec in zip([None] + trace[:-1], trace):
+        if not speed:
+            tasks.append(asyncio.ensure_future(sendBounded(rec)))
+            continue
+
+        # open loop: each request goes out at its (scaled) recorded time, no matter how long earlier ones are taking
+        gap = rec["t"] - prev["t"] if prev is not None else 0.0
+        offset += min(gap, maxGap) if maxGap is not None else gap
+        delay = start + offset / speed - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            lag = max(lag, -delay)
+        tasks.append(asyncio.ensure_future(send(rec)))
+
+    await asyncio.gather(*tasks)
+    return mismatched, lag
+
+
+def recordedStats(trace):
+    """Stats of the trace as it was recorded, for comparison with the replay"""
+    stats = Stats()
+    for rec in trace:
+        stats.record(rec["endpoint"], rec["ms"] / 1000, rec.get("bytes", 0), code=rec["status"])
+    return stats.report(max(trace[-1]["t"] + trace[-1]["ms"] / 1000 - trace[0]["t"], 1e-9))
+
+
+async def run(args, trace, hdfConfig):
+    stats = Stats()
+    server = None
+    if args.url:
+        target = HttpTarget(args.url, args.token, args.max_connections)
+    elif args.server:
+        server = Server(args.root, hdfConfig=dict(parseHdfConfig(args.hdf_config))).start()
+        target = HttpTarget(server.url, server.token, args.max_connections)
+    else:
+        target = DirectTarget(args.root, hdfConfig)
+
+    start = time.monotonic()
+    try:
+        sampler = asyncio.ensure_future(sampleRss(server, stats, float("inf"))) if server is not None else None
+        mismatched, lag = await replay(trace, target, stats, speed=args.speed, maxGap=args.max_gap, concurrency=args.concurrency)
+        if sampler is not None:
+            sampler.cancel()
+            stats.rss.append(server.rss())
+    finally:
+        if server is not None:
+            server.stop()
+
+    report = stats.report(time.monotonic() - start)
+    report["lag_s"] = lag
+    report["mismatched_status"] = mismatched
+    report["recorded"] = recordedStats(trace)
+    return report
+
+
+def parseHdfConfig(items):
+    return ((key, json.loads(val)) for key, val in (kv.split("=", 1) for kv in items))
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0], formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("trace", help="trace file written by a server with HdfConfig.trace_file set")
+    parser.add_argument("--url", help="replay over http against this running server")
+    parser.add_argument("--token", default="", help="auth token of the server given by --url")
+    parser.add_argument("--root", help="dir holding the traced files. Requests run directly against the managers, unless --server is given")
+    parser.add_argument("--server", action="store_true", help="start a notebook server in --root and replay over http against it")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed relative to the recorded timing. 0 sends requests as fast as possible")
+    parser.add_argument("--max-gap", type=float, help="cap on the idle time between consecutive requests, in recorded seconds")
+    parser.add_argument("--concurrency", type=int, default=8, help="max requests in flight when --speed is 0")
+    parser.add_argument("--max-connections", type=int, default=64, help="max simultaneous http connections")
+    parser.add_argument("--limit", type=int, help="only replay the first LIMIT requests of the trace")
+    parser.add_argument("--hdf-config", action="append", default=[], metavar="KEY=VALUE", help="HdfConfig option for the managers or started server, eg bulk_concurrency=4. Can be repeated")
+    parser.add_argument("--json", action="store_true", help="print the report as json")
+    args = parser.parse_args(argv)
+    if bool(args.url) == bool(args.root):
+        parser.error("exactly one of --url or --root is required")
+    return args
+
+
+def main(argv=None):
+    args = parseArgs(argv)
+    trace = sorted(readTrace(args.trace), key=lambda rec: rec["t"])[: args.limit]
+    if not trace:
+        sys.exit(f"no requests in {args.trace}")
+    hdfConfig = HdfConfig(config=Config(dict((("HdfConfig", dict(parseHdfConfig(args.hdf_config))),))))
+
+    report = asyncio.run(run(args, trace, hdfConfig))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print("replayed:")
+    print(formatReport(report))
+    print(f"status differed from the trace for {report['mismatched_status']} requests, worst lag behind the trace's timing was {report['lag_s'] * 1000:.0f}ms")
+    print("\nrecorded:")
+    print(formatReport(report["recorded"]))
+
+
+if __name__ == "__main__":
+    main()
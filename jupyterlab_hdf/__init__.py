@@ -8,10 +8,24 @@ from ._version import __version__
 from notebook.utils import url_path_join
 
 from .attrs import HdfAttrsHandler
+from .cancel import HdfCancelHandler
+from .config import HdfConfig
 from .contents import HdfContentsHandler
 from .data import HdfDataHandler
+from .index import structureIndex
+from .links import linkTargets
+from .memory import memoryBudget
 from .meta import HdfMetaHandler
+from .policy import openPolicy
+from .scheduler import scheduler
+from .search import HdfSearchHandler, searchIndexes
 from .snippet import HdfSnippetHandler
+from .status import HdfMetricsHandler, HdfStatusHandler
+from .storage import HdfStorageHandler
+from .swmr import swmrFiles
+from .tiles import HdfTilesHandler
+from .trace import traceRecorder
+from .watch import fileWatcher
 
 path_regex = r'(?P<path>(?:(?:/[^/]+)+|/?))'
 
@@ -29,13 +43,39 @@ def _load_handlers(notebook_dir, web_app):
         ('contents', HdfContentsHandler),
         ('data', HdfDataHandler),
         ('meta', HdfMetaHandler),
+        ('search', HdfSearchHandler),
         ('snippet', HdfSnippetHandler),
+        ('storage', HdfStorageHandler),
     ))
 
     handlers = [
-        (url_path_join(base_url, 'hdf', ep, '(.*)'), handler, {'notebook_dir': notebook_dir})
+        (url_path_join(base_url, 'hdf', ep, '(.*)'), handler, {'notebook_dir': notebook_dir, 'endpoint': ep})
         for ep,handler in _handlerDict.items()
     ]
+    handlers.append((url_path_join(base_url, 'hdf', 'cancel'), HdfCancelHandler))
+    handlers.append((url_path_join(base_url, 'hdf', 'metrics'), HdfMetricsHandler))
+    handlers.append((url_path_join(base_url, 'hdf', 'status'), HdfStatusHandler))
+    handlers.append((url_path_join(base_url, 'hdf', 'tiles'), HdfTilesHandler, {'notebook_dir': notebook_dir}))
+
+    hdf_config = HdfConfig(config=web_app.settings.get('config'))
+    scheduler.configure(meta=hdf_config.meta_concurrency, bulk=hdf_config.bulk_concurrency)
+    memoryBudget.configure(budget=hdf_config.memory_budget, timeout=hdf_config.memory_wait, amplification=hdf_config.memory_amplification)
+    traceRecorder.configure(hdf_config.trace_file)
+    structureIndex.configure(hdf_config.index_dir)
+    searchIndexes.configure(maxFiles=hdf_config.search_index_files)
+    fileWatcher.configure(mode=hdf_config.watch_mode, interval=hdf_config.watch_interval, idle=hdf_config.watch_idle)
+    swmrFiles.configure(enabled=hdf_config.swmr, idle=hdf_config.swmr_idle)
+    linkTargets.configure(maxFiles=hdf_config.link_target_files, idle=hdf_config.link_target_idle, lazy=hdf_config.lazy_links)
+    openPolicy.configure(
+        coreMaxBytes=hdf_config.core_max_bytes,
+        coreMinOpens=hdf_config.core_min_opens,
+        coreWindow=hdf_config.core_window,
+        coreCacheBytes=hdf_config.core_cache_bytes,
+        chunkCacheBytes=hdf_config.chunk_cache_bytes,
+        chunkCacheSlots=hdf_config.chunk_cache_slots,
+        chunkCacheW0=hdf_config.chunk_cache_w0,
+        pageBufferBytes=hdf_config.page_buffer_bytes,
+    )
 
     web_app.add_handlers('.*$', handlers)
 
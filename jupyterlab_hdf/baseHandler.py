@@ -3,31 +3,57 @@
 # Copyright (c) Jupyter Development Team.
 # Distributed under the terms of the Modified BSD License.
 
+import cProfile
+import hashlib
+import math
+from contextlib import ExitStack
+from email.utils import format_datetime, parsedate_to_datetime
+from functools import partial
+from datetime import datetime, timezone
 from typing import Union
-import h5py
-import os
+import time
 import traceback
 from h5grove.encoders import orjson_encode
 from h5grove.models import LinkResolution
 from h5grove.utils import NotFoundError
 from tornado import web
 from tornado.httpclient import HTTPError
+from tornado.iostream import StreamClosedError
 
 from notebook.base.handlers import APIHandler
 from notebook.utils import url_path_join
 
+from .cancel import CancelGroup, CancelToken, cancelRegistry
+from .compression import Compressor, availableCodings, negotiate
 from .config import HdfConfig
-from .exception import JhdfError
+from .exception import JhdfCancelledError, JhdfError, JhdfMemoryError
+from .index import structureIndex
+from .inflight import InflightTable, inflightKey
+from .links import linkTargets
+from .memory import memoryBudget
+from .metrics import RequestTimer, metrics, phase, profiled, timerContext
+from .policy import openFile
 from .responses import create_response
+from .scheduler import scheduler
+from .trace import traceRecorder
 from .util import jsonize
+from .watch import fileWatcher
 
 __all__ = ["HdfBaseManager", "HdfFileManager", "HdfBaseHandler"]
 
+# query parameters that change how a request is served, but not what its response holds
+_UNVALIDATED_ARGS = ("cancel", "deadline")
+
 
 ## manager
 class HdfBaseManager:
     """Base class for implementing HDF5 handling"""
 
+    # shared by every manager in the process, so that identical concurrent requests coalesce
+    inflight = InflightTable()
+    # the scheduler lane that this manager's reads are queued in
+    lane = "meta"
+
     def __init__(self, log, notebook_dir):
         self.log = log
         self.notebook_dir = notebook_dir
@@ -35,6 +61,34 @@ class HdfBaseManager:
     def _get(self, f, uri, **kwargs):
         raise NotImplementedError
 
+    def _lookup(self, fpath, uri):
+        """A response object for uri from the structure index, or None if the
+        request has to be served from the file itself
+        """
+        return None
+
+    def _getIndexed(self, responseObj, **kwargs):
+        raise NotImplementedError
+
+    def _inflightKey(self, relfpath, uri, **kwargs):
+        fident = fileWatcher.identity(url_path_join(self.notebook_dir, relfpath)) if relfpath else None
+        return inflightKey(type(self).__name__, fident, uri, **kwargs)
+
+    async def getAsync(self, relfpath, uri, token=None, user=None, coalesce=True, **kwargs):
+        """Same as get, but queued in this manager's scheduler lane instead of
+        run on the event loop. Unless coalesce is False, concurrent identical
+        requests share a single read, which is dropped if every request
+        waiting on it is cancelled before the read starts
+        """
+        job = lambda group: scheduler.submit(self.lane, partial(self.get, relfpath, uri, **kwargs), user=user, group=group)  # noqa: E731
+        if not coalesce:
+            group = CancelGroup()
+            group.add(token)
+            return await job(group)
+
+        key = self._inflightKey(relfpath, uri, **kwargs)
+        return await self.inflight.run(key, job, token=token)
+
     def get(self, relfpath, uri, **kwargs):
         def _handleErr(code: int, msg: Union[str, dict]):
             extra = dict(
@@ -61,19 +115,40 @@ class HdfBaseManager:
 
         fpath = url_path_join(self.notebook_dir, relfpath)
 
-        if not os.path.exists(fpath):
+        if fileWatcher.identity(fpath) is None:
             msg = f"The request specified a file that does not exist."
             _handleErr(403, msg)
         else:
             try:
-                # test opening the file with h5py
-                with h5py.File(fpath, "r"):
-                    pass
+                try:
+                    indexed = self._lookup(fpath, uri)
+                except Exception:
+                    self._indexFailed(fpath, uri)
+                    indexed = None
+                # test opening the file with h5py, unless the response can be served without opening it
+                if indexed is None:
+                    with phase("open"), openFile(fpath, probe=True):
+                        pass
             except Exception:
                 msg = f"The request did not specify a file that `h5py` could understand.\n" f"Error: {traceback.format_exc()}"
                 _handleErr(401, msg)
             try:
-                result = self._get(fpath, uri, **kwargs)
+                with profiled():
+                    if indexed is not None:
+                        try:
+                            result = self._getIndexed(indexed, **kwargs)
+                        except (JhdfError, NotFoundError):
+                            raise
+                        except Exception:
+                            # eg a corrupt row
+                            self._indexFailed(fpath, uri)
+                            indexed = None
+                    if indexed is None:
+                        result = self._get(fpath, uri, **kwargs)
+            except JhdfCancelledError:
+                raise
+            except JhdfMemoryError as e:
+                _handleErr(e.code, e.args[0])
             except JhdfError as e:
                 msg = e.args[0]
                 msg["traceback"] = traceback.format_exc()
@@ -87,20 +162,60 @@ class HdfBaseManager:
 
             return result
 
+    def _indexFailed(self, fpath, uri):
+        # a broken index is only a miss, the response gets read from the file instead
+        self.log.warning(f"failed to serve {uri} from the structure index of {fpath}, reading the file instead", exc_info=True)
+
 
 class HdfFileManager(HdfBaseManager):
     """Implements base HDF5 file handling"""
 
+    # whether responses can be served from the structure index, ie only depend on the structure of the file
+    indexed = False
+
     def __init__(self, log, notebook_dir, resolve_links):
         super().__init__(log, notebook_dir)
         self.resolve_links = resolve_links
 
+    def _inflightKey(self, relfpath, uri, **kwargs):
+        links = linkTargets.keyArgs(self.resolve_links, url_path_join(self.notebook_dir, relfpath)) if relfpath else dict()
+        return super()._inflightKey(relfpath, uri, resolve_links=self.resolve_links, **links, **kwargs)
+
     def _get(self, fpath, uri, **kwargs):
-        with h5py.File(fpath, "r") as f:
+        with ExitStack() as stack:
+            with phase("open"):
+                f = stack.enter_context(openFile(fpath))
+            stack.enter_context(linkTargets.session())
             return self._getFromFile(f, uri, **kwargs)
 
+    def _lookup(self, fpath, uri):
+        # resolving links reaches into other files, which the index doesn't cover
+        if not self.indexed or self.resolve_links != LinkResolution.NONE or not structureIndex.enabled:
+            return None
+        with phase("lookup"):
+            return structureIndex.response(fpath, uri)
+
+    def _getIndexed(self, responseObj, **kwargs):
+        response = self._getResponse(responseObj, **kwargs)
+        with phase("jsonize"):
+            return jsonize(response)
+
     def _getFromFile(self, f, uri, **kwargs):
-        return jsonize(self._getResponse(create_response(f, uri, self.resolve_links), **kwargs))
+        with phase("resolve"):
+            responseObj = create_response(f, uri, self.resolve_links)
+        # hold room in the memory budget for the read buffer and its json-ready copy. The encoded
+        # body is counted separately, by the handler, while it's being sent (see HdfBaseHandler._respond)
+        with memoryBudget.reserve(memoryBudget.estimate(*self._estimateBytes(responseObj, **kwargs))):
+            response = self._getResponse(responseObj, **kwargs)
+            with phase("jsonize"):
+                return jsonize(response)
+
+    def _estimateBytes(self, responseObj, **kwargs):
+        """Raw size of the response and the count of values it's made of, computed from
+        the request without reading any data. Responses that are small no matter the
+        request need not be accounted for
+        """
+        return 0, 0
 
     def _getResponse(self, responseObj, **kwargs):
         raise NotImplementedError
@@ -113,13 +228,28 @@ class HdfBaseHandler(APIHandler):
     """Base class for HDF5 api handlers
     """
 
-    def initialize(self, notebook_dir):
+    def initialize(self, notebook_dir, endpoint=None):
         if self.managerClass is None:
             raise NotImplementedError
 
         self.notebook_dir = notebook_dir
-        hdf_config = HdfConfig(config=self.config)
+        self.endpoint = endpoint
+        self.hdf_config = hdf_config = HdfConfig(config=self.config)
         self.manager = self.managerClass(log=self.log, notebook_dir=notebook_dir, resolve_links=LinkResolution.ONLY_VALID if hdf_config.resolve_links else LinkResolution.NONE)
+        self.cancelToken = CancelToken()
+        self.cancelKeys = []
+        self.timer = RequestTimer()
+        self.sentBytes = 0
+        self.compressor = None
+
+    def on_connection_close(self):
+        # the client is gone (eg the grid was scrolled past this block), so drop the read if it hasn't started yet
+        self.cancelToken.cancel()
+        super().on_connection_close()
+
+    def on_finish(self):
+        for key in self.cancelKeys:
+            cancelRegistry.discard(key, self.cancelToken)
 
     @web.authenticated
     async def get(self, path):
@@ -130,12 +260,12 @@ class HdfBaseHandler(APIHandler):
         itemss = ()
 
         # get any query parameter vals
-        _kws = ("min_ndim", "ixstr", "subixstr")
+        _kws = ("columnar", "dtype", "min_ndim", "ixstr", "precision", "subixstr")
         _vals = (self.get_query_argument(kw, default=None) for kw in _kws)
         itemss += (zip(_kws, _vals),)
 
         # get any repeated query parameter array vals
-        _array_kws = ("attr_keys",)
+        _array_kws = ("attr_keys", "fields")
         _array_vals = (self.get_query_arguments(kw) or None for kw in _array_kws)
         itemss += (zip(_array_kws, _array_vals),)
 
@@ -143,16 +273,202 @@ class HdfBaseHandler(APIHandler):
         kwargs = {k: v if v else None for items in itemss for k, v in items}
 
         # do any needed type conversions of param vals
-        _num_kws = ("min_ndim",)
+        _num_kws = ("min_ndim", "precision")
         for k in (k for k in _num_kws if kwargs[k] is not None):
-            kwargs[k] = int(kwargs[k])
+            try:
+                kwargs[k] = int(kwargs[k])
+            except ValueError:
+                self.set_status(400)
+                self.finish(f"malformed {k} {kwargs[k]!r}, should be an integer")
+                return
+        _bool_kws = ("columnar",)
+        for k in (k for k in _bool_kws if kwargs[k] is not None):
+            kwargs[k] = kwargs[k].lower() in ("1", "true")
+
+        # set up cancellation, by deadline (in ms) and/or by any number of client-chosen cancel keys
+        deadline = self.get_query_argument("deadline", default=None)
+        if deadline:
+            try:
+                ms = float(deadline)
+            except ValueError:
+                ms = math.nan
+            if math.isnan(ms):
+                self.set_status(400)
+                self.finish(f"malformed deadline {deadline!r}, should be a number of milliseconds")
+                return
+            self.cancelToken.setTimeout(ms)
+        self.cancelKeys = self.get_query_arguments("cancel")
+        for key in self.cancelKeys:
+            cancelRegistry.register(key, self.cancelToken)
+
+        # opt in to a timing breakdown: "header" only adds a Server-Timing header, "1" also wraps
+        # the response body as {"profile": ..., "result": ...}, and "cprofile" adds a cProfile summary
+        profile = self.get_query_argument("profile", default=None)
+        if profile and not self.hdf_config.allow_profiling:
+            self.set_status(403)
+            self.finish("profiling is disabled. Set `HdfConfig.allow_profiling = True` to enable it")
+            return
+        if profile == "cprofile":
+            self.timer.profiler = cProfile.Profile()
 
         try:
-            self.finish(orjson_encode(self.manager.get(path, uri, **kwargs), default=jsonize))
+            with timerContext(self.timer):
+                # profiled requests always do the work, so as to have something to time
+                if not profile and self._notModified(path, uri, kwargs):
+                    self.set_status(304)
+                    await self.finish()
+                    return
+                await self._respond(path, uri, kwargs, profile=profile)
+        except StreamClosedError:
+            # the client went away while the response was being written
+            pass
+        except JhdfCancelledError as err:
+            self._clearValidators()
+            if self.cancelToken.expired:
+                self.set_status(504)
+            else:
+                self.set_status(499, reason="Client Closed Request")
+            self.finish(str(err))
         except HTTPError as err:
+            self._clearValidators()
             self.set_status(err.code)
             response = err.response.body if err.response else str(err.code)
             self.finish("\n".join((response, err.message)))
+        finally:
+            # recorded here rather than in on_finish, so as to include the time spent writing
+            metrics.observe(self.endpoint, self.get_status(), self.timer, sentBytes=self.sentBytes)
+            elapsed = self.timer.elapsed()
+            traceRecorder.record(self.endpoint, path, uri, self._traceParams(kwargs), time.time() - elapsed, elapsed, self.get_status(), sentBytes=self.sentBytes)
+            self._logIfSlow(path, uri, kwargs)
+
+    def _validators(self, path, uri, kwargs):
+        """The ETag and Last-Modified date of the response to this request, from
+        the identity of the file (so without opening it) and the normalized
+        request params, or (None, None) if the file can't be stat'ed
+        """
+        fident = fileWatcher.identity(url_path_join(self.notebook_dir, path)) if path else None
+        if fident is None:
+            return None, None
+
+        extra = dict()
+        for k in self.request.query_arguments:
+            if k != "uri" and k not in kwargs and k not in _UNVALIDATED_ARGS:
+                extra[k] = tuple(self.get_query_arguments(k))
+        extra.update(self._validatorArgs(path, fident))
+        resolve_links = getattr(self.manager, "resolve_links", None)
+        links = linkTargets.keyArgs(resolve_links, url_path_join(self.notebook_dir, path))
+        key = inflightKey(self.endpoint, fident, uri, resolve_links=resolve_links, **links, **extra, **kwargs)
+        # weak, since the body's bytes also depend on the negotiated content coding
+        etag = 'W/"%s"' % hashlib.sha1(repr(key).encode()).hexdigest()
+        return etag, datetime.fromtimestamp(fident[3] // 10 ** 9, timezone.utc)
+
+    def _validatorArgs(self, path, fident):
+        """Any state besides the file and the request params that the response
+        depends on, which subclasses add to the validators
+        """
+        return dict()
+
+    def _notModified(self, path, uri, kwargs):
+        """Set the caching headers of the response, and check them against the
+        request's conditional headers. Returns True if the client's copy is
+        still good, in which case the request can be answered with a 304
+        """
+        if not self.hdf_config.etags:
+            return False
+        etag, lastModified = self._validators(path, uri, kwargs)
+        if etag is None:
+            return False
+
+        self.set_header("Etag", etag)
+        self.set_header("Last-Modified", format_datetime(lastModified, usegmt=True))
+        if self.hdf_config.cache_control:
+            self.set_header("Cache-Control", self.hdf_config.cache_control)
+
+        if "If-None-Match" in self.request.headers:
+            # per RFC 9110, If-Modified-Since is ignored when If-None-Match is present
+            return self.check_etag_header()
+        since = self.request.headers.get("If-Modified-Since")
+        if since:
+            try:
+                return lastModified <= parsedate_to_datetime(since)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _clearValidators(self):
+        # error responses mustn't be mistaken for a cacheable copy of the resource
+        for header in ("Cache-Control", "Etag", "Last-Modified"):
+            self.clear_header(header)
+
+    async def _respond(self, path, uri, kwargs, profile=None):
+        """Read the response to a request, then encode and send it in one piece"""
+        # profiled requests need a read of their own to time
+        result = await self.manager.getAsync(path, uri, token=self.cancelToken, user=str(self.current_user), coalesce=not profile, **kwargs)
+        # the read may have been shared with requests that are still live, but this one might not be
+        self.cancelToken.check()
+        result = self._result(result, kwargs)
+        with phase("encode"), profiled():
+            body = orjson_encode(result, default=jsonize)
+        # the read's reservation is gone by now, but the body is held until it has been written
+        with memoryBudget.held(len(body)):
+            await self._sendBody(body, profile=profile)
+
+    async def _sendBody(self, body, profile=None):
+        """Send an encoded body, wrapped in its profile and/or compressed if need be"""
+        if profile:
+            self.set_header("Server-Timing", self.timer.serverTiming())
+        if profile and profile != "header":
+            summary = self.timer.summary()
+            summary["cprofile"] = self.timer.profileStats(self.hdf_config.profile_top_n)
+            body = b"".join((b'{"profile":', orjson_encode(summary), b',"result":', body, b"}"))
+        compressor = self._compressor(len(body))
+        if compressor is not None:
+            with self.timer.phase("compress"):
+                body = compressor.finish(body)
+        self.sentBytes = len(body)
+        with self.timer.phase("write"):
+            await self.finish(body)
+
+    def _result(self, result, kwargs):
+        """The part of the manager's result that makes up the response body. Subclasses
+        whose managers return more than the body set headers from the rest here
+        """
+        return result
+
+    def _traceParams(self, kwargs):
+        """The params of this request to record in a trace. Subclasses add
+        those that their handler reads on its own
+        """
+        return kwargs
+
+    def _compressor(self, size=None):
+        """Negotiate compression of a response of size bytes (None if not known
+        up front) with the client. Returns a Compressor, after setting the
+        headers to match, or None if the response goes out uncompressed
+        """
+        config = self.hdf_config
+        if not config.compression or self.endpoint not in config.compression_endpoints:
+            return None
+
+        self.set_header("Vary", "Accept-Encoding")
+        if size is not None and size < config.compression_threshold:
+            return None
+        coding = negotiate(self.request.headers.get("Accept-Encoding"), availableCodings(config.compression))
+        if coding is None:
+            return None
+
+        self.set_header("Content-Encoding", coding)
+        return Compressor(coding, config.gzip_level if coding == "gzip" else config.zstd_level)
+
+    def _logIfSlow(self, path, uri, kwargs):
+        threshold = self.hdf_config.slow_request_threshold
+        elapsed = self.timer.elapsed()
+        if not threshold or elapsed < threshold:
+            return
+
+        params = ", ".join(f"{k}: {v}" for k, v in kwargs.items() if v is not None)
+        phases = ", ".join(f"{name}: {seconds * 1000:.1f}ms" for name, seconds in self.timer.phases.items())
+        self.log.warning(f"slow hdf request ({elapsed * 1000:.1f}ms): {self.endpoint} {path} uri: {uri}, {params}\n    phases: {phases}\n    counts: {dict(self.timer.counts)}")
 
     # def getQueryArguments(self, key, func=None):
     #     if func is not None:
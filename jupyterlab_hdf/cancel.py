@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from tornado import web
+
+from notebook.base.handlers import APIHandler
+
+from .exception import JhdfCancelledError
+
+__all__ = ["CancelGroup", "CancelRegistry", "CancelToken", "HdfCancelHandler", "cancelContext", "currentCancel"]
+
+
+class CancelToken:
+    """Tracks whether anyone still wants the result of a request. A token
+    is cancelled explicitly (client disconnect, cancel api), or implicitly
+    once its deadline has passed
+    """
+
+    def __init__(self, deadline=None):
+        self.deadline = deadline
+        self._cancelled = False
+        self._callbacks = []
+
+    def cancel(self):
+        self._cancelled = True
+        for callback in list(self._callbacks):
+            callback()
+
+    def addCallback(self, callback):
+        """Call callback (from the thread that cancels) once this token is cancelled explicitly"""
+        self._callbacks.append(callback)
+
+    def removeCallback(self, callback):
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+
+    def setTimeout(self, ms):
+        self.deadline = time.monotonic() + ms / 1000
+
+    @property
+    def cancelled(self):
+        return self._cancelled or self.expired
+
+    @property
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def check(self):
+        if self.cancelled:
+            raise JhdfCancelledError("deadline exceeded" if self.expired and not self._cancelled else "request cancelled")
+
+
+class CancelGroup:
+    """The tokens of every request sharing one read. Only counts as
+    cancelled once all of its members are
+    """
+
+    def __init__(self):
+        self.tokens = []
+        self._callbacks = []
+
+    def add(self, token):
+        if token is not None:
+            self.tokens.append(token)
+            for callback in self._callbacks:
+                token.addCallback(callback)
+
+    def addCallback(self, callback):
+        """Call callback whenever one of the tokens of this group, present or
+        future, is cancelled explicitly. The group itself may still be live
+        """
+        self._callbacks.append(callback)
+        for token in self.tokens:
+            token.addCallback(callback)
+
+    def removeCallback(self, callback):
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+        for token in self.tokens:
+            token.removeCallback(callback)
+
+    @property
+    def cancelled(self):
+        return bool(self.tokens) and all(t.cancelled for t in self.tokens)
+
+    @property
+    def deadline(self):
+        """The time (per time.monotonic) at which the deadlines of the tokens
+        will have cancelled this group, or None if they never will
+        """
+        live = [t for t in self.tokens if not t.cancelled]
+        if not live or any(t.deadline is None for t in live):
+            return None
+        return max(t.deadline for t in live)
+
+    def check(self):
+        if self.cancelled:
+            raise JhdfCancelledError("all requests for this read were cancelled")
+
+
+_currentCancel = ContextVar("jhdfCurrentCancel", default=None)
+
+
+def cancelContext(group, func):
+    """Run func with group as the CancelGroup of the read it does"""
+    _currentCancel.set(group)
+    return func()
+
+
+def currentCancel():
+    """The CancelGroup of the read running in this context, or None"""
+    return _currentCancel.get()
+
+
+class CancelRegistry:
+    """Maps client-chosen cancel keys to the tokens of the requests that
+    were sent with them
+    """
+
+    def __init__(self):
+        self._tokens = defaultdict(set)
+
+    def register(self, key, token):
+        self._tokens[key].add(token)
+
+    def discard(self, key, token):
+        tokens = self._tokens.get(key)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens[key]
+
+    def cancel(self, key):
+        tokens = self._tokens.pop(key, ())
+        for token in tokens:
+            token.cancel()
+        return len(tokens)
+
+
+# shared by every handler in the process
+cancelRegistry = CancelRegistry()
+
+
+## handler
+class HdfCancelHandler(APIHandler):
+    """Cancels all pending requests that were sent with the given cancel keys"""
+
+    @web.authenticated
+    def post(self):
+        count = sum(cancelRegistry.cancel(key) for key in self.get_query_arguments("cancel"))
+        self.finish({"cancelled": count})
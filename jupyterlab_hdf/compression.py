@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import numpy as np
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+__all__ = ["Compressor", "availableCodings", "negotiate", "shuffle"]
+
+
+def availableCodings(codings):
+    """The codings in codings that this server can produce, in the same order"""
+    return [coding for coding in codings if coding == "gzip" or (coding == "zstd" and zstandard is not None)]
+
+
+def negotiate(acceptEncoding, codings):
+    """The first of codings (in order of server preference) that an
+    Accept-Encoding header allows, or None
+    """
+    accepted = dict()
+    for item in (acceptEncoding or "").split(","):
+        coding, *params = (part.strip() for part in item.split(";"))
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if coding:
+            accepted[coding.lower()] = q
+
+    for coding in codings:
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+
+def shuffle(data, itemsize):
+    """Group the bytes of data by their position within each item (all first
+    bytes, then all second bytes, ...), which makes numeric arrays compress
+    much better. data must hold a whole number of items
+    """
+    if itemsize <= 1 or not data:
+        return data
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, itemsize).T.tobytes()
+
+
+class Compressor:
+    """Incremental gzip or zstd compression of a response body"""
+
+    def __init__(self, coding, level):
+        self.coding = coding
+        if coding == "gzip":
+            # wbits of 16 + MAX_WBITS gives a gzip header and trailer, rather than raw zlib
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif coding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            raise ValueError(f"unknown content coding {coding!r}")
+
+    def compress(self, data, flush=False):
+        """Compress the next part of the body. With flush, all of it is output
+        now, so that the client can decode what it has received so far
+        """
+        out = self._obj.compress(data)
+        if flush:
+            out += self._obj.flush(zlib.Z_SYNC_FLUSH if self.coding == "gzip" else zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return out
+
+    def finish(self, data=b""):
+        """Compress the last part of the body, and end the compressed stream"""
+        return self._obj.compress(data) + self._obj.flush()
@@ -4,8 +4,149 @@
 # Distributed under the terms of the Modified BSD License.
 
 from traitlets.config import Configurable
-from traitlets.traitlets import Bool
+from traitlets.traitlets import Bool, Enum, Float, Int, List, Unicode
 
 
 class HdfConfig(Configurable):
     resolve_links = Bool(False, config=True, help=("Whether soft and external links should be resolved when exploring HDF5 files."))
+    lazy_links = Bool(
+        False,
+        config=True,
+        help=(
+            "With `resolve_links`, list external links whose targets haven't been checked yet as links right "
+            "away, and check them in the background, rather than opening their target files while the request "
+            "waits. Later requests show them resolved. Requests for a link itself still resolve it right away."
+        ),
+    )
+    link_target_files = Int(64, config=True, help=("Count of external link target files held open, so that resolving links to them needn't open them again."))
+    link_target_idle = Float(
+        10.0,
+        config=True,
+        help=(
+            "Seconds after which a held external link target file that no request has used gets closed. Held "
+            "files can't be opened for writing by other processes."
+        ),
+    )
+    meta_concurrency = Int(4, config=True, help=("Count of threads serving latency-sensitive requests (attrs, contents, meta, search, snippet, storage)."))
+    bulk_concurrency = Int(2, config=True, help=("Count of threads serving bulk data requests. Kept separate so that large reads never delay metadata requests."))
+    memory_budget = Int(0, config=True, help=("Max count of bytes that all in-flight data requests may hold at once. Requests that would exceed it wait for others to finish. 0 means no limit."))
+    memory_wait = Float(10.0, config=True, help=("Max seconds a request waits for room in the memory budget before being rejected."))
+    memory_amplification = Float(
+        8.0,
+        config=True,
+        help=(
+            "Ratio of the peak bytes held while reading a data request (read buffer, python lists) to the raw "
+            "size of the requested slice, each value of which counts as at least 8 bytes. Used to estimate each "
+            "request's memory use. The encoded body is counted at its actual size while it is sent."
+        ),
+    )
+    allow_profiling = Bool(False, config=True, help=("Whether requests may ask for a timing breakdown via the `profile` query parameter. Profiles expose server internals, so this is off by default."))
+    profile_top_n = Int(25, config=True, help=("Count of functions listed in the cProfile summary of `profile=cprofile` requests."))
+    slow_request_threshold = Float(0.0, config=True, help=("Requests taking longer than this many seconds are logged along with their timing breakdown. 0 disables the slow request log."))
+    stream_block_bytes = Int(
+        4 * 2 ** 20,
+        config=True,
+        help=(
+            "Raw bytes read per block when a data request is streamed (`stream=json` or `stream=binary`). Bounds "
+            "the memory held by each streamed request."
+        ),
+    )
+    compression = List(
+        Unicode(),
+        ["zstd", "gzip"],
+        config=True,
+        help=(
+            "Content codings that responses may be compressed with, in order of preference. The client's "
+            "Accept-Encoding picks among them. zstd is skipped unless the `zstandard` package is installed. Empty "
+            "disables compression."
+        ),
+    )
+    compression_endpoints = List(Unicode(), ["attrs", "contents", "data", "meta", "search"], config=True, help=("The /hdf endpoints whose responses may be compressed."))
+    compression_threshold = Int(4096, config=True, help=("Responses smaller than this many bytes are sent uncompressed. Streamed responses are always compressed if the client accepts it."))
+    gzip_level = Int(4, config=True, help=("gzip compression level, from 1 (fastest) to 9 (smallest)."))
+    zstd_level = Int(3, config=True, help=("zstd compression level, from 1 (fastest) to 22 (smallest)."))
+    etags = Bool(
+        True,
+        config=True,
+        help=(
+            "Whether responses carry an ETag and Last-Modified date derived from the file's inode, size and "
+            "mtime, so that a client re-requesting an unchanged file gets a 304, at the cost of a stat() rather "
+            "than an HDF5 read."
+        ),
+    )
+    cache_control = Unicode(
+        "private, no-cache",
+        config=True,
+        help=(
+            "Cache-Control header of responses that carry an ETag. The default lets browsers keep responses, but "
+            "revalidate them on every use. Empty leaves the header out."
+        ),
+    )
+    index_dir = Unicode(
+        "",
+        config=True,
+        help=(
+            "Directory to keep an on-disk index of the structure of every HDF5 file that gets explored, so that "
+            "browsing huge files needs no walk of their B-trees from the second visit on, even across server "
+            "restarts. Indexes are built in the background and rebuilt whenever their file changes. Empty "
+            "disables indexing."
+        ),
+    )
+    search_scan_limit = Int(
+        10000,
+        config=True,
+        help=(
+            "Max count of objects that a search walks through while the file's search index is still being built. "
+            "Searches that hit the limit come back marked incomplete."
+        ),
+    )
+    search_index_files = Int(4, config=True, help=("Count of files whose search indexes are kept in memory. The least recently searched file's index is dropped first."))
+    watch_mode = Enum(
+        ["auto", "inotify", "off", "poll"],
+        "auto",
+        config=True,
+        help=(
+            "How the server keeps track of changes to the HDF5 files it serves, so that it needn't stat them on "
+            "every request. `inotify` uses inotify (Linux only), `poll` stats every file in use once every "
+            "`watch_interval` seconds, `auto` uses inotify except on network filesystems (whose remote changes "
+            "inotify can't see), and `off` stats files on every request."
+        ),
+    )
+    watch_interval = Float(1.0, config=True, help=("Seconds between stats of each polled file. Changes to a polled file may go unnoticed for this long."))
+    watch_idle = Float(300.0, config=True, help=("Files that no request has touched in this many seconds stop being watched."))
+    core_max_bytes = Int(
+        0,
+        config=True,
+        help=(
+            "Files no bigger than this that are opened often (see `core_min_opens`) are read whole into memory, "
+            "once, and served from memory until they change, which saves the many small reads of metadata lookups "
+            "on network filesystems. 0 disables in-memory files."
+        ),
+    )
+    core_min_opens = Int(3, config=True, help=("Count of opens within `core_window` seconds that makes a small file worth reading into memory."))
+    core_window = Float(60.0, config=True, help=("Seconds over which opens are counted towards `core_min_opens`."))
+    core_cache_bytes = Int(256 * 2 ** 20, config=True, help=("Max count of bytes of files held in memory at once. The least recently used file is dropped first."))
+    chunk_cache_bytes = Int(16 * 2 ** 20, config=True, help=("Size of the HDF5 chunk cache (`rdcc_nbytes`) of each file opened for a request."))
+    chunk_cache_slots = Int(10007, config=True, help=("Count of hash table slots of the chunk cache (`rdcc_nslots`). Best a prime, about 100 times the count of chunks that fit in the cache."))
+    chunk_cache_w0 = Float(0.75, config=True, help=("Preemption policy of the chunk cache (`rdcc_w0`), from 0 (evict least recently used chunks first) to 1 (evict fully read chunks first)."))
+    page_buffer_bytes = Int(16 * 2 ** 20, config=True, help=("Size of the page buffer of files written with paged aggregation (`fs_strategy=\"page\"`). 0 disables page buffering."))
+    swmr = Bool(
+        False,
+        config=True,
+        help=(
+            "Whether to open HDF5 files in SWMR (single writer, multiple readers) read mode, through long-lived "
+            "handles shared by all requests, so that files still being written in SWMR mode can be viewed while "
+            "they grow. Datasets are refreshed on every request, and tile stream views are told when their "
+            "dataset grows."
+        ),
+    )
+    swmr_idle = Float(60.0, config=True, help=("Seconds after which a SWMR file handle that no request has used gets closed."))
+    tile_concurrency = Int(4, config=True, help=("Max count of tiles read at once for each /hdf/tiles websocket connection. Other requested tiles wait their turn, in order of priority."))
+    trace_file = Unicode(
+        "",
+        config=True,
+        help=(
+            "Path of a file to append a record of every request to (endpoint, path, uri, params, status, timing), "
+            "for replay with benchmarks/replay.py. Empty disables tracing."
+        ),
+    )
@@ -10,6 +10,8 @@ __all__ = ["HdfContentsManager", "HdfContentsHandler"]
 class HdfContentsManager(HdfFileManager):
     """Implements HDF5 contents handling"""
 
+    indexed = True
+
     def _getResponse(self, responseObj, ixstr=None, min_ndim=None, **kwargs):
         return responseObj.contents(content=True, ixstr=ixstr, min_ndim=min_ndim)
 
@@ -3,16 +3,63 @@
 # Copyright (c) Jupyter Development Team.
 # Distributed under the terms of the Modified BSD License.
 
+import asyncio
+import h5py
+import numpy as np
+from h5grove.encoders import orjson_encode
+from tornado.httpclient import HTTPError
+
 from .baseHandler import HdfFileManager, HdfBaseHandler
+from .compression import shuffle
+from .exception import JhdfCancelledError
+from .memory import memoryBudget
+from .metrics import phase
+from .responses import create_response
+from .util import jsonize, packStrings, shortestFloats
 
 
 __all__ = ["HdfDataManager", "HdfDataHandler"]
 
+# the formats that /hdf/data can be streamed in
+STREAM_FORMATS = ("binary", "json")
+
 ## manager
 class HdfDataManager(HdfFileManager):
     """Implements HDF5 data handling"""
 
-    def _getResponse(self, responseObj, ixstr=None, subixstr=None, min_ndim=None, **kwargs):
+    lane = "bulk"
+
+    def _getFromFile(self, f, uri, fmt=None, dtype=None, precision=None, **kwargs):
+        reduced = dtype is not None or precision is not None
+        if fmt != "binary" and not reduced:
+            return super()._getFromFile(f, uri, **kwargs)
+
+        with phase("resolve"):
+            responseObj = create_response(f, uri, self.resolve_links)
+        with memoryBudget.reserve(memoryBudget.estimate(*self._estimateBytes(responseObj, fmt=fmt, **kwargs))):
+            chunk = self._getResponse(responseObj, dtype=dtype, precision=precision, **kwargs)
+            if fmt != "binary":
+                with phase("jsonize"):
+                    if kwargs.get("blockBytes") is not None:
+                        return jsonize(chunk)
+                    data = shortestFloats(chunk, precision)
+                if kwargs.get("block") is not None:
+                    return data
+                # the handler sends the transform in a header (see HdfDataHandler._result)
+                return dict((("data", data), ("transform", responseObj.transform(dtype=dtype, precision=precision))))
+
+            # raw little-endian bytes, in C order, skipping the conversion to json-ready lists
+            if isinstance(chunk, h5py.Empty):
+                return b""
+            with phase("encode"):
+                if h5py.check_string_dtype(responseObj.dtype) is not None:
+                    return packStrings(chunk)
+                if isinstance(chunk, dict):
+                    # columnar: the values of each field, one field after the other
+                    return b"".join(np.asarray(column, dtype=column.dtype.newbyteorder("<")).tobytes() for column in chunk.values())
+                return np.asarray(chunk, dtype=chunk.dtype.newbyteorder("<")).tobytes()
+
+    def _getResponse(self, responseObj, ixstr=None, subixstr=None, min_ndim=None, block=None, blockBytes=None, fields=None, columnar=None, dtype=None, precision=None, **kwargs):
         # # DEBUG: uncomment for logging
         # from .util import dsetContentDict, parseSubindex
         # logd = dsetContentDict(f[uri], ixstr=ixstr)
@@ -21,7 +68,53 @@ class HdfDataManager(HdfFileManager):
         #     logd['ixcompound'] = parseSubindex(ixstr, subixstr, f[uri].shape)
         # self.log.info('{}'.format(logd))
 
-        return responseObj.data(ixstr=ixstr, subixstr=subixstr, min_ndim=min_ndim)
+        if blockBytes is not None:
+            return responseObj.streamLayout(ixstr=ixstr, subixstr=subixstr, min_ndim=min_ndim, blockBytes=blockBytes, fields=fields, columnar=columnar, dtype=dtype, precision=precision)
+
+        return responseObj.data(ixstr=ixstr, subixstr=subixstr, min_ndim=min_ndim, block=block, fields=fields, columnar=columnar, dtype=dtype, precision=precision)
+
+    def _estimateBytes(self, responseObj, ixstr=None, subixstr=None, block=None, blockBytes=None, fields=None, columnar=None, fmt=None, **kwargs):
+        if blockBytes is not None:
+            # just the layout of a stream, no data
+            return 0, 0
+        nbytes = responseObj.nbytes(ixstr=ixstr, subixstr=subixstr, block=block, fields=fields, columnar=columnar)
+        if fmt == "binary":
+            # sent as is, without ever turning into python objects
+            return nbytes, 0
+        return nbytes, responseObj.values(ixstr=ixstr, subixstr=subixstr, block=block, fields=fields, columnar=columnar)
+
+    async def streamAsync(self, relfpath, uri, fmt="json", blockBytes=4 * 2 ** 20, token=None, user=None, **kwargs):
+        """Same as getAsync, but yields the data in blocks of whole rows, each
+        holding about blockBytes raw bytes. The first item yielded is the
+        stream's layout (see DatasetResponse.streamLayout), then come the
+        blocks, as json-ready lists or, if fmt is "binary", raw bytes (in
+        columnar requests, the bytes of each field of the block in turn, and
+        for strings, see packStrings). With dtype and/or precision, float
+        data is reduced first, as layout["transform"] tells
+        """
+        layout = await self.getAsync(relfpath, uri, token=token, user=user, blockBytes=blockBytes, **kwargs)
+        yield layout
+
+        if layout["rows"] is None:
+            blocks = [None]
+        else:
+            rows, blockRows = layout["rows"], layout["blockRows"]
+            blocks = [(start, min(start + blockRows, rows)) for start in range(0, rows, blockRows)]
+        if fmt == "binary":
+            kwargs["fmt"] = fmt
+
+        def read(i):
+            return asyncio.ensure_future(self.getAsync(relfpath, uri, token=token, user=user, block=blocks[i], **kwargs)) if i < len(blocks) else None
+
+        # keep one read ahead, so that reading the next block overlaps with sending this one
+        pending = read(0)
+        try:
+            for i in range(len(blocks)):
+                current, pending = pending, read(i + 1)
+                yield await current
+        finally:
+            if pending is not None:
+                pending.cancel()
 
 
 ## handler
@@ -29,3 +122,124 @@ class HdfDataHandler(HdfBaseHandler):
     """A handler for HDF5 data"""
 
     managerClass = HdfDataManager
+
+    def _result(self, result, kwargs):
+        if kwargs.get("dtype") is None and kwargs.get("precision") is None:
+            return result
+        # reduced data comes with the transform applied to it, which goes out as a header
+        if result["transform"] is not None:
+            self.set_header("X-Hdf-Transform", orjson_encode(result["transform"]).decode())
+        return result["data"]
+
+    def _traceParams(self, kwargs):
+        return dict(kwargs, shuffle=self.get_query_argument("shuffle", default=None), stream=self.get_query_argument("stream", default=None))
+
+    async def _respond(self, path, uri, kwargs, profile=None):
+        fmt = self.get_query_argument("stream", default=None)
+        if not fmt:
+            return await super()._respond(path, uri, kwargs, profile=profile)
+
+        if fmt not in STREAM_FORMATS:
+            raise HTTPError(400, f"unknown stream format {fmt!r}, should be one of {', '.join(STREAM_FORMATS)}")
+        await self._stream(path, uri, kwargs, fmt)
+
+    async def _stream(self, path, uri, kwargs, fmt):
+        """Send the data in blocks of rows as they are read, so that neither the
+        time to the first byte nor the memory held depend on the size of the slice
+        """
+        columnar = kwargs.get("columnar")
+        if columnar and fmt == "json":
+            raise HTTPError(400, "columnar data can't be streamed as json, only as binary")
+        stream = self.manager.streamAsync(path, uri, fmt=fmt, blockBytes=self.hdf_config.stream_block_bytes, token=self.cancelToken, user=str(self.current_user), **kwargs)
+        started = False
+        try:
+            layout = await stream.__anext__()
+            dtype = np.dtype(layout["dtype"])
+            if layout["transform"] is not None:
+                self.set_header("X-Hdf-Transform", orjson_encode(layout["transform"]).decode())
+            if fmt == "binary":
+                if columnar:
+                    fieldDtypes = [np.dtype(fieldDtype) for _, fieldDtype in layout["fields"]]
+                    if any(fieldDtype.kind not in "biufc" for fieldDtype in fieldDtypes):
+                        raise HTTPError(400, f"only numeric fields can be streamed as binary, not dtype {dtype.str}")
+                    # each block holds the values of every field for blockRows rows, one field after the other
+                    fields = [[name, fieldDtype.newbyteorder("<").str] for (name, _), fieldDtype in zip(layout["fields"], fieldDtypes)]
+                    self.set_header("X-Hdf-Fields", orjson_encode(fields).decode())
+                    self.set_header("X-Hdf-Block-Rows", str(layout["blockRows"] or 1))
+                elif layout["encoding"] is not None:
+                    # each string is sent as its byte length (4 bytes, little-endian) followed by its bytes
+                    self.set_header("X-Hdf-Dtype", dtype.str)
+                    self.set_header("X-Hdf-String-Encoding", layout["encoding"])
+                elif dtype.kind not in "biufc":
+                    raise HTTPError(400, f"only numeric and string datasets (or numeric fields of compound datasets, with columnar) can be streamed as binary, not dtype {dtype.str}")
+                else:
+                    self.set_header("X-Hdf-Dtype", dtype.newbyteorder("<").str)
+                self.set_header("Content-Type", "application/octet-stream")
+                self.set_header("X-Hdf-Shape", ",".join(str(n) for n in layout["shape"] or ()))
+            else:
+                self.set_header("Content-Type", "application/json")
+
+            self.compressor = self._compressor()
+            # byte shuffling only pays off when followed by compression, and needs one item size throughout
+            shuffled = fmt == "binary" and not columnar and layout["encoding"] is None and self.compressor is not None and self.get_query_argument("shuffle", default=None) in ("1", "true")
+            if shuffled:
+                # each block is shuffled on its own, so the client needs to know where the blocks end
+                shape = layout["shape"] or ()
+                blockShape = (layout["blockRows"], *shape[1:]) if layout["rows"] is not None else shape
+                self.set_header("X-Hdf-Shuffle", str(dtype.itemsize))
+                self.set_header("X-Hdf-Block-Bytes", str(int(np.prod(blockShape, dtype=np.int64)) * dtype.itemsize))
+            if fmt == "binary":
+                # get the headers out now, since the body may be empty
+                await self._send(b"")
+
+            # a json stream of rows is sent as the fragments of one big array
+            splitJson = fmt == "json" and layout["rows"] is not None
+            if splitJson:
+                await self._send(b"[")
+            started = True
+
+            first = True
+            async for block in stream:
+                self.cancelToken.check()
+                if fmt == "json":
+                    with phase("encode"):
+                        block = orjson_encode(block, default=jsonize)
+                    if splitJson:
+                        block = block[1:-1]
+                        if not block:
+                            continue
+                        block = block if first else b"," + block
+                        first = False
+                elif shuffled:
+                    with self.timer.phase("compress"):
+                        block = shuffle(block, dtype.itemsize)
+                await self._send(block)
+
+            if splitJson:
+                await self._send(b"]")
+        except (HTTPError, JhdfCancelledError) as err:
+            if not started:
+                raise
+            # too late to send an error status, so cut the response short instead
+            self.log.error(f"hdf data stream of {path} uri: {uri} failed partway through: {err}")
+            self.request.connection.close()
+            return
+        finally:
+            await stream.aclose()
+
+        if self.compressor is not None:
+            with self.timer.phase("compress"):
+                tail = self.compressor.finish()
+            self.write(tail)
+            self.sentBytes += len(tail)
+        with self.timer.phase("write"):
+            await self.finish()
+
+    async def _send(self, chunk):
+        if self.compressor is not None:
+            with self.timer.phase("compress"):
+                chunk = self.compressor.compress(chunk, flush=True)
+        self.write(chunk)
+        self.sentBytes += len(chunk)
+        with self.timer.phase("write"):
+            await self.flush()
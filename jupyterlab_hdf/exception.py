@@ -3,7 +3,18 @@
 # Copyright (c) Jupyter Development Team.
 # Distributed under the terms of the Modified BSD License.
 
-__all__ = ['JhdfError']
+__all__ = ['JhdfCancelledError', 'JhdfError', 'JhdfMemoryError']
 
 class JhdfError(Exception):
     pass
+
+class JhdfCancelledError(Exception):
+    """Raised in place of doing work that no client is waiting for anymore"""
+    pass
+
+class JhdfMemoryError(JhdfError):
+    """Raised when a request doesn't fit in the server's memory budget"""
+
+    def __init__(self, msg, code):
+        super().__init__(msg)
+        self.code = code
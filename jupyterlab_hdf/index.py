@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import h5py
+import hashlib
+import json
+import logging
+import numpy as np
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import closing
+from h5grove.encoders import orjson_encode
+from h5grove.models import LinkResolution
+
+from .policy import openFile
+from .responses import DatasetResponse, ExternalLinkResponse, GroupResponse, ResolvedEntityResponse, SoftLinkResponse, create_response
+from .util import fileIdentity, jsonize, uriJoin
+from .watch import fileWatcher
+
+__all__ = ["StructureIndex", "structureIndex"]
+
+# bump whenever the schema or the meaning of a column changes, so that old indexes get rebuilt
+INDEX_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE info (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE objects (
+    uri TEXT PRIMARY KEY,
+    parent TEXT,
+    position INTEGER,
+    name TEXT,
+    type TEXT,
+    dtype TEXT,
+    shape TEXT,
+    size INTEGER,
+    attributes TEXT,
+    targetFile TEXT,
+    targetUri TEXT,
+    expanded INTEGER DEFAULT 0
+);
+CREATE INDEX children ON objects (parent, position);
+"""
+
+_COLUMNS = ("uri", "parent", "position", "name", "type", "dtype", "shape", "size", "attributes", "targetFile", "targetUri")
+
+
+## indexed responses
+class _Indexed:
+    """A response built from a row of the index rather than from the file.
+    Mixed into the regular response classes, so that both give the same
+    metadata and contents
+    """
+
+    def __init__(self, row, children=()):
+        self.row = row
+        self._children = children
+
+    @property
+    def name(self):
+        return self.row["name"]
+
+    @property
+    def uri(self):
+        return self.row["uri"]
+
+    @property
+    def type(self):
+        return self.row["type"]
+
+    def attributeMetas(self):
+        return json.loads(self.row["attributes"])
+
+
+class IndexedEntityResponse(_Indexed, ResolvedEntityResponse):
+    pass
+
+
+class IndexedDatasetResponse(_Indexed, DatasetResponse):
+    @property
+    def dtype(self):
+        return np.dtype(self.row["dtype"])
+
+    @property
+    def shape(self):
+        shape = json.loads(self.row["shape"])
+        return None if shape is None else tuple(shape)
+
+    @property
+    def size(self):
+        return self.row["size"]
+
+
+class IndexedGroupResponse(_Indexed, GroupResponse):
+    def children(self):
+        return (indexedResponse(row) for row in self._children)
+
+
+class IndexedSoftLinkResponse(_Indexed, SoftLinkResponse):
+    @property
+    def targetUri(self):
+        return self.row["targetUri"]
+
+
+class IndexedExternalLinkResponse(_Indexed, ExternalLinkResponse):
+    @property
+    def targetFile(self):
+        return self.row["targetFile"]
+
+    @property
+    def targetUri(self):
+        return self.row["targetUri"]
+
+
+_indexedClasses = dict(
+    (
+        ("dataset", IndexedDatasetResponse),
+        ("external_link", IndexedExternalLinkResponse),
+        ("group", IndexedGroupResponse),
+        ("soft_link", IndexedSoftLinkResponse),
+    )
+)
+
+
+def indexedResponse(row, children=()):
+    return _indexedClasses.get(row["type"], IndexedEntityResponse)(row, children)
+
+
+def objectRow(responseObj, parent, position):
+    """The row of the index describing the object of an (unresolved) response"""
+    row = dict.fromkeys(_COLUMNS)
+    row.update((("name", responseObj.name), ("parent", parent), ("position", position), ("type", responseObj.type), ("uri", responseObj.uri)))
+    if isinstance(responseObj, ResolvedEntityResponse):
+        row["attributes"] = orjson_encode(responseObj.attributeMetas(), default=jsonize).decode()
+    if isinstance(responseObj, DatasetResponse):
+        row.update((("dtype", responseObj.dtype.str), ("shape", json.dumps(responseObj.shape)), ("size", responseObj.size)))
+    if isinstance(responseObj, (ExternalLinkResponse, SoftLinkResponse)):
+        row["targetUri"] = responseObj.targetUri
+    if isinstance(responseObj, ExternalLinkResponse):
+        row["targetFile"] = responseObj.targetFile
+    return tuple(row[k] for k in _COLUMNS)
+
+
+## index
+class StructureIndex:
+    """Optional on-disk index of the structure of HDF5 files (every object's
+    path, type, shape, dtype, attribute metadata, and link targets), so that
+    browsing a huge file needs no walk of its B-trees once it has been
+    crawled, even across server restarts.
+
+    Each file gets its own SQLite database in cacheDir, keyed by the file's
+    real path and stamped with its identity (inode, size, mtime). Indexes are
+    built by a background crawler, breadth first, and each group can be
+    served from the index as soon as its children have been crawled. An index
+    whose file has changed since is ignored and rebuilt
+    """
+
+    # rows written per transaction while crawling
+    batchRows = 5000
+
+    def __init__(self, cacheDir="", log=None):
+        self.cacheDir = ""
+        self.log = log or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._crawling = dict()
+        # crawls contend with requests for the HDF5 library, so only one runs at a time
+        self._crawlSlot = threading.Semaphore(1)
+
+        self.hits = 0
+        self.misses = 0
+        self.crawled = 0
+        self.configure(cacheDir)
+
+    def configure(self, cacheDir=None, log=None):
+        if cacheDir is not None:
+            if cacheDir:
+                cacheDir = os.path.expanduser(cacheDir)
+                os.makedirs(cacheDir, exist_ok=True)
+            self.cacheDir = cacheDir
+        if log is not None:
+            self.log = log
+
+    @property
+    def enabled(self):
+        return bool(self.cacheDir)
+
+    def dbPath(self, fpath):
+        return os.path.join(self.cacheDir, hashlib.sha1(os.path.realpath(fpath).encode()).hexdigest() + ".sqlite")
+
+    def response(self, fpath, uri):
+        """A response object for the object at uri, read from the index of the
+        file at fpath, or None if the object isn't indexed (yet). Starts a
+        crawl of the file if it has no up to date index
+        """
+        if not self.enabled or uri != "/" + uri.strip("/"):
+            return None
+
+        fident = fileWatcher.identity(fpath)
+        dbpath = self.dbPath(fpath)
+        responseObj = None
+        try:
+            with self._connect(dbpath) as conn:
+                identity, complete = self._info(conn)
+                if fident is not None and identity == fident:
+                    responseObj = self._lookup(conn, uri)
+                if identity != fident or not complete:
+                    # stale, or left half built by a previous server (crawl is a no-op if it's being built right now)
+                    self.crawl(fpath)
+        except sqlite3.Error:
+            # missing, or being rebuilt
+            self.crawl(fpath)
+
+        with self._lock:
+            if responseObj is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return responseObj
+
+    def crawl(self, fpath):
+        """Build the index of the file at fpath in the background, unless
+        it's already being built. Returns a future of the crawl
+        """
+        dbpath = self.dbPath(fpath)
+        with self._lock:
+            future = self._crawling.get(dbpath)
+            if future is None:
+                future = self._crawling[dbpath] = Future()
+                # a daemon thread, so that shutting down the server never waits on a crawl. The index is
+                # left consistent if it's killed midway, and the crawl starts over on the next request
+                threading.Thread(target=self._crawl, args=(fpath, dbpath, future), name="jhdf-index", daemon=True).start()
+            return future
+
+    def stats(self):
+        with self._lock:
+            return dict((("crawled", self.crawled), ("crawling", len(self._crawling)), ("enabled", self.enabled), ("hits", self.hits), ("misses", self.misses)))
+
+    def _connect(self, dbpath):
+        # read only, so that a missing index raises rather than being created empty
+        return closing(sqlite3.connect(f"file:{dbpath}?mode=ro", uri=True))
+
+    def _info(self, conn):
+        """The identity of the file that an index was built from (None if the index is of
+        an older version), and whether the index is complete
+        """
+        info = {k: json.loads(v) for k, v in conn.execute("SELECT key, value FROM info")}
+        if info.get("version") != INDEX_VERSION or info.get("identity") is None:
+            return None, False
+        return tuple(info["identity"]), info.get("complete", False)
+
+    def _lookup(self, conn, uri):
+        conn.row_factory = sqlite3.Row
+        row = conn.execute("SELECT * FROM objects WHERE uri = ?", (uri,)).fetchone()
+        if row is None:
+            return None
+        if row["type"] != "group":
+            return indexedResponse(row)
+        if not row["expanded"]:
+            return None
+        return indexedResponse(row, conn.execute("SELECT * FROM objects WHERE parent = ? ORDER BY position", (row["uri"],)).fetchall())
+
+    def _crawl(self, fpath, dbpath, future):
+        self._crawlSlot.acquire()
+        t0 = time.perf_counter()
+        count = 0
+        try:
+            fident = fileIdentity(fpath)
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(dbpath + suffix):
+                    os.remove(dbpath + suffix)
+
+            conn = sqlite3.connect(dbpath)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                with openFile(fpath) as f:
+                    count = self._crawlFile(f, conn, fident)
+            finally:
+                conn.close()
+        except Exception:
+            self.log.exception(f"failed to index the structure of {fpath}")
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(dbpath + suffix):
+                    os.remove(dbpath + suffix)
+        else:
+            self.log.info(f"indexed the structure of {fpath} ({count} objects) in {time.perf_counter() - t0:.1f}s")
+            with self._lock:
+                self.crawled += 1
+        finally:
+            self._crawlSlot.release()
+            with self._lock:
+                self._crawling.pop(dbpath, None)
+            future.set_result(count)
+
+    def _crawlFile(self, f, conn, fident):
+        insert = f"INSERT INTO objects ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+        expand = "UPDATE objects SET expanded = 1 WHERE uri = ?"
+        conn.executemany("INSERT INTO info (key, value) VALUES (?, ?)", (("identity", json.dumps(fident)), ("version", json.dumps(INDEX_VERSION))))
+        conn.execute(insert, objectRow(create_response(f, "/", LinkResolution.NONE), None, 0))
+        conn.commit()
+
+        # hard links can make the same group show up under many paths (or even inside itself), so each group is expanded only once
+        seen = set()
+        queue = deque(("/",))
+        count = pending = 1
+        while queue:
+            uri = queue.popleft()
+            group = f[uri]
+            addr = h5py.h5o.get_info(group.id).addr
+            if addr in seen:
+                continue
+            seen.add(addr)
+
+            rows = []
+            for position, name in enumerate(group.keys()):
+                child = create_response(f, uriJoin(uri, name), LinkResolution.NONE)
+                rows.append(objectRow(child, uri, position))
+                if child.type == "group":
+                    queue.append(child.uri)
+            # a group's children and its expanded flag go in the same transaction, so a group is never served half crawled
+            conn.executemany(insert, rows)
+            conn.execute(expand, (uri,))
+            count += len(rows)
+            pending += len(rows)
+            if pending >= self.batchRows:
+                conn.commit()
+                pending = 0
+        conn.execute("INSERT INTO info (key, value) VALUES ('complete', 'true')")
+        conn.commit()
+        return count
+
+
+structureIndex = StructureIndex()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import asyncio
+from collections import Counter
+
+from .cancel import CancelGroup
+
+__all__ = ["InflightTable", "inflightKey"]
+
+# the params that hold index strings, which are whitespace insensitive
+_INDEX_PARAMS = ("ixstr", "subixstr")
+
+
+def inflightKey(endpoint, fident, uri, **kwargs):
+    """Normalize a request into a hashable key. Requests with equal keys
+    are guaranteed to produce the same response
+    """
+    params = []
+    for k, v in sorted(kwargs.items()):
+        if v is None:
+            continue
+        if k in _INDEX_PARAMS:
+            v = "".join(v.split())
+        elif isinstance(v, list):
+            v = tuple(v)
+        params.append((k, v))
+
+    return (endpoint, fident, "/" + uri.strip("/"), tuple(params))
+
+
+class InflightTable:
+    """Single-flight table: concurrent requests with the same key share one
+    future, so that only the first of them actually reads from HDF5
+    """
+
+    def __init__(self):
+        self._futures = {}
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def __len__(self):
+        return len(self._futures)
+
+    async def run(self, key, func, token=None):
+        """Await func(group) once per key, no matter how many callers are
+        waiting on it at the same time. func should return an awaitable.
+        group is a CancelGroup holding the cancel token of every caller
+        """
+        endpoint = key[0]
+        entry = self._futures.get(key)
+        if entry is not None:
+            self.hits[endpoint] += 1
+            fut, group = entry
+        else:
+            self.misses[endpoint] += 1
+            group = CancelGroup()
+            fut = asyncio.ensure_future(func(group))
+            self._futures[key] = (fut, group)
+            fut.add_done_callback(lambda _: self._futures.pop(key, None))
+
+        group.add(token)
+
+        # shield the shared future so that one waiter going away can't cancel it for the others
+        return await asyncio.shield(fut)
+
+    def stats(self):
+        return dict(
+            (
+                ("hits", dict(self.hits)),
+                ("inflight", len(self)),
+                ("misses", dict(self.misses)),
+            )
+        )
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import h5py
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from h5grove.content import DatasetContent, ExternalLinkContent, GroupContent, ResolvedEntityContent
+from h5grove.models import LinkResolution
+
+from .watch import fileWatcher
+
+__all__ = ["LinkTargets", "linkTargets"]
+
+# count of link resolutions remembered
+_MAX_RESULTS = 65536
+
+# the target handles used by the request being served, released once it's done
+_session = ContextVar("jhdfLinkSession", default=None)
+
+
+def targetPath(h5file, link):
+    """The path of the file that an external link points to, looked up the way
+    HDF5 does: as is if absolute, else in the dirs of HDF5_EXT_PREFIX, the dir
+    of the linking file, and the working dir, in that order
+    """
+    if os.path.isabs(link.filename):
+        return link.filename
+    dirs = [d for d in os.environ.get("HDF5_EXT_PREFIX", "").split(os.pathsep) if d]
+    dirs.append(os.path.dirname(os.path.abspath(h5file.filename)))
+    for d in dirs:
+        fpath = os.path.join(d, link.filename)
+        if os.path.exists(fpath):
+            return fpath
+    return link.filename
+
+
+def fileLocking(h5file):
+    """The `locking` arg of h5py.File that h5file was opened with. A file can
+    only be open once in a process with any given locking flags
+    """
+    if h5file.driver == "core":
+        # files read into memory (see policy.py) go without a lock, but other opens of their targets don't
+        return None
+    useLocking, ignoreDisabled = h5file.id.get_access_plist().get_file_locking()
+    if not useLocking:
+        return False
+    return "best-effort" if ignoreDisabled else True
+
+
+class _Target:
+    """A target file of external links, held open, and the requests using it"""
+
+    def __init__(self, f, fident):
+        self.f = f
+        self.fident = fident
+        self.users = 0
+        self.retired = False
+        self.lastUsed = time.monotonic()
+
+    def release(self):
+        self.users -= 1
+        self.lastUsed = time.monotonic()
+        if self.retired and not self.users:
+            self.f.close()
+
+    def retire(self):
+        self.retired = True
+        if not self.users:
+            self.f.close()
+
+
+class LinkTargets:
+    """Per process cache of the targets of external links. Resolving an external
+    link makes HDF5 open the target file, so a group of many external links
+    used to cost one file open per link on every listing. Instead, the last
+    maxFiles target files are held open (and reopened once they change), and
+    whether each link's target exists is remembered for as long as its target
+    file doesn't change. Held files keep writers out, so they are closed once
+    no request has used them for `idle` seconds.
+
+    In lazy mode, links whose targets haven't been checked yet are reported as
+    unresolved links right away when listed among a group's children, and
+    checked in the background, so that a listing never waits on opening target
+    files. The next request shows them resolved. A request for the link itself
+    still resolves it there and then. generation is bumped whenever a
+    background check finishes, and the linking files the check was for take
+    its value, so that it can be part of the validators of their responses.
+    Likewise, the target files that the links of each linking file were
+    followed to are remembered, so that their identities can be too
+
+    Handles are only lent to requests that are served within a session
+    """
+
+    def __init__(self, maxFiles=64, idle=10.0, lazy=False, log=None):
+        self.maxFiles = maxFiles
+        self.idle = idle
+        self.lazy = lazy
+        self.log = log or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._targets = OrderedDict()
+        self._results = OrderedDict()
+        # link -> the linking files waiting on its check
+        self._pending = dict()
+        self._queue = queue.Queue()
+        self._thread = None
+        self.generation = 0
+        # linking file -> generation of the last check of one of its links
+        self._generations = dict()
+        # linking file -> the target files its links were followed to
+        self._linked = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.opens = 0
+
+    def configure(self, maxFiles=None, idle=None, lazy=None):
+        with self._lock:
+            if maxFiles is not None:
+                self.maxFiles = maxFiles
+                self._evict()
+            if idle is not None:
+                self.idle = idle
+            if lazy is not None:
+                self.lazy = lazy
+
+    def close(self):
+        """Close every held file that isn't in use, and the others as soon as they aren't"""
+        with self._lock:
+            for target in self._targets.values():
+                target.retire()
+            self._targets.clear()
+
+    @contextmanager
+    def session(self):
+        """Let the requests served within this context use held target files"""
+        handles = []
+        reset = _session.set(handles)
+        try:
+            yield
+        finally:
+            _session.reset(reset)
+            with self._lock:
+                for target in handles:
+                    target.release()
+
+    def content(self, h5file, uri, link, lazy=False):
+        """The h5grove content of the external link at uri, resolved through a held
+        target file, or None if the link has to be resolved by h5grove (ie outside of
+        a session, or if the target is open with other flags elsewhere in the process).
+        With lazy (for links listed as children) and in lazy mode, a link whose target
+        hasn't been checked yet comes back unresolved
+        """
+        handles = _session.get()
+        if handles is None:
+            return None
+
+        tpath = targetPath(h5file, link)
+        tident = fileWatcher.identity(tpath)
+        key = (os.path.realpath(tpath), tident, link.path)
+        with self._lock:
+            self._link(os.path.realpath(h5file.filename), tpath)
+            valid = self._results.get(key)
+            if valid is not None:
+                self.hits += 1
+                self._results.move_to_end(key)
+            else:
+                self.misses += 1
+        if tident is None or valid is False:
+            return ExternalLinkContent(uri, link)
+
+        locking = fileLocking(h5file)
+        if valid is None and lazy and self.lazy:
+            self._validateLater(tpath, tident, link.path, locking, key, os.path.realpath(h5file.filename))
+            return ExternalLinkContent(uri, link)
+
+        try:
+            target = self._acquire(tpath, tident, locking)
+        except OSError:
+            return None
+        handles.append(target)
+        entity = target.f.get(link.path)
+        self._remember(key, entity is not None)
+
+        if isinstance(entity, h5py.Dataset):
+            return DatasetContent(uri, entity)
+        if isinstance(entity, h5py.Group):
+            # children are looked up through the link, which is cheap with the target file open already
+            return GroupContent(uri, entity, h5file)
+        if isinstance(entity, h5py.Datatype):
+            return ResolvedEntityContent(uri, entity)
+        return ExternalLinkContent(uri, link)
+
+    def keyArgs(self, resolve_links, fpath):
+        """Extra args of the keys of responses from the file at fpath, which depend
+        on the target files of its links, and in lazy mode on the links of that
+        file checked so far
+        """
+        if resolve_links in (None, LinkResolution.NONE):
+            return dict()
+        fpath = os.path.realpath(fpath)
+        with self._lock:
+            tpaths = sorted(self._linked.get(fpath, ()))
+            generation = self._generations.get(fpath, 0)
+        args = dict((("targets", tuple(fileWatcher.identity(tpath) for tpath in tpaths)),))
+        if self.lazy:
+            args["links"] = generation
+        return args
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                (
+                    ("files", len(self._targets)),
+                    ("hits", self.hits),
+                    ("lazy", self.lazy),
+                    ("misses", self.misses),
+                    ("opens", self.opens),
+                    ("pending", len(self._pending)),
+                )
+            )
+
+    def _acquire(self, tpath, tident, locking):
+        key = os.path.realpath(tpath)
+        with self._lock:
+            self._sweep(time.monotonic())
+            target = self._targets.get(key)
+            if target is not None and target.fident != tident:
+                self._targets.pop(key).retire()
+                target = None
+            if target is None:
+                target = _Target(h5py.File(tpath, "r", locking=locking), tident)
+                self._targets[key] = target
+                self.opens += 1
+                self._evict(keep=key)
+            self._targets.move_to_end(key)
+            target.users += 1
+            self._start()
+            return target
+
+    def _link(self, linking, tpath):
+        tpaths = self._linked.get(linking)
+        if tpaths is None:
+            tpaths = self._linked[linking] = set()
+            while len(self._linked) > _MAX_RESULTS:
+                self._linked.popitem(last=False)
+        tpaths.add(tpath)
+        self._linked.move_to_end(linking)
+
+    def _remember(self, key, valid):
+        with self._lock:
+            self._results[key] = valid
+            self._results.move_to_end(key)
+            while len(self._results) > _MAX_RESULTS:
+                self._results.popitem(last=False)
+
+    def _evict(self, keep=None):
+        for key in list(self._targets):
+            if len(self._targets) <= max(self.maxFiles, 1):
+                break
+            if key != keep:
+                self._targets.pop(key).retire()
+
+    def _sweep(self, now):
+        """Close the held files that no request has used in a while"""
+        for key, target in list(self._targets.items()):
+            if not target.users and now - target.lastUsed > self.idle:
+                self._targets.pop(key).retire()
+
+    def _start(self):
+        # the thread that checks links in lazy mode, and closes idle files
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="jhdf-links", daemon=True)
+            self._thread.start()
+
+    def _validateLater(self, tpath, tident, linkPath, locking, key, linking):
+        with self._lock:
+            if key in self._pending:
+                self._pending[key].add(linking)
+                return
+            self._pending[key] = set((linking,))
+            self._start()
+        self._queue.put((tpath, tident, linkPath, locking, key))
+
+    def _run(self):
+        while True:
+            try:
+                tpath, tident, linkPath, locking, key = self._queue.get(timeout=min(self.idle, 1.0))
+            except queue.Empty:
+                with self._lock:
+                    self._sweep(time.monotonic())
+                continue
+
+            try:
+                target = self._acquire(tpath, tident, locking)
+                try:
+                    self._remember(key, linkPath in target.f)
+                finally:
+                    with self._lock:
+                        target.release()
+            except Exception:
+                # reported as an unresolved link, as it would be if HDF5 failed to open the target
+                self.log.exception(f"failed to check the target of an external link to {linkPath} in {tpath}")
+                self._remember(key, False)
+            finally:
+                with self._lock:
+                    self.generation += 1
+                    for linking in self._pending.pop(key, ()):
+                        self._generations[linking] = self.generation
+
+
+linkTargets = LinkTargets()
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import threading
+import time
+from contextlib import contextmanager
+
+from .cancel import currentCancel
+from .config import HdfConfig
+from .exception import JhdfCancelledError, JhdfMemoryError
+
+__all__ = ["MemoryBudget", "memoryBudget"]
+
+# bytes that each value of a slice takes up at the least once read into a python list (the list's slot)
+VALUE_BYTES = 8
+
+
+class MemoryBudget:
+    """Process-wide accounting of the bytes held by in-flight reads. A read
+    that would push usage over budget waits for other reads to finish,
+    and is rejected if it can't get in within `timeout` seconds, or dropped
+    if its requests are cancelled in the meantime
+    """
+
+    def __init__(self, budget=0, timeout=10.0, amplification=1.0):
+        self.budget = budget
+        self.timeout = timeout
+        self.amplification = amplification
+        self._cond = threading.Condition()
+
+        self.used = 0
+        self.peak = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def configure(self, budget=None, timeout=None, amplification=None):
+        with self._cond:
+            if budget is not None:
+                self.budget = budget
+            if timeout is not None:
+                self.timeout = timeout
+            if amplification is not None:
+                self.amplification = amplification
+            self._cond.notify_all()
+
+    def estimate(self, outputBytes, values=0):
+        """Peak bytes held while serving a response of outputBytes raw bytes,
+        made up of values values. Small values cost far more than their raw
+        size once in python lists, so each counts as at least VALUE_BYTES
+        """
+        return int(max(outputBytes, values * VALUE_BYTES) * self.amplification)
+
+    def acquire(self, nbytes, cancel=None):
+        """Take nbytes of the budget, waiting for room if need be. cancel is a
+        CancelToken or CancelGroup; the wait ends early if it gets cancelled
+        """
+        if not nbytes:
+            # nothing to make room for, even if bodies being sent have pushed usage over budget
+            return
+        with self._cond:
+            if self.budget and nbytes > self.budget:
+                self.rejected += 1
+                raise JhdfMemoryError(self._errMsg("the request is larger than the server's memory budget.", nbytes), 413)
+
+            if self.budget and self.used + nbytes > self.budget:
+                self.waiting += 1
+                if cancel is not None:
+                    cancel.addCallback(self._wake)
+                try:
+                    end = time.monotonic() + self.timeout
+                    while self.budget and self.used + nbytes > self.budget:
+                        if cancel is not None and cancel.cancelled:
+                            raise JhdfCancelledError("all requests for this read were cancelled while it waited for memory")
+                        now = time.monotonic()
+                        if now >= end:
+                            self.rejected += 1
+                            raise JhdfMemoryError(self._errMsg("timed out waiting for other requests to free up the server's memory budget.", nbytes), 503)
+                        # deadlines pass without a callback, so wake up for them
+                        deadline = cancel.deadline if cancel is not None else None
+                        self._cond.wait((end if deadline is None else min(end, deadline)) - now)
+                finally:
+                    self.waiting -= 1
+                    if cancel is not None:
+                        cancel.removeCallback(self._wake)
+
+            self.used += nbytes
+            self.peak = max(self.peak, self.used)
+
+    def charge(self, nbytes):
+        """Count nbytes that are already held against the budget, without
+        waiting for room, since waiting wouldn't free them
+        """
+        with self._cond:
+            self.used += nbytes
+            self.peak = max(self.peak, self.used)
+
+    def release(self, nbytes):
+        with self._cond:
+            self.used -= nbytes
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserve(self, nbytes, cancel=None):
+        """Hold nbytes of the budget for the duration of the block. Waits are
+        cut short by cancel, by default the current read's CancelGroup
+        """
+        self.acquire(nbytes, cancel=currentCancel() if cancel is None else cancel)
+        try:
+            yield
+        finally:
+            self.release(nbytes)
+
+    @contextmanager
+    def held(self, nbytes):
+        """Count nbytes that are already held against the budget for the duration of the block"""
+        self.charge(nbytes)
+        try:
+            yield
+        finally:
+            self.release(nbytes)
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def _errMsg(self, message, nbytes):
+        return dict(
+            (
+                ("message", message),
+                ("debugVars", {"budget": self.budget, "requested": nbytes, "used": self.used}),
+            )
+        )
+
+    def stats(self):
+        return dict(
+            (
+                ("budget", self.budget),
+                ("peak", self.peak),
+                ("rejected", self.rejected),
+                ("used", self.used),
+                ("waiting", self.waiting),
+            )
+        )
+
+
+# shared by every manager in the process
+memoryBudget = MemoryBudget(
+    budget=HdfConfig.memory_budget.default_value,
+    timeout=HdfConfig.memory_wait.default_value,
+    amplification=HdfConfig.memory_amplification.default_value,
+)
@@ -11,6 +11,8 @@ __all__ = ["HdfMetaManager", "HdfMetaHandler"]
 class HdfMetaManager(HdfFileManager):
     """Implements HDF5 metadata handling"""
 
+    indexed = True
+
     def _getResponse(self, responseObj, ixstr=None, min_ndim=None, **kwargs):
         return responseObj.metadata(ixstr=ixstr, min_ndim=min_ndim)
 
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import io
+import pstats
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+__all__ = ["Histogram", "HdfMetrics", "RequestTimer", "countOpen", "countRead", "metrics", "phase", "profiled", "promHistogram", "promSamples", "timerContext"]
+
+# in seconds. Covers everything from a cached metadata lookup to a multi-GB read
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative histogram of observations, in the shape prometheus expects"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.max = 0.0
+        self.sum = 0.0
+
+    def observe(self, val):
+        self.counts[bisect_left(self.buckets, val)] += 1
+        self.count += 1
+        self.max = max(self.max, val)
+        self.sum += val
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def cumulative(self):
+        """(upper bound, count of observations <= bound) pairs, ending with +Inf"""
+        total = 0
+        for le, n in zip((*self.buckets, float("inf")), self.counts):
+            total += n
+            yield le, total
+
+
+## per request timing
+class RequestTimer:
+    """Wall time spent in each phase of serving one request, plus I/O counts"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = defaultdict(float)
+        self.counts = Counter()
+        # set to a cProfile.Profile to also profile every function call made while serving the request
+        self.profiler = None
+
+    @contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - t0
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def summary(self):
+        """Phase timings (in ms) and I/O counts, as a dictionary"""
+        return dict(
+            (
+                ("counts", dict(self.counts)),
+                ("phases", {name: seconds * 1000 for name, seconds in self.phases.items()}),
+                ("total", self.elapsed() * 1000),
+            )
+        )
+
+    def serverTiming(self):
+        """Value for a Server-Timing header, which browser devtools show alongside the request"""
+        return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in (*self.phases.items(), ("total", self.elapsed())))
+
+    def profileStats(self, topN=25):
+        """The topN entries of the cProfile profile, by cumulative time"""
+        if self.profiler is None:
+            return None
+        stream = io.StringIO()
+        pstats.Stats(self.profiler, stream=stream).sort_stats("cumulative").print_stats(topN)
+        return stream.getvalue()
+
+
+# the timer of the request currently being served. Scheduler lanes copy it into their worker threads
+_currentTimer = ContextVar("jhdfCurrentTimer", default=None)
+
+
+@contextmanager
+def timerContext(timer):
+    """Attribute all phases run in this context to timer"""
+    reset = _currentTimer.set(timer)
+    try:
+        yield timer
+    finally:
+        _currentTimer.reset(reset)
+
+
+@contextmanager
+def phase(name):
+    """Time a block as one phase of the current request, if there is one"""
+    timer = _currentTimer.get()
+    if timer is None:
+        yield
+    else:
+        with timer.phase(name):
+            yield
+
+
+@contextmanager
+def profiled():
+    """Run the block under the current request's cProfile profiler, if it has one"""
+    timer = _currentTimer.get()
+    profiler = timer.profiler if timer is not None else None
+    if profiler is None:
+        yield
+        return
+
+    try:
+        profiler.enable()
+    except ValueError:
+        # another profiler is already active in this interpreter
+        yield
+        return
+
+    try:
+        yield
+    finally:
+        profiler.disable()
+
+
+def countOpen(policy):
+    """Record an open of a file by the current request, with the given open policy"""
+    timer = _currentTimer.get()
+    if timer is not None:
+        timer.counts[policy + "Opens"] += 1
+
+
+def countRead(ary):
+    """Record the bytes and elements of an array read from HDF5 by the current request"""
+    timer = _currentTimer.get()
+    if timer is not None and hasattr(ary, "nbytes"):
+        timer.counts["readBytes"] += ary.nbytes
+        timer.counts["readElements"] += ary.size
+
+
+## aggregation
+class HdfMetrics:
+    """Process-wide aggregate of the timings of every finished request"""
+
+    def __init__(self):
+        self.requestSeconds = defaultdict(Histogram)
+        self.phaseSeconds = defaultdict(Histogram)
+        self.requests = Counter()
+        self.readBytes = Counter()
+        self.readElements = Counter()
+        self.sentBytes = Counter()
+        self.opens = Counter()
+
+    def observe(self, endpoint, code, timer, sentBytes=0):
+        self.requestSeconds[endpoint].observe(timer.elapsed())
+        for name, seconds in timer.phases.items():
+            self.phaseSeconds[(endpoint, name)].observe(seconds)
+        self.requests[(endpoint, code)] += 1
+        self.readBytes[endpoint] += timer.counts["readBytes"]
+        self.readElements[endpoint] += timer.counts["readElements"]
+        self.sentBytes[endpoint] += sentBytes
+        for key, n in timer.counts.items():
+            if key.endswith("Opens"):
+                self.opens[(endpoint, key[: -len("Opens")])] += n
+
+    def promLines(self):
+        yield from promHistogram("jhdf_request_duration_seconds", "Total time to serve a request.", {(("endpoint", ep),): h for ep, h in self.requestSeconds.items()})
+        yield from promHistogram(
+            "jhdf_phase_duration_seconds",
+            "Time spent in each phase of serving a request (lookup, open, resolve, index, search, read, jsonize, encode, compress, write).",
+            {(("endpoint", ep), ("phase", ph)): h for (ep, ph), h in self.phaseSeconds.items()},
+        )
+        yield from promSamples("jhdf_requests_total", "counter", "Count of finished requests.", {(("endpoint", ep), ("code", str(code))): n for (ep, code), n in self.requests.items()})
+        yield from promSamples("jhdf_read_bytes_total", "counter", "Bytes of array data read from HDF5.", {(("endpoint", ep),): n for ep, n in self.readBytes.items()})
+        yield from promSamples("jhdf_read_elements_total", "counter", "Count of array elements read from HDF5.", {(("endpoint", ep),): n for ep, n in self.readElements.items()})
+        yield from promSamples(
+            "jhdf_file_opens_total",
+            "counter",
+            "Opens of HDF5 files, by open policy (core, default, paged, swmr).",
+            {(("endpoint", ep), ("policy", policy)): n for (ep, policy), n in self.opens.items()},
+        )
+        yield from promSamples("jhdf_sent_bytes_total", "counter", "Bytes of response bodies sent.", {(("endpoint", ep),): n for ep, n in self.sentBytes.items()})
+
+
+## prometheus text format
+def _promLabels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels) + "}"
+
+
+def _promVal(val):
+    return "+Inf" if val == float("inf") else repr(float(val)) if isinstance(val, float) else str(val)
+
+
+def promSamples(name, kind, help, samples):
+    """Lines for one counter or gauge metric. samples maps label tuples to values"""
+    yield f"# HELP {name} {help}"
+    yield f"# TYPE {name} {kind}"
+    for labels, val in sorted(samples.items()):
+        yield f"{name}{_promLabels(labels)} {_promVal(val)}"
+
+
+def promHistogram(name, help, histograms):
+    """Lines for one histogram metric. histograms maps label tuples to Histograms"""
+    yield f"# HELP {name} {help}"
+    yield f"# TYPE {name} histogram"
+    for labels, h in sorted(histograms.items()):
+        for le, n in h.cumulative():
+            yield f"{name}_bucket{_promLabels((*labels, ('le', _promVal(le))))} {n}"
+        yield f"{name}_sum{_promLabels(labels)} {_promVal(h.sum)}"
+        yield f"{name}_count{_promLabels(labels)} {h.count}"
+
+
+# shared by every handler in the process
+metrics = HdfMetrics()
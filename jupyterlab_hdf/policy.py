@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import h5py
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from .metrics import countOpen
+from .swmr import swmrFiles
+from .watch import fileWatcher
+
+__all__ = ["OPEN_POLICIES", "OpenPolicy", "openFile", "openPolicy"]
+
+# core: read whole into memory once, and served from there until the file changes
+# default: opened for each request, with a tuned chunk cache
+# paged: same, plus a page buffer, for files written with paged aggregation
+# swmr: through a long-lived SWMR handle (see swmr.py)
+OPEN_POLICIES = ("core", "default", "paged", "swmr")
+
+# count of files whose recent opens are remembered, to tell which files are hot
+_MAX_TRACKED = 4096
+
+
+class _CoreImage:
+    """A file read whole into memory, and the requests using it"""
+
+    def __init__(self, f, fident):
+        self.f = f
+        self.fident = fident
+        self.nbytes = fident[2]
+        self.users = 0
+        self.retired = False
+
+    def retire(self):
+        self.retired = True
+        if not self.users:
+            self.f.close()
+
+
+class OpenPolicy:
+    """Decides how each served file is opened, from its size and how often it
+    has been opened lately. Small files that are opened often (at least
+    coreMinOpens times in coreWindow seconds, and no bigger than coreMaxBytes)
+    are read whole into memory with the core driver, once, so that their
+    metadata lookups no longer turn into many small reads (which are slow on
+    network filesystems). Their images are kept, up to coreCacheBytes in all,
+    until the file changes. Other files are opened for each request with a
+    chunk cache of chunkCacheBytes, plus a page buffer of pageBufferBytes if
+    they were written with paged aggregation. SWMR mode, if enabled, takes
+    precedence over all of this
+    """
+
+    def __init__(self, log=None):
+        self.coreMaxBytes = 0
+        self.coreMinOpens = 3
+        self.coreWindow = 60.0
+        self.coreCacheBytes = 256 * 2 ** 20
+        self.chunkCacheBytes = 16 * 2 ** 20
+        self.chunkCacheSlots = 10007
+        self.chunkCacheW0 = 0.75
+        self.pageBufferBytes = 16 * 2 ** 20
+        self.log = log or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # realpath -> times of the file's latest opens
+        self._recent = OrderedDict()
+        # realpath -> (identity, file space page size) of files written with paged aggregation, or (identity, None)
+        self._layouts = OrderedDict()
+        self._images = OrderedDict()
+        # realpath -> set once the file being read into memory is, for the requests waiting on it
+        self._loading = dict()
+
+        self.opens = dict.fromkeys(OPEN_POLICIES, 0)
+        self.imageHits = 0
+
+    def configure(self, **kwargs):
+        """Set any of coreMaxBytes, coreMinOpens, coreWindow, coreCacheBytes, chunkCacheBytes,
+        chunkCacheSlots, chunkCacheW0, pageBufferBytes, or log
+        """
+        with self._lock:
+            for k, v in kwargs.items():
+                if not hasattr(self, k):
+                    raise TypeError(f"unknown open policy setting {k!r}")
+                if v is not None:
+                    setattr(self, k, v)
+            self._recent.clear()
+            self._evict()
+
+    @property
+    def imageBytes(self):
+        return sum(image.nbytes for image in self._images.values())
+
+    def choose(self, fpath, fident, record=True):
+        """The policy to open the file at fpath (whose identity is fident) with,
+        counting this as one more open of it if record
+        """
+        if swmrFiles.enabled:
+            return "swmr"
+        if fident is None:
+            return "default"
+
+        key = os.path.realpath(fpath)
+        now = time.monotonic()
+        with self._lock:
+            if record:
+                recent = self._recent.pop(key, None)
+                if recent is None or recent.maxlen != max(self.coreMinOpens, 1):
+                    recent = deque(maxlen=max(self.coreMinOpens, 1))
+                recent.append(now)
+                self._recent[key] = recent
+                while len(self._recent) > _MAX_TRACKED:
+                    self._recent.popitem(last=False)
+            else:
+                recent = self._recent.get(key, ())
+
+            image = self._images.get(key)
+            if image is not None and image.fident == fident:
+                return "core"
+            hot = len(recent) >= self.coreMinOpens and now - recent[0] <= self.coreWindow
+            if self.coreMaxBytes and hot and fident[2] <= min(self.coreMaxBytes, self.coreCacheBytes):
+                return "core"
+
+            layout = self._layouts.get(key)
+            if layout is not None and layout[0] == fident and layout[1] is not None and layout[1] <= self.pageBufferBytes:
+                return "paged"
+            return "default"
+
+    @contextmanager
+    def open(self, fpath, probe=False):
+        """The file at fpath opened for reading, with the policy chosen for it. A
+        probe, which only checks that the file can be opened, is not counted as
+        an open of the file, and doesn't read it into memory
+        """
+        fident = fileWatcher.identity(fpath)
+        policy = self.choose(fpath, fident, record=not probe)
+        if not probe:
+            countOpen(policy)
+            with self._lock:
+                self.opens[policy] += 1
+
+        image = None
+        if policy == "core":
+            image = self._acquire(fpath, fident, load=not probe)
+            if image is None:
+                policy = "default"
+
+        if policy == "swmr":
+            with swmrFiles.open(fpath) as f:
+                yield f
+        elif image is not None:
+            try:
+                yield image.f
+            finally:
+                self._release(image)
+        else:
+            with h5py.File(fpath, "r", **self.fileArgs(policy)) as f:
+                if fident is not None and policy == "default":
+                    self._learnLayout(fpath, fident, f)
+                yield f
+
+    def fileArgs(self, policy):
+        """Keyword args of h5py.File for opening a file with a per request policy"""
+        kwargs = dict((("rdcc_nbytes", self.chunkCacheBytes), ("rdcc_nslots", self.chunkCacheSlots), ("rdcc_w0", self.chunkCacheW0)))
+        if policy == "paged":
+            kwargs["page_buf_size"] = self.pageBufferBytes
+        return kwargs
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                (
+                    ("imageBytes", self.imageBytes),
+                    ("imageHits", self.imageHits),
+                    ("images", len(self._images)),
+                    ("opens", dict(self.opens)),
+                )
+            )
+
+    def _learnLayout(self, fpath, fident, f):
+        """Remember whether the file uses paged aggregation, so that it gets a page buffer from its next open on"""
+        key = os.path.realpath(fpath)
+        with self._lock:
+            layout = self._layouts.get(key)
+            if layout is not None and layout[0] == fident:
+                return
+        fcpl = f.id.get_create_plist()
+        paged = fcpl.get_file_space_strategy()[0] == h5py.h5f.FSPACE_STRATEGY_PAGE
+        with self._lock:
+            self._layouts.pop(key, None)
+            self._layouts[key] = (fident, fcpl.get_file_space_page_size() if paged else None)
+            while len(self._layouts) > _MAX_TRACKED:
+                self._layouts.popitem(last=False)
+
+    def _acquire(self, fpath, fident, load=True):
+        """The image of the file at fpath, read into memory unless it's there already.
+        Without load, None if it isn't
+        """
+        key = os.path.realpath(fpath)
+        while True:
+            with self._lock:
+                image = self._images.get(key)
+                if image is not None and image.fident != fident:
+                    # the file changed since it was read
+                    self._images.pop(key).retire()
+                    image = None
+                if image is not None:
+                    if load:
+                        self.imageHits += 1
+                    self._images.move_to_end(key)
+                    image.users += 1
+                    return image
+                if not load:
+                    return None
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    break
+            # another request is reading the file, so wait for it rather than read the file twice
+            loading.wait()
+
+        # read outside of the lock, which would hold up every other open for as long as the read takes. The
+        # image needs no file lock, which would keep writers from opening the file for as long as it's cached
+        try:
+            image = _CoreImage(h5py.File(fpath, "r", driver="core", backing_store=False, locking=False), fident)
+            with self._lock:
+                self._images[key] = image
+                self._evict(keep=key)
+                image.users += 1
+                return image
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+
+    def _release(self, image):
+        with self._lock:
+            image.users -= 1
+            if image.retired and not image.users:
+                image.f.close()
+
+    def _evict(self, keep=None):
+        """Drop the least recently used images until they fit in coreCacheBytes"""
+        for key in list(self._images):
+            if self.imageBytes <= self.coreCacheBytes:
+                break
+            if key != keep:
+                self._images.pop(key).retire()
+
+
+openPolicy = OpenPolicy()
+
+
+def openFile(fpath, probe=False):
+    """The file at fpath opened for reading, as a context manager. Every read of
+    a served file should go through here, so that the open policy applies to it
+    """
+    return openPolicy.open(fpath, probe=probe)
@@ -1,9 +1,14 @@
 from typing import Generic, TypeVar
 from h5grove.content import DatasetContent, EntityContent, ExternalLinkContent, GroupContent, ResolvedEntityContent, SoftLinkContent
+from h5grove.models import LinkResolution
 from h5grove.utils import LinkError
 import h5py
 import h5grove
-from .util import attrMetaDict, dsetChunk, shapemeta, uriJoin
+import numpy as np
+from .exception import JhdfError
+from .links import linkTargets
+from .metrics import phase
+from .util import attrMetaDict, dsetChunk, dsetIndex, dsetStorageMeta, fieldColumns, fieldsDtype, ixBlock, ixShape, ixSize, reduceFloats, reduction, shapemeta, uriJoin
 
 
 H5GroveEntity = TypeVar("H5GroveEntity", DatasetContent, EntityContent, ExternalLinkContent, GroupContent, ResolvedEntityContent, SoftLinkContent)
@@ -34,6 +39,23 @@ class EntityResponse(Generic[H5GroveEntity]):
     def metadata(self, **kwargs):
         return dict((("name", self.name), ("type", self.type)))
 
+    def nbytes(self, **kwargs):
+        """Raw size of the data this response holds, before any serialization"""
+        return 0
+
+    def values(self, **kwargs):
+        """Count of values (elements times fields) the data this response holds is made of"""
+        return 0
+
+    def storage(self):
+        msg = dict(
+            (
+                ("message", "storage info is only available for datasets."),
+                ("debugVars", {"type": self.type}),
+            )
+        )
+        raise JhdfError(msg)
+
     @property
     def name(self):
         return self.h5grove_entity.name
@@ -53,12 +75,20 @@ class ExternalLinkResponse(EntityResponse[ExternalLinkContent]):
             sorted(
                 (
                     *super().metadata().items(),
-                    ("targetFile", self.h5grove_entity._target_file),
-                    ("targetUri", self.h5grove_entity._target_path),
+                    ("targetFile", self.targetFile),
+                    ("targetUri", self.targetUri),
                 )
             )
         )
 
+    @property
+    def targetFile(self):
+        return self.h5grove_entity._target_file
+
+    @property
+    def targetUri(self):
+        return self.h5grove_entity._target_path
+
 
 class SoftLinkResponse(EntityResponse[SoftLinkContent]):
     def metadata(self, **kwargs):
@@ -66,11 +96,15 @@ class SoftLinkResponse(EntityResponse[SoftLinkContent]):
             sorted(
                 (
                     *super().metadata().items(),
-                    ("targetUri", self.h5grove_entity._target_path),
+                    ("targetUri", self.targetUri),
                 )
             )
         )
 
+    @property
+    def targetUri(self):
+        return self.h5grove_entity._target_path
+
 
 ResolvedH5GroveEntity = TypeVar("ResolvedH5GroveEntity", DatasetContent, GroupContent, ResolvedEntityContent)
 
@@ -83,29 +117,116 @@ class ResolvedEntityResponse(EntityResponse[ResolvedH5GroveEntity]):
     def attributes(self, attr_keys=None):
         return self.h5grove_entity.attributes(attr_keys)
 
+    def attributeMetas(self):
+        return [attrMetaDict(self._hobj.attrs.get_id(k)) for k in sorted(self._hobj.attrs.keys())]
+
     def metadata(self, **kwargs):
-        attribute_names = sorted(self._hobj.attrs.keys())
-        return dict((*super().metadata().items(), ("attributes", [attrMetaDict(self._hobj.attrs.get_id(k)) for k in attribute_names])))
+        return dict((*super().metadata().items(), ("attributes", self.attributeMetas())))
 
 
 class DatasetResponse(ResolvedEntityResponse[DatasetContent]):
     def metadata(self, ixstr=None, min_ndim=None, is_child=False):
         d = super().metadata()
         shapekeys = ("shape") if is_child else ("labels", "ndim", "shape", "size")
-        smeta = {k: v for k, v in shapemeta(self._hobj.shape, self._hobj.size, ixstr=ixstr, min_ndim=min_ndim).items() if k in shapekeys}
+        with phase("index"):
+            smeta = {k: v for k, v in shapemeta(self.shape, self.size, ixstr=ixstr, min_ndim=min_ndim).items() if k in shapekeys}
 
         return dict(
             sorted(
                 (
-                    ("dtype", self._hobj.dtype.str),
+                    ("dtype", self.dtype.str),
                     *d.items(),
                     *smeta.items(),
                 )
             )
         )
 
-    def data(self, ixstr=None, subixstr=None, min_ndim=None):
-        return dsetChunk(self._hobj, ixstr=ixstr, subixstr=subixstr, min_ndim=min_ndim)
+    @property
+    def dtype(self):
+        return self._hobj.dtype
+
+    @property
+    def shape(self):
+        return self._hobj.shape
+
+    @property
+    def size(self):
+        return self._hobj.size
+
+    def data(self, ixstr=None, subixstr=None, min_ndim=None, block=None, fields=None, columnar=None, dtype=None, precision=None):
+        """A slice of the dataset. For compound datasets, fields selects which
+        fields are read, and columnar returns one array per field instead of
+        an array of records. Float data can be reduced for display, by casting
+        it to dtype and/or rounding it to precision significant digits
+        """
+        reducedDtype, transform = reduction(self.dtype, dtype, precision)
+        fieldsDtype(reducedDtype, fields, columnar)
+        chunk = dsetChunk(self._hobj, ixstr=ixstr, subixstr=subixstr, min_ndim=min_ndim, block=block, fields=fields)
+        if transform is not None:
+            with phase("reduce"):
+                chunk = reduceFloats(chunk, reducedDtype, precision)
+        return fieldColumns(chunk) if columnar else chunk
+
+    def transform(self, dtype=None, precision=None):
+        """The reduction that data requests with dtype and precision apply to this dataset, or None"""
+        return reduction(self.dtype, dtype, precision)[1]
+
+    def nbytes(self, ixstr=None, subixstr=None, block=None, fields=None, columnar=None, **kwargs):
+        return self._size(ixstr, subixstr, block) * fieldsDtype(self.dtype, fields, columnar).itemsize
+
+    def values(self, ixstr=None, subixstr=None, block=None, fields=None, columnar=None, **kwargs):
+        readDtype = fieldsDtype(self.dtype, fields, columnar)
+        return self._size(ixstr, subixstr, block) * len(readDtype.names or (None,))
+
+    def _size(self, ixstr=None, subixstr=None, block=None):
+        if self._hobj.shape is None:
+            return 0
+
+        ix = dsetIndex(self._hobj.shape, self._hobj.size, ixstr=ixstr, subixstr=subixstr)
+        if block is not None:
+            ix = ixBlock(self._hobj.shape, ix, *block)
+        return ixSize(self._hobj.shape, ix)
+
+    def streamLayout(self, ixstr=None, subixstr=None, min_ndim=None, blockBytes=None, fields=None, columnar=None, dtype=None, precision=None):
+        """How a data request gets split into blocks of whole rows, each holding about blockBytes raw bytes"""
+        reducedDtype, transform = reduction(self.dtype, dtype, precision)
+        readDtype = fieldsDtype(reducedDtype, fields, columnar)
+        stringInfo = h5py.check_string_dtype(readDtype)
+        if self._hobj.shape is None:
+            shape = None
+        else:
+            with phase("index"):
+                shape = ixShape(self._hobj.shape, dsetIndex(self._hobj.shape, self._hobj.size, ixstr=ixstr, subixstr=subixstr))
+
+        if not shape:
+            # empty and scalar results come in one piece
+            rows, blockRows = None, None
+            if shape is not None and min_ndim is not None:
+                # padded like the data itself (see dsetChunk)
+                shape += (1,) * min_ndim
+        else:
+            if min_ndim is not None:
+                shape += (1,) * (min_ndim - len(shape))
+            rowBytes = int(np.prod(shape[1:], dtype=np.int64)) * readDtype.itemsize
+            rows, blockRows = shape[0], max(1, blockBytes // max(1, rowBytes))
+
+        return dict(
+            (
+                ("blockRows", blockRows),
+                ("dtype", readDtype.str),
+                # the text encoding of string datasets
+                ("encoding", None if stringInfo is None else stringInfo.encoding),
+                # the name and dtype of each field read, for compound datasets
+                ("fields", None if readDtype.names is None else [[name, readDtype[name].str] for name in readDtype.names]),
+                ("rows", rows),
+                ("shape", shape),
+                # the reduction applied to float data, if any
+                ("transform", transform),
+            )
+        )
+
+    def storage(self):
+        return dict(sorted((("name", self.name), *dsetStorageMeta(self._hobj).items())))
 
 
 class GroupResponse(ResolvedEntityResponse[GroupContent]):
@@ -118,14 +239,10 @@ class GroupResponse(ResolvedEntityResponse[GroupContent]):
             return super().contents(ixstr=ixstr, min_ndim=min_ndim)
 
         # Recurse one level
-        return [
-            create_response(self.h5grove_entity._h5file, uriJoin(self.uri, suburi), self.resolve_links).contents(
-                content=False,
-                ixstr=ixstr,
-                min_ndim=min_ndim,
-            )
-            for suburi in self._hobj.keys()
-        ]
+        return [child.contents(content=False, ixstr=ixstr, min_ndim=min_ndim) for child in self.children()]
+
+    def children(self):
+        return (create_response(self.h5grove_entity._h5file, uriJoin(self.uri, suburi), self.resolve_links, lazy=True) for suburi in self._hobj.keys())
 
     def metadata(self, is_child=False, **kwargs):
         if is_child:
@@ -134,24 +251,39 @@ class GroupResponse(ResolvedEntityResponse[GroupContent]):
         return dict(
             sorted(
                 (
-                    ("children", [create_response(self.h5grove_entity._h5file, uriJoin(self.uri, suburi), self.resolve_links).metadata(is_child=True, **kwargs) for suburi in self._hobj.keys()]),
+                    ("children", [child.metadata(is_child=True, **kwargs) for child in self.children()]),
                     *super().metadata().items(),
                 )
             )
         )
 
 
-def create_response(h5file: h5py.File, uri: str, resolve_links: bool):
-    try:
-        h5grove_entity = h5grove.create_content(h5file, uri, resolve_links)
-    except LinkError:
-        h5grove_entity = h5grove.create_content(h5file, uri, resolve_links=False)
+def create_response(h5file: h5py.File, uri: str, resolve_links: bool, lazy: bool = False):
+    """The response for the object at uri. lazy is set for the children of a
+    group, whose external links may be reported unresolved until checked
+    (see LinkTargets)
+    """
+    h5grove_entity = None
+    if resolve_links and resolve_links != LinkResolution.NONE and uri != "/":
+        link = h5file.get(uri, getlink=True)
+        if isinstance(link, h5py.ExternalLink):
+            # through the cache of link targets, rather than having HDF5 open the target file
+            h5grove_entity = linkTargets.content(h5file, uri, link, lazy=lazy)
+
+    if h5grove_entity is None:
+        try:
+            h5grove_entity = h5grove.create_content(h5file, uri, resolve_links)
+        except LinkError:
+            h5grove_entity = h5grove.create_content(h5file, uri, resolve_links=False)
 
     if isinstance(h5grove_entity, h5grove.content.ExternalLinkContent):
         return ExternalLinkResponse(h5grove_entity)
     if isinstance(h5grove_entity, h5grove.content.SoftLinkContent):
         return SoftLinkResponse(h5grove_entity)
     if isinstance(h5grove_entity, h5grove.content.DatasetContent):
+        if h5file.swmr_mode:
+            # pick up the extent and data that a SWMR writer has flushed since the file was opened
+            h5grove_entity._h5py_entity.refresh()
         return DatasetResponse(h5grove_entity)
     elif isinstance(h5grove_entity, h5grove.content.GroupContent):
         return GroupResponse(h5grove_entity, resolve_links)
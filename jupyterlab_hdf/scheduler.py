@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from .cancel import cancelContext
+from .config import HdfConfig
+from .exception import JhdfCancelledError
+from .metrics import Histogram
+
+__all__ = ["HdfLane", "HdfScheduler", "scheduler"]
+
+
+class HdfLane:
+    """A queue of blocking jobs, run by at most `concurrency` threads.
+    Queued jobs are taken round robin by user, so that one user pulling
+    lots of data can't starve everyone else
+    """
+
+    def __init__(self, name, concurrency):
+        self.name = name
+        self.concurrency = concurrency
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"jhdf-{name}")
+        self.running = 0
+
+        # user -> deque of (future, func, group, enqueue time)
+        self._queues = OrderedDict()
+
+        self.completed = 0
+        self.dropped = 0
+        self.waits = Histogram()
+
+    @property
+    def queued(self):
+        return sum(len(q) for q in self._queues.values())
+
+    def submit(self, func, user=None, group=None):
+        """Queue func to run on one of this lane's threads. Returns a future.
+        The job is dropped if its CancelGroup is cancelled before it starts.
+        func runs in a copy of the caller's context, in which group is the
+        current CancelGroup (see cancel.currentCancel)
+        """
+        fut = asyncio.get_running_loop().create_future()
+        func = partial(contextvars.copy_context().run, cancelContext, group, func)
+        self._queues.setdefault(user, deque()).append((fut, func, group, time.monotonic()))
+        self._dispatch()
+        return fut
+
+    def _dispatch(self):
+        while self.running < self.concurrency and self._queues:
+            # take the oldest job of the next user in line, then send that user to the back of the line
+            user, queue = self._queues.popitem(last=False)
+            fut, func, group, enqueued = queue.popleft()
+            if queue:
+                self._queues[user] = queue
+
+            if fut.done():
+                continue
+            if group is not None and group.cancelled:
+                self.dropped += 1
+                fut.set_exception(JhdfCancelledError("all requests for this read were cancelled while it was queued"))
+                continue
+
+            self.waits.observe(time.monotonic() - enqueued)
+
+            self.running += 1
+            job = asyncio.get_running_loop().run_in_executor(self.executor, func)
+            job.add_done_callback(lambda job, fut=fut: self._done(job, fut))
+
+    def _done(self, job, fut):
+        self.running -= 1
+        self.completed += 1
+        if not fut.done():
+            if job.exception() is not None:
+                fut.set_exception(job.exception())
+            else:
+                fut.set_result(job.result())
+        self._dispatch()
+
+    def stats(self):
+        return dict(
+            (
+                ("completed", self.completed),
+                ("concurrency", self.concurrency),
+                ("dropped", self.dropped),
+                ("queued", self.queued),
+                ("running", self.running),
+                ("waitMax", self.waits.max),
+                ("waitMean", self.waits.mean),
+            )
+        )
+
+
+class HdfScheduler:
+    """Routes jobs to separate lanes, so that small latency-sensitive
+    requests (metadata, contents, attributes) never queue behind bulk
+    data reads
+    """
+
+    lanes = ("meta", "bulk")
+
+    def __init__(self):
+        self._lanes = {}
+        self._concurrency = dict(
+            (
+                ("meta", HdfConfig.meta_concurrency.default_value),
+                ("bulk", HdfConfig.bulk_concurrency.default_value),
+            )
+        )
+
+    def configure(self, **concurrency):
+        """Set the thread count of each lane. Lanes that were already started keep their threads"""
+        for name, n in concurrency.items():
+            if name not in self.lanes:
+                raise ValueError(f"unknown scheduler lane: {name}")
+            self._concurrency[name] = max(1, n)
+
+    def lane(self, name):
+        if name not in self._lanes:
+            self._lanes[name] = HdfLane(name, self._concurrency[name])
+        return self._lanes[name]
+
+    def submit(self, lane, func, user=None, group=None):
+        return self.lane(lane).submit(func, user=user, group=group)
+
+    def stats(self):
+        return {name: self.lane(name).stats() for name in self.lanes}
+
+
+# shared by every manager in the process
+scheduler = HdfScheduler()
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import fnmatch
+import h5py
+import logging
+import numpy as np
+import os
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import Future
+from contextlib import ExitStack
+from notebook.utils import url_path_join
+from tornado.httpclient import HTTPError
+
+from .baseHandler import HdfBaseManager, HdfBaseHandler
+from .metrics import phase
+from .policy import openFile
+from .util import fileIdentity, hobjType, uriJoin
+from .watch import fileWatcher
+
+__all__ = ["HdfSearchManager", "HdfSearchHandler", "SearchIndex", "searchIndexes"]
+
+# what a query can be matched against: object names, full paths, attribute names, and attribute values
+SEARCH_FIELDS = ("attr", "name", "path", "value")
+SEARCH_MODES = ("glob", "regex", "substring")
+# max hits per page
+SEARCH_MAX_LIMIT = 1000
+# attribute values longer than this (once turned into text) aren't searchable
+MAX_VALUE_CHARS = 256
+
+
+def attrText(value):
+    """Searchable text of a (small) attribute value, or None"""
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", "replace")
+    elif isinstance(value, np.ndarray):
+        if value.size > 16 or value.dtype.kind not in "biufSUO":
+            return None
+        value = " ".join(attrText(v) or "" for v in value.ravel().tolist())
+    elif isinstance(value, (np.generic, int, float, bool)):
+        value = str(value.item() if isinstance(value, np.generic) else value)
+    if not isinstance(value, str) or len(value) > MAX_VALUE_CHARS:
+        return None
+    return value
+
+
+def walkObjects(f, uri="/"):
+    """Yield (uri, name, type, attrs) for every object under uri, breadth
+    first, links included. attrs is a list of (name, text of the value or None)
+    """
+    # hard links can make the same group show up under many paths (or even inside itself), so each group is walked only once
+    seen = set()
+    queue = deque((uri,))
+    while queue:
+        guri = queue.popleft()
+        group = f[guri]
+        addr = h5py.h5o.get_info(group.id).addr
+        if addr in seen:
+            continue
+        seen.add(addr)
+
+        for name in group.keys():
+            child = uriJoin(guri, name)
+            link = group.get(name, getlink=True)
+            if isinstance(link, h5py.SoftLink):
+                yield child, name, "soft_link", ()
+            elif isinstance(link, h5py.ExternalLink):
+                yield child, name, "external_link", ()
+            else:
+                hobj = group[name]
+                attrs = []
+                for key in hobj.attrs:
+                    try:
+                        attrs.append((key, attrText(hobj.attrs[key])))
+                    except Exception:
+                        # eg an attribute of a type that h5py can't read
+                        attrs.append((key, None))
+                tipe = hobjType(hobj)
+                yield child, name, tipe, attrs
+                if tipe == "group":
+                    queue.append(child)
+
+
+def queryMatcher(q, mode):
+    """A case insensitive test of whether a string matches the query, and the
+    longest literal that any match must contain (lowercased), if known
+    """
+    if mode == "substring":
+        literal = q.lower()
+        return (lambda s: literal in s.lower()), literal
+    if mode == "glob":
+        # the longest run of characters that aren't wildcards
+        literal = max(re.split(r"[*?]|\[[^\]]*\]", q), key=len).lower()
+        return re.compile(fnmatch.translate(q), re.IGNORECASE).match, literal
+    if mode == "regex":
+        return re.compile(q, re.IGNORECASE).search, None
+    raise ValueError(f"unknown search mode {mode!r}")
+
+
+def trigrams(s):
+    return {s[i : i + 3] for i in range(len(s) - 2)}
+
+
+def inScope(path, scope):
+    return scope == "/" or path.startswith(scope + "/")
+
+
+## index
+class SearchIndex:
+    """Inverted index of the names, attribute names, and attribute values in
+    one version of a file, built in a single traversal. The distinct strings
+    are indexed by their trigrams, so that a query only verifies the strings
+    that hold every trigram of its literal part, and each string maps to the
+    objects that it belongs to. Paths are matched by a plain scan
+    """
+
+    def __init__(self, fident):
+        self.fident = fident
+        self.paths = []
+        self.names = []
+        self.types = []
+        self.strings = []
+        self._stringIds = dict()
+        self._trigrams = defaultdict(lambda: array("I"))
+        # field -> string id -> ids of the objects that the string belongs to
+        self._owners = dict((field, defaultdict(lambda: array("I"))) for field in ("attr", "name", "value"))
+
+    @classmethod
+    def build(cls, f, fident):
+        index = cls(fident)
+        for entry in walkObjects(f):
+            index.add(*entry)
+        return index
+
+    def add(self, uri, name, tipe, attrs):
+        objId = len(self.paths)
+        self.paths.append(uri)
+        self.names.append(name)
+        self.types.append(tipe)
+        self._own("name", name, objId)
+        for key, text in attrs:
+            self._own("attr", key, objId)
+            if text is not None:
+                self._own("value", text, objId)
+
+    def _own(self, field, s, objId):
+        sid = self._stringIds.get(s)
+        if sid is None:
+            sid = self._stringIds[s] = len(self.strings)
+            self.strings.append(s)
+            for gram in trigrams(s.lower()):
+                self._trigrams[gram].append(sid)
+        owners = self._owners[field][sid]
+        # an object owns a string once per field, however many of its attributes hold it
+        if not owners or owners[-1] != objId:
+            owners.append(objId)
+
+    def _candidates(self, literal):
+        """Ids of the strings that might contain literal"""
+        grams = trigrams(literal) if literal else ()
+        if not grams:
+            return range(len(self.strings))
+        postings = sorted((self._trigrams.get(gram, ()) for gram in grams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+        return sorted(candidates)
+
+    def search(self, scope, matcher, literal, fields):
+        """Ids of the objects under scope that match, in traversal order, along with the fields that matched"""
+        matched = defaultdict(set)
+        with phase("search"):
+            stringFields = [field for field in fields if field in self._owners]
+            if stringFields:
+                for sid in self._candidates(literal):
+                    if not matcher(self.strings[sid]):
+                        continue
+                    for field in stringFields:
+                        for objId in self._owners[field].get(sid, ()):
+                            matched[objId].add(field)
+            if "path" in fields:
+                for objId, path in enumerate(self.paths):
+                    if matcher(path):
+                        matched[objId].add("path")
+        return [(objId, matched[objId]) for objId in sorted(matched) if inScope(self.paths[objId], scope)]
+
+
+class SearchIndexCache:
+    """The search indexes of the most recently searched files, each built in
+    the background on the first search of a version of a file
+    """
+
+    def __init__(self, maxFiles=4, log=None):
+        self.maxFiles = maxFiles
+        self.log = log or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+        self._building = dict()
+
+    def configure(self, maxFiles=None):
+        if maxFiles is not None:
+            with self._lock:
+                self.maxFiles = maxFiles
+                self._evict()
+
+    def get(self, fpath, fident):
+        """The index of this version of the file at fpath, or None if it hasn't been built yet"""
+        key = os.path.realpath(fpath)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None or index.fident != fident:
+                return None
+            self._indexes.move_to_end(key)
+            return index
+
+    def build(self, fpath, fident):
+        """Build the index of this version of the file at fpath in the background,
+        unless it's being built already. Returns a future of the index
+        """
+        key = os.path.realpath(fpath)
+        with self._lock:
+            future = self._building.get((key, fident))
+            if future is None:
+                future = self._building[(key, fident)] = Future()
+                threading.Thread(target=self._build, args=(fpath, key, fident, future), name="jhdf-search-index", daemon=True).start()
+            return future
+
+    def _build(self, fpath, key, fident, future):
+        index = None
+        try:
+            t0 = time.perf_counter()
+            with openFile(fpath) as f:
+                index = SearchIndex.build(f, fident)
+            self.log.info(f"built the search index of {fpath} ({len(index.paths)} objects) in {time.perf_counter() - t0:.1f}s")
+        except Exception:
+            self.log.exception(f"failed to build the search index of {fpath}")
+        finally:
+            with self._lock:
+                self._building.pop((key, fident), None)
+                # the file may have changed while it was being indexed
+                if index is not None and fileIdentity(fpath) == fident:
+                    self._indexes[key] = index
+                    self._indexes.move_to_end(key)
+                    self._evict()
+            future.set_result(index)
+
+    def invalidate(self, fpath):
+        """Drop the index of the file at fpath, which has changed"""
+        with self._lock:
+            self._indexes.pop(os.path.realpath(fpath), None)
+
+    def _evict(self):
+        while len(self._indexes) > max(self.maxFiles, 0):
+            self._indexes.popitem(last=False)
+
+
+searchIndexes = SearchIndexCache()
+fileWatcher.subscribe(searchIndexes.invalidate)
+
+
+## manager
+class HdfSearchManager(HdfBaseManager):
+    """Implements HDF5 search"""
+
+    def __init__(self, log, notebook_dir, resolve_links=None, scanLimit=10000):
+        # links are matched by name, never followed
+        super().__init__(log, notebook_dir)
+        self.scanLimit = scanLimit
+
+    def _get(self, fpath, uri, q=None, mode="substring", fields=SEARCH_FIELDS, offset=0, limit=100, **kwargs):
+        matcher, literal = queryMatcher(q, mode)
+        # a scope of /group/ is /group (and of / is /)
+        uri = "/" + uri.strip("/")
+        fident = fileWatcher.identity(fpath)
+        index = searchIndexes.get(fpath, fident)
+        if index is None:
+            searchIndexes.build(fpath, fident)
+            return self._scan(fpath, uri, matcher, fields, offset, limit)
+
+        hits = index.search(uri, matcher, literal, fields)
+        return dict(
+            (
+                ("complete", True),
+                ("hits", [self._hit(index.paths[objId], index.names[objId], index.types[objId], matched) for objId, matched in hits[offset : offset + limit]]),
+                ("indexed", True),
+                ("total", len(hits)),
+            )
+        )
+
+    def _scan(self, fpath, uri, matcher, fields, offset, limit):
+        """Search by walking the file, until enough hits for the page are found
+        or scanLimit objects have been looked at
+        """
+        hits = []
+        scanned = 0
+        complete = True
+        with ExitStack() as stack:
+            with phase("open"):
+                f = stack.enter_context(openFile(fpath))
+            stack.enter_context(phase("search"))
+            if not isinstance(f.get(uri), h5py.Group):
+                return dict((("complete", True), ("hits", []), ("indexed", False), ("total", 0)))
+            for path, name, tipe, attrs in walkObjects(f, uri):
+                if scanned >= self.scanLimit or len(hits) >= offset + limit:
+                    complete = False
+                    break
+                scanned += 1
+                matched = set()
+                if "name" in fields and matcher(name):
+                    matched.add("name")
+                if "path" in fields and matcher(path):
+                    matched.add("path")
+                if "attr" in fields and any(matcher(key) for key, _ in attrs):
+                    matched.add("attr")
+                if "value" in fields and any(text is not None and matcher(text) for _, text in attrs):
+                    matched.add("value")
+                if matched:
+                    hits.append(self._hit(path, name, tipe, matched))
+
+        return dict(
+            (
+                ("complete", complete),
+                ("hits", hits[offset : offset + limit]),
+                ("indexed", False),
+                # unknown until the whole file has been looked at
+                ("total", len(hits) if complete else None),
+            )
+        )
+
+    def _hit(self, uri, name, tipe, matched):
+        return dict((("matches", sorted(matched)), ("name", name), ("type", tipe), ("uri", uri)))
+
+
+## handler
+class HdfSearchHandler(HdfBaseHandler):
+    """A handler for searching HDF5 files"""
+
+    managerClass = HdfSearchManager
+
+    def initialize(self, notebook_dir, endpoint=None):
+        super().initialize(notebook_dir, endpoint=endpoint)
+        self.manager.scanLimit = self.hdf_config.search_scan_limit
+
+    def _validatorArgs(self, path, fident):
+        # a scan may come back incomplete, so the results change once the file is indexed, even though the file doesn't
+        return dict((("indexed", searchIndexes.get(url_path_join(self.notebook_dir, path), fident) is not None),))
+
+    async def _respond(self, path, uri, kwargs, profile=None):
+        q = self.get_query_argument("q", default=None)
+        mode = self.get_query_argument("mode", default="substring")
+        fields = tuple(sorted(set(self.get_query_arguments("fields")))) or SEARCH_FIELDS
+        if not q:
+            raise HTTPError(400, "a search needs a query, given by the `q` parameter")
+        if mode not in SEARCH_MODES:
+            raise HTTPError(400, f"unknown search mode {mode!r}, should be one of {', '.join(SEARCH_MODES)}")
+        unknown = [field for field in fields if field not in SEARCH_FIELDS]
+        if unknown:
+            raise HTTPError(400, f"unknown search fields {', '.join(unknown)}, should be among {', '.join(SEARCH_FIELDS)}")
+        try:
+            queryMatcher(q, mode)
+            offset = max(0, int(self.get_query_argument("offset", default="0")))
+            limit = min(max(1, int(self.get_query_argument("limit", default="100"))), SEARCH_MAX_LIMIT)
+        except (re.error, ValueError) as e:
+            raise HTTPError(400, f"malformed search: {e}")
+
+        # updated in place, so that traces and the slow request log show the search
+        kwargs.update(q=q, mode=mode, fields=fields, offset=offset, limit=limit)
+        await super()._respond(path, uri, kwargs, profile=profile)
@@ -3,9 +3,11 @@
 # Copyright (c) Jupyter Development Team.
 # Distributed under the terms of the Modified BSD License.
 
-import h5py
+from contextlib import ExitStack
 
 from .baseHandler import HdfBaseManager, HdfBaseHandler
+from .metrics import phase
+from .policy import openFile
 from .util import hobjType
 
 __all__ = ['HdfSnippetManager', 'HdfSnippetHandler']
@@ -23,8 +25,14 @@ ixTemplate = '''[{ixstr}]'''
 class HdfSnippetManager(HdfBaseManager):
     """Implements HDF5 contents handling
     """
+    def __init__(self, log, notebook_dir, resolve_links=None):
+        # snippets always point at the uri as given, so links are never resolved
+        super().__init__(log, notebook_dir)
+
     def _get(self, fpath, uri, ixstr=None, subixstr=None, **kwargs):
-        with h5py.File(fpath, 'r') as f:
+        with ExitStack() as stack:
+            with phase('open'):
+                f = stack.enter_context(openFile(fpath))
             tipe = hobjType(f[uri])
 
         if tipe == 'dataset':
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+from tornado import web
+
+from notebook.base.handlers import APIHandler
+
+from .baseHandler import HdfBaseManager
+from .index import structureIndex
+from .links import linkTargets
+from .memory import memoryBudget
+from .metrics import metrics, promHistogram, promSamples
+from .policy import openPolicy
+from .scheduler import scheduler
+from .swmr import swmrFiles
+from .watch import fileWatcher
+
+__all__ = ["HdfMetricsHandler", "HdfStatusHandler"]
+
+
+def promLines():
+    """Every metric of the HDF5 request pipeline, in prometheus text format"""
+    yield from metrics.promLines()
+
+    inflight = HdfBaseManager.inflight
+    yield from promSamples("jhdf_inflight_hits_total", "counter", "Requests that were coalesced onto an identical in-flight read.", {(("manager", m),): n for m, n in inflight.hits.items()})
+    yield from promSamples("jhdf_inflight_misses_total", "counter", "Requests that started a read of their own.", {(("manager", m),): n for m, n in inflight.misses.items()})
+    yield from promSamples("jhdf_inflight_reads", "gauge", "Reads currently in flight.", {(): len(inflight)})
+
+    lanes = dict((name, scheduler.lane(name)) for name in scheduler.lanes)
+    yield from promHistogram("jhdf_lane_wait_seconds", "Time requests spent queued in each scheduler lane.", {(("lane", name),): lane.waits for name, lane in lanes.items()})
+    yield from promSamples("jhdf_lane_queued", "gauge", "Requests queued in each scheduler lane.", {(("lane", name),): lane.queued for name, lane in lanes.items()})
+    yield from promSamples("jhdf_lane_running", "gauge", "Requests running in each scheduler lane.", {(("lane", name),): lane.running for name, lane in lanes.items()})
+    yield from promSamples("jhdf_lane_dropped_total", "counter", "Queued requests dropped because they were cancelled.", {(("lane", name),): lane.dropped for name, lane in lanes.items()})
+
+    yield from promSamples("jhdf_memory_budget_bytes", "gauge", "Memory budget for in-flight data requests (0 means unlimited).", {(): memoryBudget.budget})
+    yield from promSamples("jhdf_memory_used_bytes", "gauge", "Estimated bytes held by in-flight data requests.", {(): memoryBudget.used})
+    yield from promSamples("jhdf_memory_peak_bytes", "gauge", "Highest value of jhdf_memory_used_bytes so far.", {(): memoryBudget.peak})
+    yield from promSamples("jhdf_memory_waiting", "gauge", "Requests waiting for room in the memory budget.", {(): memoryBudget.waiting})
+    yield from promSamples("jhdf_memory_rejected_total", "counter", "Requests rejected for lack of room in the memory budget.", {(): memoryBudget.rejected})
+
+    yield from promSamples("jhdf_index_hits_total", "counter", "Metadata and contents requests served from the structure index.", {(): structureIndex.hits})
+    yield from promSamples("jhdf_index_misses_total", "counter", "Metadata and contents requests that the structure index couldn't serve.", {(): structureIndex.misses})
+    yield from promSamples("jhdf_index_crawls_total", "counter", "Files whose structure has been indexed.", {(): structureIndex.crawled})
+    watch = fileWatcher.stats()
+    yield from promSamples("jhdf_watch_files", "gauge", "Files whose changes are being watched.", {(): watch["watched"]})
+    yield from promSamples("jhdf_watch_hits_total", "counter", "File identity lookups answered without a stat.", {(): watch["hits"]})
+    yield from promSamples("jhdf_watch_changes_total", "counter", "Changes seen to watched files.", {(): watch["changes"]})
+    links = linkTargets.stats()
+    yield from promSamples("jhdf_link_targets", "gauge", "External link target files held open.", {(): links["files"]})
+    yield from promSamples("jhdf_link_hits_total", "counter", "External links whose target was known to exist or not without opening it.", {(): links["hits"]})
+    yield from promSamples("jhdf_link_target_opens_total", "counter", "Opens of external link target files.", {(): links["opens"]})
+    core = openPolicy.stats()
+    yield from promSamples("jhdf_core_files", "gauge", "Files held in memory by the core open policy.", {(): core["images"]})
+    yield from promSamples("jhdf_core_bytes", "gauge", "Bytes of files held in memory by the core open policy.", {(): core["imageBytes"]})
+    swmr = swmrFiles.stats()
+    yield from promSamples("jhdf_swmr_handles", "gauge", "Files held open in SWMR read mode.", {(): swmr["handles"]})
+    yield from promSamples("jhdf_swmr_opens_total", "counter", "Opens of files in SWMR read mode.", {(): swmr["opens"]})
+
+
+## handlers
+class HdfMetricsHandler(APIHandler):
+    """A handler exposing HDF5 request metrics in prometheus text format"""
+
+    @web.authenticated
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.finish("\n".join(promLines()) + "\n")
+
+    def finish(self, *args, **kwargs):
+        # skip APIHandler.finish, which forces a json content type and counts
+        # each scrape as user activity (which would defeat idle culling)
+        return web.RequestHandler.finish(self, *args, **kwargs)
+
+
+class HdfStatusHandler(APIHandler):
+    """A handler reporting the load on the HDF5 request pipeline"""
+
+    @web.authenticated
+    def get(self):
+        self.finish(
+            dict(
+                (
+                    ("index", structureIndex.stats()),
+                    ("inflight", HdfBaseManager.inflight.stats()),
+                    ("links", linkTargets.stats()),
+                    ("memory", memoryBudget.stats()),
+                    ("open", openPolicy.stats()),
+                    ("scheduler", scheduler.stats()),
+                    ("swmr", swmrFiles.stats()),
+                    ("watch", fileWatcher.stats()),
+                )
+            )
+        )
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+from .baseHandler import HdfFileManager, HdfBaseHandler
+
+__all__ = ["HdfStorageManager", "HdfStorageHandler"]
+
+## manager
+class HdfStorageManager(HdfFileManager):
+    """Implements HDF5 dataset storage layout handling"""
+
+    def _getResponse(self, responseObj, **kwargs):
+        return responseObj.storage()
+
+
+## handler
+class HdfStorageHandler(HdfBaseHandler):
+    """A handler for HDF5 dataset storage layout"""
+
+    managerClass = HdfStorageManager
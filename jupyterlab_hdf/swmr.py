@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import h5py
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from .watch import fileWatcher
+
+__all__ = ["SwmrFiles", "swmrFiles"]
+
+
+class _Handle:
+    """A file held open in SWMR read mode, and the requests using it"""
+
+    def __init__(self, f, fident):
+        self.f = f
+        # (device, inode) and size of the file, to tell when it gets replaced or rewritten
+        self.inode = fident[:2]
+        self.size = fident[2]
+        self.users = 0
+        self.retired = False
+        self.lastUsed = time.monotonic()
+
+
+class SwmrFiles:
+    """Long-lived handles of files opened in SWMR (single writer, multiple
+    readers) read mode, shared by every request for a file. Unlike a plain
+    read-only open, this can read files that a writer still holds open in
+    SWMR mode, and skips reopening the file on every request. Datasets read
+    through these handles are refreshed (see create_response), so that they
+    show the data flushed by the writer so far.
+
+    A handle is reopened when its file is replaced or shrinks, and closed once
+    no request has used it for `idle` seconds
+    """
+
+    def __init__(self, enabled=False, idle=60.0, log=None):
+        self.enabled = enabled
+        self.idle = idle
+        self.log = log or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._handles = dict()
+
+        self.opens = 0
+        self.reuses = 0
+
+    def configure(self, enabled=None, idle=None, log=None):
+        if enabled is not None:
+            self.enabled = enabled
+            if not enabled:
+                self.close()
+        if idle is not None:
+            self.idle = idle
+        if log is not None:
+            self.log = log
+
+    @contextmanager
+    def open(self, fpath):
+        """The file at fpath, through the shared SWMR handle of it"""
+        handle = self._acquire(fpath)
+        try:
+            yield handle.f
+        finally:
+            self._release(handle)
+
+    def close(self):
+        """Close every handle that isn't in use, and the others as soon as they aren't"""
+        with self._lock:
+            for handle in self._handles.values():
+                self._retire(handle)
+            self._handles.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict((("enabled", self.enabled), ("handles", len(self._handles)), ("opens", self.opens), ("reuses", self.reuses)))
+
+    def _acquire(self, fpath):
+        key = os.path.realpath(fpath)
+        fident = fileWatcher.identity(fpath)
+        with self._lock:
+            self._sweep(time.monotonic())
+            handle = self._handles.get(key)
+            if handle is not None and (fident is None or handle.inode != fident[:2] or fident[2] < handle.size):
+                # the file was replaced, or truncated and written anew (SWMR writers only ever append), so the handle is of no use
+                self._retire(self._handles.pop(key))
+                handle = None
+            if handle is None:
+                # opened under the lock, so that concurrent requests don't open the file twice. Without a file
+                # lock, which would keep the next writer of the file out for as long as the handle is held
+                handle = _Handle(h5py.File(fpath, "r", swmr=True, locking=False), fident or (None, None, 0))
+                self._handles[key] = handle
+                self.opens += 1
+            else:
+                handle.size = fident[2]
+                self.reuses += 1
+            handle.users += 1
+            return handle
+
+    def _release(self, handle):
+        with self._lock:
+            handle.users -= 1
+            handle.lastUsed = time.monotonic()
+            if handle.retired and not handle.users:
+                handle.f.close()
+
+    def _retire(self, handle):
+        handle.retired = True
+        if not handle.users:
+            handle.f.close()
+
+    def _sweep(self, now):
+        """Close the handles that no request has used in a while"""
+        for key, handle in list(self._handles.items()):
+            if not handle.users and now - handle.lastUsed > self.idle:
+                self._retire(self._handles.pop(key))
+
+
+swmrFiles = SwmrFiles()
@@ -0,0 +1,92 @@
+import h5py
+import numpy as np
+import os
+from email.utils import format_datetime
+from datetime import datetime, timezone
+from traitlets.config import Config
+from jupyterlab_hdf.tests.utils import ServerTest, waitForWatcher
+
+
+class TestCaching(ServerTest):
+    config = Config({"NotebookApp": {"nbserver_extensions": {"jupyterlab_hdf": True}}, "HdfConfig": {"allow_profiling": True}})
+
+    def setUp(self):
+        super().setUp()
+
+        self.fpath = os.path.join(self.notebook_dir, "test_file.h5")
+        with h5py.File(self.fpath, "w") as h5file:
+            h5file["twoD_dataset"] = np.arange(0, 100, dtype=np.float64).reshape(10, 10)
+        waitForWatcher(self.fpath)
+
+    def get(self, endpoint, params, **headers):
+        return self.request("GET", f"/hdf/{endpoint}/test_file.h5", params=params, headers=headers)
+
+    def test_etag(self):
+        response = self.get("meta", {"uri": "/twoD_dataset"})
+
+        assert response.status_code == 200
+        assert response.headers["Etag"].startswith('W/"')
+        assert response.headers["Cache-Control"] == "private, no-cache"
+        assert response.headers["Last-Modified"] == format_datetime(datetime.fromtimestamp(int(os.stat(self.fpath).st_mtime), timezone.utc), usegmt=True)
+
+    def test_if_none_match(self):
+        params = {"uri": "/twoD_dataset", "ixstr": ":, :", "min_ndim": 2}
+        etag = self.get("data", params).headers["Etag"]
+
+        response = self.get("data", params, **{"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["Etag"] == etag
+
+        # whitespace in index strings and params that don't change the response don't change the validator
+        response = self.get("data", {**params, "ixstr": ":,:", "deadline": 10000}, **{"If-None-Match": etag})
+        assert response.status_code == 304
+
+        for changed in ({"ixstr": "0:2, :"}, {"stream": "json"}):
+            response = self.get("data", {**params, **changed}, **{"If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.headers["Etag"] != etag
+
+    def test_no_read_when_unchanged(self):
+        params = {"uri": "/twoD_dataset"}
+        etag = self.get("meta", params).headers["Etag"]
+
+        # scribble over the file, keeping its inode, size and mtime
+        st = os.stat(self.fpath)
+        with open(self.fpath, "r+b") as f:
+            f.write(b"\0" * 64)
+        os.utime(self.fpath, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        # a 304 proves that the file was never opened
+        assert self.get("meta", params, **{"If-None-Match": etag}).status_code == 304
+
+    def test_changed_file(self):
+        params = {"uri": "/twoD_dataset"}
+        etag = self.get("meta", params).headers["Etag"]
+
+        with h5py.File(self.fpath, "a") as h5file:
+            h5file["twoD_dataset"].attrs["units"] = "m"
+        waitForWatcher(self.fpath)
+
+        response = self.get("meta", params, **{"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["Etag"] != etag
+        assert response.json()["attributes"] == [{"name": "units", "dtype": "|O", "shape": []}]
+
+    def test_if_modified_since(self):
+        params = {"uri": "/twoD_dataset"}
+        lastModified = self.get("meta", params).headers["Last-Modified"]
+
+        assert self.get("meta", params, **{"If-Modified-Since": lastModified}).status_code == 304
+        assert self.get("meta", params, **{"If-Modified-Since": "Thu, 01 Jan 1970 00:00:00 GMT"}).status_code == 200
+        # If-None-Match takes precedence
+        assert self.get("meta", params, **{"If-Modified-Since": lastModified, "If-None-Match": 'W/"stale"'}).status_code == 200
+
+    def test_errors_and_profiles_not_cached(self):
+        response = self.get("meta", {"uri": "/missing"})
+        assert response.status_code == 404
+        assert "Etag" not in response.headers
+
+        etag = self.get("meta", {"uri": "/twoD_dataset"}).headers["Etag"]
+        response = self.get("meta", {"uri": "/twoD_dataset", "profile": "1"}, **{"If-None-Match": etag})
+        assert response.status_code == 200
@@ -0,0 +1,63 @@
+import h5py
+import numpy as np
+import os
+import pytest
+from requests import HTTPError
+from jupyterlab_hdf.cancel import CancelRegistry, CancelToken
+from jupyterlab_hdf.exception import JhdfCancelledError
+from jupyterlab_hdf.tests.utils import ServerTest
+
+
+class TestCancel(ServerTest):
+    def setUp(self):
+        super().setUp()
+
+        with h5py.File(os.path.join(self.notebook_dir, "test_file.h5"), "w") as h5file:
+            h5file["twoD_dataset"] = np.arange(0, 10, dtype=np.float64).reshape(2, 5)
+
+    def test_expired_deadline(self):
+        with pytest.raises(HTTPError) as e:
+            self.tester.get(["data", "test_file.h5"], params={"uri": "/twoD_dataset", "deadline": 0})
+
+        assert e.value.response.status_code == 504
+
+    def test_malformed_deadline(self):
+        with pytest.raises(HTTPError) as e:
+            self.tester.get(["data", "test_file.h5"], params={"uri": "/twoD_dataset", "deadline": "soon"})
+
+        assert e.value.response.status_code == 400
+
+    def test_live_deadline(self):
+        response = self.tester.get(["data", "test_file.h5"], params={"uri": "/twoD_dataset", "deadline": 60000, "cancel": "viewport-1"})
+
+        assert response.status_code == 200
+        assert response.json() == np.arange(0, 10, dtype=np.float64).reshape(2, 5).tolist()
+
+    def test_cancel_unknown_key(self):
+        response = self.tester.post(["cancel"], params={"cancel": ["viewport-1", "viewport-2"]})
+
+        assert response.status_code == 200
+        assert response.json() == {"cancelled": 0}
+
+
+def test_token_deadline():
+    token = CancelToken()
+    token.check()
+
+    token.setTimeout(0)
+    assert token.expired
+    with pytest.raises(JhdfCancelledError, match="deadline"):
+        token.check()
+
+
+def test_registry():
+    registry = CancelRegistry()
+    tokens = [CancelToken(), CancelToken(), CancelToken()]
+    registry.register("a", tokens[0])
+    registry.register("a", tokens[1])
+    registry.register("b", tokens[2])
+    registry.discard("a", tokens[1])
+
+    assert registry.cancel("a") == 1
+    assert registry.cancel("a") == 0
+    assert [t.cancelled for t in tokens] == [True, False, False]
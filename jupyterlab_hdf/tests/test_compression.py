@@ -0,0 +1,118 @@
+import gzip
+import h5py
+import json
+import numpy as np
+import os
+import pytest
+import zlib
+from traitlets.config import Config
+from jupyterlab_hdf.compression import Compressor, negotiate, shuffle
+from jupyterlab_hdf.tests.utils import ServerTest
+
+BIG = np.arange(0, 2000, dtype=np.float64).reshape(200, 10) / 7.0
+SMALL = np.arange(0, 4, dtype=np.int64)
+
+
+class TestCompression(ServerTest):
+    config = Config(
+        {
+            "NotebookApp": {"nbserver_extensions": {"jupyterlab_hdf": True}},
+            "HdfConfig": {"compression": ["zstd", "gzip"], "compression_threshold": 256, "stream_block_bytes": 1000},
+        }
+    )
+
+    def setUp(self):
+        super().setUp()
+
+        with h5py.File(os.path.join(self.notebook_dir, "test_file.h5"), "w") as h5file:
+            h5file["big"] = BIG
+            h5file["small"] = SMALL
+
+    def get(self, endpoint, params, encoding):
+        return self.request("GET", f"/hdf/{endpoint}/test_file.h5", params=params, headers={"Accept-Encoding": encoding})
+
+    def test_gzip(self):
+        response = self.get("data", {"uri": "/big"}, "gzip")
+
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert response.json() == BIG.tolist()
+
+    def test_zstd(self):
+        zstandard = pytest.importorskip("zstandard")
+        for params in ({"uri": "/big"}, {"uri": "/big", "stream": "json"}):
+            response = self.request("GET", "/hdf/data/test_file.h5", params=params, headers={"Accept-Encoding": "gzip;q=0.5, zstd"}, stream=True)
+
+            assert response.headers["Content-Encoding"] == "zstd"
+            body = zstandard.ZstdDecompressor().decompressobj().decompress(response.raw.read(decode_content=False))
+            assert json.loads(body) == BIG.tolist()
+
+    def test_identity(self):
+        response = self.get("data", {"uri": "/big"}, "identity")
+
+        assert "Content-Encoding" not in response.headers
+        assert response.json() == BIG.tolist()
+
+    def test_below_threshold(self):
+        response = self.get("data", {"uri": "/small"}, "gzip")
+
+        assert "Content-Encoding" not in response.headers
+        assert response.json() == SMALL.tolist()
+
+    def test_endpoint_not_compressed(self):
+        response = self.get("snippet", {"uri": "/big"}, "gzip")
+
+        assert "Content-Encoding" not in response.headers
+
+    def test_json_stream(self):
+        response = self.get("data", {"uri": "/big", "stream": "json"}, "gzip")
+
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.json() == BIG.tolist()
+
+    def test_binary_stream_shuffled(self):
+        response = self.get("data", {"uri": "/big", "stream": "binary", "shuffle": 1}, "gzip")
+
+        assert response.headers["Content-Encoding"] == "gzip"
+        itemsize, blockBytes = int(response.headers["X-Hdf-Shuffle"]), int(response.headers["X-Hdf-Block-Bytes"])
+        assert itemsize == 8
+        assert blockBytes == 1000 // 80 * 80
+
+        # undo the shuffle of each block
+        content = response.content
+        blocks = [content[i : i + blockBytes] for i in range(0, len(content), blockBytes)]
+        data = b"".join(np.frombuffer(block, dtype=np.uint8).reshape(itemsize, -1).T.tobytes() for block in blocks)
+        assert (np.frombuffer(data, dtype=response.headers["X-Hdf-Dtype"]).reshape(BIG.shape) == BIG).all()
+
+    def test_binary_stream_not_shuffled_uncompressed(self):
+        response = self.get("data", {"uri": "/big", "stream": "binary", "shuffle": 1}, "identity")
+
+        assert "X-Hdf-Shuffle" not in response.headers
+        assert (np.frombuffer(response.content, dtype=response.headers["X-Hdf-Dtype"]).reshape(BIG.shape) == BIG).all()
+
+
+def test_negotiate():
+    assert negotiate("gzip, deflate", ["zstd", "gzip"]) == "gzip"
+    assert negotiate("gzip, zstd", ["zstd", "gzip"]) == "zstd"
+    assert negotiate("zstd;q=0, gzip;q=0.1", ["zstd", "gzip"]) == "gzip"
+    assert negotiate("*", ["gzip"]) == "gzip"
+    assert negotiate("*, gzip;q=0", ["gzip"]) is None
+    assert negotiate("identity", ["zstd", "gzip"]) is None
+    assert negotiate(None, ["gzip"]) is None
+
+
+def test_shuffle():
+    data = np.arange(6, dtype="<u2").tobytes()
+
+    assert shuffle(data, 2) == bytes([0, 1, 2, 3, 4, 5, 0, 0, 0, 0, 0, 0])
+    assert shuffle(data, 1) == data
+
+
+def test_incremental_gzip():
+    compressor = Compressor("gzip", 4)
+    parts = [compressor.compress(b"[1,2,", flush=True), compressor.compress(b"3]", flush=True)]
+
+    # everything sent so far can be decoded, before the stream is finished
+    assert zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(b"".join(parts)) == b"[1,2,3]"
+    assert gzip.decompress(b"".join(parts) + compressor.finish()) == b"[1,2,3]"
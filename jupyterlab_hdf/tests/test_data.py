@@ -1,7 +1,11 @@
 import h5py
+import json
 import os
 import numpy as np
-from jupyterlab_hdf.tests.utils import ServerTest
+import pytest
+from requests import HTTPError
+from traitlets.config import Config
+from jupyterlab_hdf.tests.utils import ServerTest, waitForWatcher
 
 
 SCALAR = np.int32(56)
@@ -9,6 +13,9 @@ ONE_D = np.arange(0, 11, dtype=np.int64)
 TWO_D = np.arange(0, 10, dtype=np.float64).reshape(2, 5) / 10.0
 THREE_D = np.arange(0, 24, dtype=np.int64).reshape(2, 3, 4)
 COMPLEX = np.array([1 + 1j, 1 + 2j, 2 + 2j, -5j, 5], dtype=complex)
+STRINGS = ["sample_%d" % i for i in range(10)] + ["échantillon", ""]
+BIG_ENDIAN_COMPLEX = COMPLEX.astype(">c8")
+COMPOUND = np.array([(i, i / 2, -i, b"row%d" % i) for i in range(10)], dtype=[("id", "<i8"), ("x", "<f8"), ("y", ">i2"), ("label", "S8")])
 
 
 class TestData(ServerTest):
@@ -20,8 +27,15 @@ class TestData(ServerTest):
             h5file["twoD_dataset"] = TWO_D
             h5file["threeD_dataset"] = THREE_D
             h5file["complex"] = COMPLEX
+            h5file["complex64"] = COMPLEX.astype("<c8")
+            h5file["big_endian_complex"] = BIG_ENDIAN_COMPLEX
             h5file["scalar"] = SCALAR
+            h5file["complex_scalar"] = np.complex128(1 + 1j)
+            h5file["float_scalar"] = np.float64(0.5)
+            h5file["large"] = np.array([1.0, 1e6, np.finfo(np.float64).max])
             h5file["empty"] = h5py.Empty(">f8")
+            h5file["fixed_strings"] = np.array([s.encode() for s in STRINGS]).reshape(3, 4)
+            h5file.create_dataset("vlen_strings", data=STRINGS, dtype=h5py.string_dtype())
 
     def test_oneD_dataset(self):
         response = self.tester.get(["data", "test_file.h5"], params={"uri": "/oneD_dataset"})
@@ -68,6 +82,16 @@ class TestData(ServerTest):
         payload = response.json()
         assert payload == [[[1, 1]], [[1, 2]]]
 
+    def test_complex_dataset_types(self):
+        for uri in ("/complex64", "/big_endian_complex"):
+            payload = self.tester.get(["data", "test_file.h5"], params={"uri": uri, "ixstr": "1:"}).json()
+            assert payload == [[c.real, c.imag] for c in BIG_ENDIAN_COMPLEX[1:].tolist()]
+
+    def test_complex_planes(self):
+        payload = self.tester.get(["data", "test_file.h5"], params={"uri": "/complex", "ixstr": "1:4", "columnar": 1}).json()
+
+        assert payload == dict((("real", COMPLEX.real[1:4].tolist()), ("imag", COMPLEX.imag[1:4].tolist())))
+
     def test_scalar_dataset(self):
         response = self.tester.get(["data", "test_file.h5"], params={"uri": "/scalar"})
 
@@ -75,6 +99,13 @@ class TestData(ServerTest):
         payload = response.json()
         assert payload == SCALAR
 
+    def test_scalar_dataset_at_least0d(self):
+        for uri, expected in (("/scalar", SCALAR), ("/complex_scalar", [1.0, 1.0]), ("/float_scalar", 0.5)):
+            response = self.tester.get(["data", "test_file.h5"], params={"uri": uri, "min_ndim": 0})
+
+            assert response.status_code == 200
+            assert response.json() == expected, uri
+
     def test_scalar_dataset_at_least2d(self):
         response = self.tester.get(["data", "test_file.h5"], params={"uri": "/scalar", "min_ndim": 2})
 
@@ -88,3 +119,250 @@ class TestData(ServerTest):
         assert response.status_code == 200
         payload = response.json()
         assert payload is None
+
+    def test_string_datasets(self):
+        assert self.tester.get(["data", "test_file.h5"], params={"uri": "/fixed_strings"}).json() == [STRINGS[:4], STRINGS[4:8], STRINGS[8:]]
+        assert self.tester.get(["data", "test_file.h5"], params={"uri": "/fixed_strings", "ixstr": "1, 2"}).json() == STRINGS[6]
+        assert self.tester.get(["data", "test_file.h5"], params={"uri": "/vlen_strings"}).json() == STRINGS
+        assert self.tester.get(["data", "test_file.h5"], params={"uri": "/vlen_strings", "ixstr": "10", "min_ndim": 2}).json() == [[STRINGS[10]]]
+
+    def test_reduced_dtype(self):
+        response = self.tester.get(["data", "test_file.h5"], params={"uri": "/twoD_dataset", "dtype": "float32"})
+
+        assert json.loads(response.headers["X-Hdf-Transform"]) == {"dtype": "<f4"}
+        # float32 values are printed with no more digits than float32 holds
+        assert response.json() == [[float(str(v)) for v in row] for row in TWO_D.astype(np.float32)]
+
+        response = self.tester.get(["data", "test_file.h5"], params={"uri": "/twoD_dataset", "dtype": "float16"})
+        assert json.loads(response.headers["X-Hdf-Transform"]) == {"dtype": "<f2"}
+        assert response.json() == [[float(f"{v:.5g}") for v in row] for row in TWO_D.astype(np.float16)]
+
+        response = self.tester.get(["data", "test_file.h5"], params={"uri": "/complex", "dtype": "float32", "min_ndim": 2})
+        assert json.loads(response.headers["X-Hdf-Transform"]) == {"dtype": "<c8"}
+        assert response.json() == [[[v.real, v.imag]] for v in COMPLEX]
+
+    def test_reduced_precision(self):
+        response = self.tester.get(["data", "test_file.h5"], params={"uri": "/twoD_dataset", "precision": 2, "ixstr": "1, :"})
+
+        assert json.loads(response.headers["X-Hdf-Transform"]) == {"precision": 2}
+        assert response.json() == [float(f"{v:.2g}") for v in TWO_D[1] * 1.0]
+
+        response = self.tester.get(["data", "test_file.h5"], params={"uri": "/complex64", "precision": 1, "dtype": "float32"})
+        # the data is float32 already
+        assert json.loads(response.headers["X-Hdf-Transform"]) == {"precision": 1}
+        assert response.json() == [[1, 1], [1, 2], [2, 2], [0, -5], [5, 0]]
+
+    def test_reduced_not_float(self):
+        # there's nothing to reduce in integer and string data
+        for uri, expected in (("/oneD_dataset", ONE_D.tolist()), ("/fixed_strings", np.reshape(STRINGS, (3, 4)).tolist()), ("/scalar", int(SCALAR))):
+            response = self.tester.get(["data", "test_file.h5"], params={"uri": uri, "dtype": "float16", "precision": 3})
+
+            assert "X-Hdf-Transform" not in response.headers
+            assert response.json() == expected
+
+    def test_reduced_large(self):
+        # rounding up the float64 max would overflow, so it's left as is
+        response = self.tester.get(["data", "test_file.h5"], params={"uri": "/large", "precision": 2})
+        assert response.json() == [1.0, 1e6, np.finfo(np.float64).max]
+
+        # values too large for the dtype asked for are an error, not infinities
+        for dtype, ixstr in (("float16", "1"), ("float32", "2")):
+            with pytest.raises(HTTPError) as e:
+                self.tester.get(["data", "test_file.h5"], params={"uri": "/large", "dtype": dtype, "ixstr": ixstr})
+
+            assert e.value.response.status_code == 400
+        assert self.tester.get(["data", "test_file.h5"], params={"uri": "/large", "dtype": "float32", "ixstr": "1"}).json() == 1e6
+
+    def test_bad_reduction(self):
+        for params in ({"dtype": "float8"}, {"dtype": "float64"}, {"precision": 0}, {"precision": 18}, {"precision": "abc"}, {"min_ndim": "abc"}):
+            with pytest.raises(HTTPError) as e:
+                self.tester.get(["data", "test_file.h5"], params={"uri": "/twoD_dataset", **params})
+
+            assert e.value.response.status_code == 400
+
+
+class TestCompoundData(ServerTest):
+    def setUp(self):
+        super().setUp()
+
+        with h5py.File(os.path.join(self.notebook_dir, "test_file.h5"), "w") as h5file:
+            h5file["compound"] = COMPOUND
+            h5file["oneD_dataset"] = ONE_D
+
+    def test_rows(self):
+        payload = self.tester.get(["data", "test_file.h5"], params={"uri": "/compound", "ixstr": "2:4"}).json()
+
+        assert payload == [[2, 1.0, -2, "row2"], [3, 1.5, -3, "row3"]]
+
+    def test_fields(self):
+        payload = self.tester.get(["data", "test_file.h5"], params={"uri": "/compound", "ixstr": "2:4", "fields": ["y", "id"]}).json()
+
+        assert payload == [[-2, 2], [-3, 3]]
+
+    def test_columnar(self):
+        payload = self.tester.get(["data", "test_file.h5"], params={"uri": "/compound", "columnar": 1}).json()
+
+        assert list(payload) == ["id", "x", "y", "label"]
+        assert payload["x"] == COMPOUND["x"].tolist()
+        assert payload["label"] == [label.decode() for label in COMPOUND["label"]]
+
+    def test_columnar_fields(self):
+        payload = self.tester.get(["data", "test_file.h5"], params={"uri": "/compound", "ixstr": "5:", "fields": ["y", "x"], "columnar": "true"}).json()
+
+        assert payload == dict((("y", COMPOUND["y"][5:].tolist()), ("x", COMPOUND["x"][5:].tolist())))
+
+    def test_bad_fields(self):
+        for params in ({"uri": "/compound", "fields": "z"}, {"uri": "/compound", "fields": ["x", "x"]}, {"uri": "/oneD_dataset", "columnar": 1}):
+            with pytest.raises(HTTPError) as e:
+                self.tester.get(["data", "test_file.h5"], params=params)
+
+            assert e.value.response.status_code == 400
+
+
+class TestDataStream(ServerTest):
+    # small enough that every dataset here gets split into several blocks
+    config = Config({"NotebookApp": {"nbserver_extensions": {"jupyterlab_hdf": True}}, "HdfConfig": {"stream_block_bytes": 24}})
+
+    def setUp(self):
+        super().setUp()
+
+        with h5py.File(os.path.join(self.notebook_dir, "test_file.h5"), "w") as h5file:
+            h5file["oneD_dataset"] = ONE_D
+            h5file["twoD_dataset"] = TWO_D
+            h5file["threeD_dataset"] = THREE_D
+            h5file["complex"] = COMPLEX
+            h5file["scalar"] = SCALAR
+            h5file["empty"] = h5py.Empty(">f8")
+            h5file["strings"] = np.array([b"a", b"b"])
+            h5file.create_dataset("vlen_strings", data=STRINGS, dtype=h5py.string_dtype())
+            h5file.create_dataset("ragged", data=np.array([np.arange(2), np.arange(3)], dtype=object), dtype=h5py.vlen_dtype("i8"))
+            h5file["compound"] = COMPOUND
+        waitForWatcher(os.path.join(self.notebook_dir, "test_file.h5"))
+
+    def assertStreamsMatch(self, params):
+        expected = self.tester.get(["data", "test_file.h5"], params=params).json()
+        response = self.tester.get(["data", "test_file.h5"], params={**params, "stream": "json"})
+
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("application/json")
+        assert response.json() == expected
+
+    def test_json_stream(self):
+        self.assertStreamsMatch({"uri": "/oneD_dataset"})
+        self.assertStreamsMatch({"uri": "/twoD_dataset"})
+        self.assertStreamsMatch({"uri": "/threeD_dataset"})
+        self.assertStreamsMatch({"uri": "/threeD_dataset", "ixstr": ":,1:3, 2"})
+        self.assertStreamsMatch({"uri": "/threeD_dataset", "ixstr": "1, :, :", "subixstr": "1:3, 1:4"})
+        self.assertStreamsMatch({"uri": "/oneD_dataset", "ixstr": "3:3"})
+        self.assertStreamsMatch({"uri": "/oneD_dataset", "ixstr": "1:9", "min_ndim": 2})
+        self.assertStreamsMatch({"uri": "/complex", "min_ndim": 2, "ixstr": "0:2"})
+        self.assertStreamsMatch({"uri": "/scalar", "min_ndim": 2})
+        self.assertStreamsMatch({"uri": "/empty"})
+        self.assertStreamsMatch({"uri": "/compound", "fields": ["label", "id"]})
+        self.assertStreamsMatch({"uri": "/vlen_strings"})
+        self.assertStreamsMatch({"uri": "/twoD_dataset", "dtype": "float16"})
+        self.assertStreamsMatch({"uri": "/complex", "dtype": "float32", "precision": 2})
+
+    def test_binary_stream(self):
+        response = self.tester.get(["data", "test_file.h5"], params={"uri": "/threeD_dataset", "ixstr": ":, 1:3, :", "stream": "binary"})
+
+        assert response.status_code == 200
+        assert response.headers["Content-Type"] == "application/octet-stream"
+        assert response.headers["X-Hdf-Dtype"] == "<i8"
+        assert response.headers["X-Hdf-Shape"] == "2,2,4"
+        data = np.frombuffer(response.content, dtype=response.headers["X-Hdf-Dtype"]).reshape(2, 2, 4)
+        assert (data == THREE_D[:, 1:3, :]).all()
+
+    def test_binary_stream_scalar(self):
+        response = self.tester.get(["data", "test_file.h5"], params={"uri": "/scalar", "min_ndim": 2, "stream": "binary"})
+
+        assert response.status_code == 200
+        # the shape is padded to min_ndim, like the data
+        assert response.headers["X-Hdf-Shape"] == "1,1"
+        assert np.frombuffer(response.content, dtype=response.headers["X-Hdf-Dtype"]).tolist() == [SCALAR]
+
+    def test_binary_stream_reduced(self):
+        response = self.tester.get(["data", "test_file.h5"], params={"uri": "/twoD_dataset", "dtype": "float32", "precision": 1, "stream": "binary"})
+
+        assert response.status_code == 200
+        assert response.headers["X-Hdf-Dtype"] == "<f4"
+        assert json.loads(response.headers["X-Hdf-Transform"]) == {"dtype": "<f4", "precision": 1}
+        data = np.frombuffer(response.content, dtype="<f4").reshape(2, 5)
+        assert (data == TWO_D.astype(np.float32)).all()
+
+    def test_binary_stream_complex(self):
+        response = self.tester.get(["data", "test_file.h5"], params={"uri": "/complex", "stream": "binary"})
+
+        assert response.status_code == 200
+        assert (np.frombuffer(response.content, dtype=response.headers["X-Hdf-Dtype"]) == COMPLEX).all()
+
+    def test_binary_stream_columnar(self):
+        response = self.tester.get(["data", "test_file.h5"], params={"uri": "/compound", "ixstr": "1:", "fields": ["y", "x"], "columnar": 1, "stream": "binary"})
+
+        assert response.status_code == 200
+        assert json.loads(response.headers["X-Hdf-Fields"]) == [["y", "<i2"], ["x", "<f8"]]
+        assert response.headers["X-Hdf-Shape"] == "9"
+        # each block holds blockRows rows of y, then of x
+        blockRows = int(response.headers["X-Hdf-Block-Rows"])
+        columns = dict((("x", []), ("y", [])))
+        offset = 0
+        for start in range(0, 9, blockRows):
+            rows = min(blockRows, 9 - start)
+            for name, dtype in (("y", "<i2"), ("x", "<f8")):
+                columns[name].extend(np.frombuffer(response.content, dtype=dtype, count=rows, offset=offset).tolist())
+                offset += rows * np.dtype(dtype).itemsize
+        assert offset == len(response.content)
+        assert columns == dict((("x", COMPOUND["x"][1:].tolist()), ("y", COMPOUND["y"][1:].tolist())))
+
+    def test_binary_stream_complex_planes(self):
+        response = self.tester.get(["data", "test_file.h5"], params={"uri": "/complex", "columnar": 1, "stream": "binary"})
+
+        assert response.status_code == 200
+        assert json.loads(response.headers["X-Hdf-Fields"]) == [["real", "<f8"], ["imag", "<f8"]]
+        # a 24 byte block only fits one row, so the real and imaginary values alternate
+        assert response.headers["X-Hdf-Block-Rows"] == "1"
+        data = np.frombuffer(response.content, dtype="<f8").reshape(-1, 2)
+        assert (data[:, 0] == COMPLEX.real).all()
+        assert (data[:, 1] == COMPLEX.imag).all()
+
+    def test_binary_stream_compound_not_numeric(self):
+        for params in ({"uri": "/compound", "stream": "binary"}, {"uri": "/compound", "columnar": 1, "stream": "binary"}, {"uri": "/compound", "columnar": 1, "stream": "json"}):
+            with pytest.raises(HTTPError) as e:
+                self.tester.get(["data", "test_file.h5"], params=params)
+
+            assert e.value.response.status_code == 400
+
+    def test_binary_stream_empty_slice(self):
+        response = self.tester.get(["data", "test_file.h5"], params={"uri": "/twoD_dataset", "ixstr": "0:0, :", "stream": "binary"})
+
+        assert response.status_code == 200
+        assert response.headers["Content-Type"] == "application/octet-stream"
+        assert response.headers["X-Hdf-Shape"] == "0,5"
+        assert response.content == b""
+
+    def test_binary_stream_strings(self):
+        for uri, dtype, encoding, strings in (("/strings", "|S1", "ascii", ["a", "b"]), ("/vlen_strings", "|O", "utf-8", STRINGS)):
+            response = self.tester.get(["data", "test_file.h5"], params={"uri": uri, "stream": "binary"})
+
+            assert response.status_code == 200
+            assert response.headers["X-Hdf-Dtype"] == dtype
+            assert response.headers["X-Hdf-String-Encoding"] == encoding
+            # each string's byte length, then its bytes
+            unpacked, offset = [], 0
+            while offset < len(response.content):
+                n = int.from_bytes(response.content[offset : offset + 4], "little")
+                unpacked.append(response.content[offset + 4 : offset + 4 + n].decode(encoding))
+                offset += 4 + n
+            assert unpacked == strings
+
+    def test_binary_stream_not_numeric(self):
+        with pytest.raises(HTTPError) as e:
+            self.tester.get(["data", "test_file.h5"], params={"uri": "/ragged", "stream": "binary"})
+
+        assert e.value.response.status_code == 400
+
+    def test_unknown_stream_format(self):
+        with pytest.raises(HTTPError) as e:
+            self.tester.get(["data", "test_file.h5"], params={"uri": "/oneD_dataset", "stream": "xml"})
+
+        assert e.value.response.status_code == 400
@@ -0,0 +1,132 @@
+import h5py
+import json
+import logging
+import numpy as np
+import os
+import pytest
+import sqlite3
+from h5grove.encoders import orjson_encode
+from h5grove.models import LinkResolution
+from tornado.httpclient import HTTPError
+
+from jupyterlab_hdf.contents import HdfContentsManager
+from jupyterlab_hdf.index import structureIndex
+from jupyterlab_hdf.meta import HdfMetaManager
+from jupyterlab_hdf.tests.utils import waitForWatcher
+from jupyterlab_hdf.util import jsonize
+
+URIS = ("/", "/group", "/group/nested", "/group/loop", "/twoD", "/scalar", "/empty", "/compound", "/strings", "/soft", "/external")
+PARAMS = (dict(), dict((("ixstr", "0, :"),)), dict((("ixstr", ":, 1:3"), ("min_ndim", 3))))
+
+
+@pytest.fixture
+def notebookDir(tmp_path):
+    with h5py.File(tmp_path / "test_file.h5", "w") as h5file:
+        h5file.attrs["title"] = "indexed"
+        group = h5file.create_group("group")
+        group.attrs["units"] = np.arange(3)
+        group.create_group("nested").attrs["empty"] = h5py.Empty("f")
+        # a hard link back to the group's parent
+        group["loop"] = h5file
+        h5file["twoD"] = np.arange(12, dtype=np.float32).reshape(3, 4)
+        h5file["scalar"] = 1.5
+        h5file["empty"] = h5py.Empty("i8")
+        h5file["compound"] = np.zeros(4, dtype=[("a", "i4"), ("b", "f8")])
+        h5file["strings"] = np.array(["a", "bc"], dtype=h5py.string_dtype())
+        h5file["soft"] = h5py.SoftLink("/twoD")
+        h5file["external"] = h5py.ExternalLink("other.h5", "/x")
+    return str(tmp_path)
+
+
+@pytest.fixture
+def index(tmp_path):
+    structureIndex.configure(str(tmp_path / "index"))
+    yield structureIndex
+    structureIndex.configure("")
+
+
+def managers(notebookDir):
+    log = logging.getLogger("jhdf-index")
+    return [cls(log=log, notebook_dir=notebookDir, resolve_links=LinkResolution.NONE) for cls in (HdfContentsManager, HdfMetaManager)]
+
+
+def serve(manager, uri, params):
+    try:
+        return json.loads(orjson_encode(manager.get("test_file.h5", uri, **params), default=jsonize))
+    except HTTPError as e:
+        # eg an ixstr with more dims than the dataset
+        return e.code
+
+
+def test_matches_file(notebookDir, index):
+    fpath = os.path.join(notebookDir, "test_file.h5")
+    cacheDir = index.cacheDir
+    index.configure("")
+    expected = {(type(m).__name__, uri, i): serve(m, uri, params) for m in managers(notebookDir) for uri in URIS for i, params in enumerate(PARAMS)}
+    index.configure(cacheDir)
+
+    assert index.response(fpath, "/") is None
+    index.crawl(fpath).result()
+
+    hits = index.hits
+    for m in managers(notebookDir):
+        for uri in URIS:
+            for i, params in enumerate(PARAMS):
+                assert serve(m, uri, params) == expected[(type(m).__name__, uri, i)], (type(m).__name__, uri, params)
+    # the loop leads back to a group that has been crawled already, so it isn't expanded again
+    assert index.response(fpath, "/group/loop") is None
+    assert index.hits - hits == 2 * len(URIS) * len(PARAMS) - 2 * len(PARAMS)
+
+
+def test_serves_without_opening(notebookDir, index):
+    fpath = os.path.join(notebookDir, "test_file.h5")
+    index.crawl(fpath).result()
+    contents, meta = managers(notebookDir)
+    expected = serve(meta, "/group", dict())
+
+    # scribble over the file's superblock, keeping its inode, size and mtime
+    st = os.stat(fpath)
+    with open(fpath, "r+b") as f:
+        f.write(b"\0" * 64)
+    os.utime(fpath, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    assert serve(meta, "/group", dict()) == expected
+    # anything not in the index still goes to the file
+    assert serve(meta, "/missing", dict()) == 401
+
+
+def test_rebuilt_when_file_changes(notebookDir, index):
+    fpath = os.path.join(notebookDir, "test_file.h5")
+    index.crawl(fpath).result()
+    assert index.response(fpath, "/twoD") is not None
+
+    with h5py.File(fpath, "a") as h5file:
+        h5file["added"] = np.arange(3)
+    waitForWatcher(fpath)
+    assert index.response(fpath, "/added") is None
+    index.crawl(fpath).result()
+
+    response = index.response(fpath, "/")
+    assert "added" in [child["name"] for child in response.contents(content=True)]
+
+
+def test_disabled_with_link_resolution(notebookDir, index):
+    fpath = os.path.join(notebookDir, "test_file.h5")
+    index.crawl(fpath).result()
+    manager = HdfMetaManager(log=logging.getLogger("jhdf-index"), notebook_dir=notebookDir, resolve_links=LinkResolution.ONLY_VALID)
+
+    assert manager._lookup(fpath, "/") is None
+
+
+def test_broken_index_is_a_miss(notebookDir, index):
+    fpath = os.path.join(notebookDir, "test_file.h5")
+    index.crawl(fpath).result()
+    contents, meta = managers(notebookDir)
+    expected = serve(meta, "/twoD", dict())
+
+    with sqlite3.connect(index.dbPath(fpath)) as conn:
+        conn.execute("UPDATE objects SET shape = '[3,' WHERE uri = '/twoD'")
+    conn.close()
+
+    # served from the file instead
+    assert serve(meta, "/twoD", dict()) == expected
@@ -0,0 +1,97 @@
+import asyncio
+from jupyterlab_hdf.cancel import CancelToken
+from jupyterlab_hdf.inflight import InflightTable, inflightKey
+
+
+def test_key_normalization():
+    assert inflightKey("data", None, "a/b/", ixstr=" :, 1:3, 2", min_ndim=None) == inflightKey("data", None, "/a/b", ixstr=":,1:3,2")
+    assert inflightKey("attrs", None, "/a", attr_keys=["x", "y"]) != inflightKey("attrs", None, "/a", attr_keys=["y", "x"])
+    assert inflightKey("data", (1, 2, 3, 4), "/a") != inflightKey("data", (1, 2, 3, 5), "/a")
+    assert inflightKey("data", None, "/a") != inflightKey("meta", None, "/a")
+    assert inflightKey("search", None, "/a", q="foo bar") != inflightKey("search", None, "/a", q="foobar")
+
+
+def test_concurrent_duplicates_share_one_call():
+    table = InflightTable()
+    calls = []
+
+    async def read(val):
+        calls.append(val)
+        await asyncio.sleep(0.01)
+        return val
+
+    async def main():
+        return await asyncio.gather(
+            *(table.run(inflightKey("data", None, "/a"), lambda group: read("a")) for _ in range(5)),
+            table.run(inflightKey("data", None, "/b"), lambda group: read("b")),
+        )
+
+    results = asyncio.run(main())
+
+    assert results == ["a"] * 5 + ["b"]
+    assert calls == ["a", "b"]
+    assert table.hits == {"data": 4}
+    assert table.misses == {"data": 2}
+    assert len(table) == 0
+
+
+def test_searches_differing_in_whitespace_do_not_share():
+    table = InflightTable()
+    calls = []
+
+    async def search(q):
+        calls.append(q)
+        await asyncio.sleep(0.01)
+        return q
+
+    async def main():
+        queries = (("foo bar", "substring"), ("foobar", "substring"), ("a b+", "regex"), ("ab+", "regex"))
+        return await asyncio.gather(*(table.run(inflightKey("search", None, "/", q=q, mode=mode), lambda group, q=q: search(q)) for q, mode in queries))
+
+    results = asyncio.run(main())
+
+    assert results == ["foo bar", "foobar", "a b+", "ab+"]
+    assert calls == results
+    assert table.hits == {}
+
+
+def test_errors_are_shared_and_not_cached():
+    table = InflightTable()
+    calls = []
+
+    async def fail(group):
+        calls.append(None)
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        key = inflightKey("meta", None, "/a")
+        first = await asyncio.gather(*(table.run(key, fail) for _ in range(3)), return_exceptions=True)
+        second = await asyncio.gather(table.run(key, fail), return_exceptions=True)
+        return first + second
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(r, ValueError) for r in results)
+    assert len(calls) == 2
+
+
+def test_shared_read_is_cancelled_only_with_all_of_its_requests():
+    table = InflightTable()
+    tokens = [CancelToken(), CancelToken()]
+    groups = []
+
+    async def read(group):
+        groups.append(group)
+        await asyncio.sleep(0.01)
+        return group.cancelled
+
+    async def main():
+        key = inflightKey("data", None, "/a")
+        return await asyncio.gather(*(table.run(key, read, token=token) for token in tokens))
+
+    tokens[0].cancel()
+    assert asyncio.run(main()) == [False, False]
+
+    tokens[1].cancel()
+    assert groups[0].cancelled
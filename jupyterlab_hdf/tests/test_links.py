@@ -0,0 +1,111 @@
+import h5py
+import numpy as np
+import os
+import time
+from traitlets.config import Config
+from jupyterlab_hdf.links import linkTargets
+from jupyterlab_hdf.tests.utils import ServerTestWithLinkResolution, waitForWatcher
+
+
+RESOLVED = dict((("link_0", "dataset"), ("link_1", "dataset"), ("link_2", "dataset"), ("link_3", "dataset"), ("missing_dataset", "external_link"), ("missing_file", "external_link")))
+
+
+def writeFiles(notebookDir):
+    """A group of external links to 4 files, and 2 invalid ones"""
+    for i in range(4):
+        with h5py.File(os.path.join(notebookDir, f"target_{i}.h5"), "w") as h5file:
+            h5file["x"] = np.arange(i + 1)
+
+    with h5py.File(os.path.join(notebookDir, "test_file.h5"), "w") as h5file:
+        grp = h5file.create_group("links")
+        for i in range(4):
+            grp[f"link_{i}"] = h5py.ExternalLink(f"target_{i}.h5", "/x")
+        grp["missing_dataset"] = h5py.ExternalLink("target_0.h5", "/not/a/path")
+        grp["missing_file"] = h5py.ExternalLink("not_a_file.h5", "/x")
+
+
+def childTypes(response):
+    return dict((child["name"], child["type"]) for child in response.json())
+
+
+class TestLinkTargets(ServerTestWithLinkResolution):
+    def setUp(self):
+        super().setUp()
+        writeFiles(self.notebook_dir)
+
+    def test_held_targets(self):
+        opens = linkTargets.opens
+        assert childTypes(self.tester.get(["contents", "test_file.h5"], params={"uri": "/links"})) == RESOLVED
+        assert self.tester.get(["meta", "test_file.h5"], params={"uri": "/links/link_3"}).json()["shape"] == [4]
+        # every target file was opened once, and then held
+        assert linkTargets.opens - opens == 4
+        assert linkTargets.stats()["files"] == 4
+
+    def test_changed_target(self):
+        assert self.tester.get(["meta", "test_file.h5"], params={"uri": "/links/link_0"}).json()["shape"] == [1]
+
+        fpath = os.path.join(self.notebook_dir, "target_0.h5")
+        with h5py.File(fpath + ".new", "w") as h5file:
+            h5file["x"] = np.arange(10)
+        os.replace(fpath + ".new", fpath)
+        waitForWatcher(fpath)
+
+        assert self.tester.get(["meta", "test_file.h5"], params={"uri": "/links/link_0"}).json()["shape"] == [10]
+
+    def get(self, uri, **headers):
+        return self.request("GET", "/hdf/meta/test_file.h5", params={"uri": uri}, headers=headers)
+
+    def test_changed_target_validators(self):
+        self.tester.get(["meta", "test_file.h5"], params={"uri": "/links/link_0"})
+        etag = self.get("/links/link_0").headers["ETag"]
+        assert self.get("/links/link_0", **{"If-None-Match": etag}).status_code == 304
+
+        fpath = os.path.join(self.notebook_dir, "target_0.h5")
+        with h5py.File(fpath + ".new", "w") as h5file:
+            h5file["x"] = np.arange(10)
+        os.replace(fpath + ".new", fpath)
+        waitForWatcher(fpath)
+
+        # the linking file is unchanged, but what its link points to isn't
+        response = self.get("/links/link_0", **{"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()["shape"] == [10]
+
+
+class TestLazyLinks(ServerTestWithLinkResolution):
+    config = Config({"NotebookApp": {"nbserver_extensions": {"jupyterlab_hdf": True}}, "HdfConfig": {"resolve_links": True, "lazy_links": True}})
+
+    def setUp(self):
+        super().setUp()
+        writeFiles(self.notebook_dir)
+
+    def test_lazy_listing(self):
+        first = self.tester.get(["contents", "test_file.h5"], params={"uri": "/links"})
+        # nothing was checked yet, so nothing is resolved
+        assert set(childTypes(first).values()) == {"external_link"}
+
+        deadline = time.monotonic() + 10
+        while linkTargets.stats()["pending"]:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+        second = self.tester.get(["contents", "test_file.h5"], params={"uri": "/links"})
+        assert second.headers["ETag"] != first.headers["ETag"]
+        assert childTypes(second) == RESOLVED
+
+    def test_link_itself(self):
+        # unlike a listing, a request for the link itself resolves it right away
+        assert self.tester.get(["data", "test_file.h5"], params={"uri": "/links/link_1"}).json() == [0, 1]
+        assert self.tester.get(["meta", "test_file.h5"], params={"uri": "/links/link_2"}).json()["shape"] == [3]
+        assert self.tester.get(["meta", "test_file.h5"], params={"uri": "/links/missing_file"}).json()["type"] == "external_link"
+
+    def test_checks_only_change_the_linking_file(self):
+        other = self.tester.get(["meta", "target_0.h5"], params={"uri": "/x"})
+
+        self.tester.get(["contents", "test_file.h5"], params={"uri": "/links"})
+        deadline = time.monotonic() + 10
+        while linkTargets.stats()["pending"]:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+        assert self.tester.get(["meta", "target_0.h5"], params={"uri": "/x"}).headers["ETag"] == other.headers["ETag"]
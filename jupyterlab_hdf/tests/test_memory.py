@@ -0,0 +1,165 @@
+"""Peak memory of serving large requests
+
+Each case runs the same work as one request to the server (the manager read
+plus json encoding), and measures its peak memory with tracemalloc (python and
+numpy allocations) and by sampling the process RSS (which also catches
+allocations made by HDF5 itself). The amplification, ie peak bytes per byte of
+response body, is reported for each case and must stay under a bound set with
+some headroom over the current pipeline, so that new copies get caught and the
+gains from removing copies can be measured.
+"""
+import asyncio
+import h5py
+import logging
+import numpy as np
+import pytest
+import threading
+import time
+import tracemalloc
+from h5grove.encoders import orjson_encode
+from h5grove.models import LinkResolution
+
+from jupyterlab_hdf.attrs import HdfAttrsManager
+from jupyterlab_hdf.contents import HdfContentsManager
+from jupyterlab_hdf.data import HdfDataManager
+from jupyterlab_hdf.meta import HdfMetaManager
+from jupyterlab_hdf.util import jsonize
+
+BIG_SIDE = 1000
+WIDE_COUNT = 5000
+ATTR_COUNT = 2000
+
+# (manager, uri, request params, max tracemalloc peak per byte of response body)
+CASES = dict(
+    (
+        ("data-float64", (HdfDataManager, "/big", dict((("ixstr", ":, :"), ("min_ndim", 2))), 5)),
+        ("data-float64-slice", (HdfDataManager, "/big", dict((("ixstr", ":, :"), ("subixstr", "0:500, 0:500"), ("min_ndim", 2))), 5)),
+        ("data-int8", (HdfDataManager, "/small_ints", dict((("ixstr", ":, :"), ("min_ndim", 2))), 12)),
+        ("contents-wide", (HdfContentsManager, "/wide", dict(), 12)),
+        ("meta-wide", (HdfMetaManager, "/wide", dict(), 15)),
+        ("meta-many-attrs", (HdfMetaManager, "/many_attrs", dict(), 20)),
+        ("attrs-many", (HdfAttrsManager, "/many_attrs", dict(), 20)),
+    )
+)
+
+# allowance for RSS growth that isn't proportional to the response, eg HDF5's chunk cache and metadata
+RSS_SLACK = 32 * 2 ** 20
+
+
+def rssBytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class RssSampler:
+    """Tracks the peak RSS of this process while in context, by polling"""
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.baseline = self.peak = rssBytes()
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, rssBytes())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rssBytes())
+
+    @property
+    def growth(self):
+        return self.peak - self.baseline
+
+
+@pytest.fixture(scope="module")
+def notebookDir(tmp_path_factory):
+    notebook_dir = tmp_path_factory.mktemp("jhdf-memory")
+    with h5py.File(notebook_dir / "test_file.h5", "w") as h5file:
+        h5file["big"] = np.random.default_rng(0).random((BIG_SIDE, BIG_SIDE))
+        h5file["small_ints"] = np.arange(BIG_SIDE ** 2, dtype=np.int8).reshape(BIG_SIDE, BIG_SIDE)
+
+        wide = h5file.create_group("wide")
+        for i in range(WIDE_COUNT):
+            wide.create_group("group%05d" % i)
+
+        many_attrs = h5file.create_group("many_attrs")
+        for i in range(ATTR_COUNT):
+            many_attrs.attrs["attr%04d" % i] = np.arange(16, dtype=np.float64)
+    return str(notebook_dir)
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_peak_memory(case, notebookDir, record_property):
+    managerClass, uri, params, maxAmplification = CASES[case]
+    manager = managerClass(log=logging.getLogger("jhdf-memory"), notebook_dir=notebookDir, resolve_links=LinkResolution.NONE)
+
+    def serve():
+        return orjson_encode(manager.get("test_file.h5", uri, **params), default=jsonize)
+
+    # sample rss on a run of its own, since tracemalloc's bookkeeping takes up memory too
+    with RssSampler() as rss:
+        serve()
+
+    tracemalloc.start()
+    try:
+        body = serve()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    amplification = peak / len(body)
+    record_property("output_bytes", len(body))
+    record_property("peak_bytes", peak)
+    record_property("amplification", round(amplification, 2))
+    record_property("rss_growth_bytes", rss.growth)
+    print(f"{case}: {len(body)} output bytes, {peak} peak bytes, amplification {amplification:.2f}, rss growth {rss.growth}")
+
+    assert amplification <= maxAmplification, f"{case}: peak memory is {amplification:.2f}x the response size, over the bound of {maxAmplification}x"
+    if rss.baseline is not None:
+        assert rss.growth <= maxAmplification * len(body) + RSS_SLACK, f"{case}: rss grew by {rss.growth} bytes for a {len(body)} byte response"
+
+
+def test_peak_memory_stream(notebookDir, record_property):
+    """A streamed request holds about one block at a time, however big the slice"""
+    manager = HdfDataManager(log=logging.getLogger("jhdf-memory"), notebook_dir=notebookDir, resolve_links=LinkResolution.NONE)
+    blockBytes = 2 ** 18
+
+    async def serve():
+        nbytes = 0
+        stream = manager.streamAsync("test_file.h5", "/big", blockBytes=blockBytes, ixstr=":, :", min_ndim=2)
+        await stream.__anext__()
+        async for block in stream:
+            nbytes += len(orjson_encode(block, default=jsonize)) - 1
+        return nbytes
+
+    tracemalloc.start()
+    try:
+        nbytes = asyncio.run(serve())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    amplification = peak / nbytes
+    record_property("output_bytes", nbytes)
+    record_property("peak_bytes", peak)
+    record_property("amplification", round(amplification, 2))
+    print(f"data-float64-stream: {nbytes} output bytes, {peak} peak bytes, amplification {amplification:.2f}")
+
+    # json takes ~2.5 bytes per byte of float64. Two blocks are held at once (one being sent, one being
+    # read ahead), each with the same copies as an unstreamed request
+    blockOutputBytes = 2.5 * blockBytes
+    assert peak <= 2 * CASES["data-float64"][3] * blockOutputBytes + 2 ** 20
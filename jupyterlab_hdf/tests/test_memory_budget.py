@@ -0,0 +1,133 @@
+import h5py
+import numpy as np
+import os
+import pytest
+import threading
+import time
+from requests import HTTPError
+from traitlets.config import Config
+from jupyterlab_hdf.cancel import CancelGroup, CancelToken
+from jupyterlab_hdf.exception import JhdfCancelledError, JhdfMemoryError
+from jupyterlab_hdf.memory import MemoryBudget, memoryBudget
+from jupyterlab_hdf.tests.utils import ServerTest
+
+
+class TestMemoryBudget(ServerTest):
+    config = Config({"NotebookApp": {"nbserver_extensions": {"jupyterlab_hdf": True}}, "HdfConfig": {"memory_budget": 1000}})
+
+    def setUp(self):
+        super().setUp()
+
+        with h5py.File(os.path.join(self.notebook_dir, "test_file.h5"), "w") as h5file:
+            h5file["oneD_dataset"] = np.arange(100, dtype=np.float64)
+
+    def test_slice_within_budget(self):
+        response = self.tester.get(["data", "test_file.h5"], params={"uri": "/oneD_dataset", "ixstr": "0:10"})
+
+        assert response.status_code == 200
+        assert response.json() == list(range(10))
+
+    def test_slice_over_budget(self):
+        with pytest.raises(HTTPError) as e:
+            self.tester.get(["data", "test_file.h5"], params={"uri": "/oneD_dataset"})
+
+        assert e.value.response.status_code == 413
+
+    def test_meta_while_over_budget(self):
+        # bodies being sent are charged without waiting, so they can push usage over budget,
+        # but that doesn't hold up responses that reserve nothing
+        with memoryBudget.held(5000):
+            response = self.tester.get(["meta", "test_file.h5"], params={"uri": "/oneD_dataset"})
+
+        assert response.status_code == 200
+        assert response.json()["shape"] == [100]
+
+    def test_status(self):
+        self.tester.get(["data", "test_file.h5"], params={"uri": "/oneD_dataset", "ixstr": "0:10"})
+        response = self.tester.get(["status"])
+
+        assert response.json()["memory"]["budget"] == 1000
+        assert response.json()["memory"]["used"] == 0
+        assert response.json()["memory"]["peak"] >= 640
+
+
+def test_wait_for_room():
+    budget = MemoryBudget(budget=100, timeout=5)
+    budget.acquire(60)
+    waiter = threading.Thread(target=budget.acquire, args=(60,))
+    waiter.start()
+    waiter.join(0.05)
+    assert waiter.is_alive()
+    assert budget.waiting == 1
+
+    budget.release(60)
+    waiter.join(5)
+    assert not waiter.is_alive()
+    assert budget.used == 60
+    assert budget.peak == 60
+
+
+def test_reject_on_timeout():
+    budget = MemoryBudget(budget=100, timeout=0.01)
+    budget.acquire(60)
+    with pytest.raises(JhdfMemoryError) as e:
+        budget.acquire(60)
+
+    assert e.value.code == 503
+    assert budget.rejected == 1
+
+
+def test_unlimited():
+    budget = MemoryBudget()
+    with budget.reserve(10 ** 12):
+        assert budget.used == 10 ** 12
+    assert budget.used == 0
+
+
+def test_cancel_while_waiting():
+    budget = MemoryBudget(budget=100, timeout=30)
+    budget.acquire(60)
+    token = CancelToken()
+    group = CancelGroup()
+    group.add(token)
+    errors = []
+
+    def wait():
+        try:
+            budget.acquire(60, cancel=group)
+        except JhdfCancelledError as e:
+            errors.append(e)
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    waiter.join(0.05)
+    assert waiter.is_alive()
+
+    token.cancel()
+    waiter.join(5)
+    assert not waiter.is_alive()
+    assert len(errors) == 1
+    assert budget.used == 60
+    assert budget.waiting == 0
+
+
+def test_deadline_while_waiting():
+    budget = MemoryBudget(budget=100, timeout=30)
+    budget.acquire(60)
+    group = CancelGroup()
+    group.add(CancelToken(deadline=time.monotonic() + 0.05))
+
+    t0 = time.monotonic()
+    with pytest.raises(JhdfCancelledError):
+        budget.acquire(60, cancel=group)
+    assert time.monotonic() - t0 < 5
+    assert budget.rejected == 0
+
+
+def test_estimate_counts_values():
+    budget = MemoryBudget(amplification=2)
+
+    # float64: the raw size dominates
+    assert budget.estimate(800, values=100) == 1600
+    # int8: each value still takes up a list slot
+    assert budget.estimate(100, values=100) == 1600
@@ -0,0 +1,56 @@
+import h5py
+import numpy as np
+import os
+from jupyterlab_hdf.metrics import Histogram, RequestTimer, phase, promHistogram, timerContext
+from jupyterlab_hdf.tests.utils import ServerTest
+
+
+class TestMetrics(ServerTest):
+    def setUp(self):
+        super().setUp()
+
+        with h5py.File(os.path.join(self.notebook_dir, "test_file.h5"), "w") as h5file:
+            h5file["twoD_dataset"] = np.arange(0, 10, dtype=np.float64).reshape(2, 5)
+
+    def test_metrics(self):
+        self.tester.get(["data", "test_file.h5"], params={"uri": "/twoD_dataset", "ixstr": "0:1, :"})
+        response = self.tester.get(["metrics"])
+
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("text/plain")
+        lines = response.text.splitlines()
+        assert "# TYPE jhdf_request_duration_seconds histogram" in lines
+        assert any(line.startswith('jhdf_requests_total{endpoint="data",code="200"} ') for line in lines)
+        for ph in ("open", "resolve", "index", "read", "jsonize", "encode", "write"):
+            assert any(line.startswith(f'jhdf_phase_duration_seconds_count{{endpoint="data",phase="{ph}"}} ') for line in lines), ph
+        # 1 row of 5 float64s
+        read_bytes = [int(line.split()[-1]) for line in lines if line.startswith('jhdf_read_bytes_total{endpoint="data"}')]
+        assert read_bytes and read_bytes[0] >= 40
+        assert any(line.startswith('jhdf_lane_wait_seconds_count{lane="bulk"} ') for line in lines)
+
+
+def test_histogram():
+    h = Histogram(buckets=(1, 2))
+    for val in (0.5, 1, 1.5, 3):
+        h.observe(val)
+
+    assert list(h.cumulative()) == [(1, 2), (2, 3), (float("inf"), 4)]
+    assert list(promHistogram("x", "help", {(("a", "b"),): h})) == [
+        "# HELP x help",
+        "# TYPE x histogram",
+        'x_bucket{a="b",le="1"} 2',
+        'x_bucket{a="b",le="2"} 3',
+        'x_bucket{a="b",le="+Inf"} 4',
+        'x_sum{a="b"} 6.0',
+        'x_count{a="b"} 4',
+    ]
+
+
+def test_phase_without_timer_is_noop():
+    with phase("read"):
+        pass
+
+    timer = RequestTimer()
+    with timerContext(timer), phase("read"):
+        pass
+    assert list(timer.phases) == ["read"]
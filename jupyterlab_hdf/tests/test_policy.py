@@ -0,0 +1,167 @@
+import h5py
+import numpy as np
+import os
+import pytest
+import threading
+from traitlets.config import Config
+
+from jupyterlab_hdf.metrics import RequestTimer, timerContext
+from jupyterlab_hdf import policy as policyModule
+from jupyterlab_hdf.policy import OpenPolicy, openPolicy
+from jupyterlab_hdf.tests.utils import ServerTest, waitForWatcher
+
+
+@pytest.fixture
+def fpath(tmp_path):
+    fpath = str(tmp_path / "test_file.h5")
+    with h5py.File(fpath, "w") as h5file:
+        h5file["x"] = np.arange(10)
+    return fpath
+
+
+def openDriver(policy, fpath):
+    with policy.open(fpath) as f:
+        assert f["x"][-1] == 9
+        return f.driver
+
+
+def test_core_when_hot(fpath):
+    policy = OpenPolicy()
+    policy.configure(coreMaxBytes=2 ** 20, coreMinOpens=3)
+
+    assert [openDriver(policy, fpath) for _ in range(5)] == ["sec2", "sec2", "core", "core", "core"]
+    assert policy.stats() == {"imageBytes": policy.imageBytes, "imageHits": 2, "images": 1, "opens": {"core": 3, "default": 2, "paged": 0, "swmr": 0}}
+
+    # a changed file is read into memory again
+    with h5py.File(fpath, "a") as h5file:
+        h5file["x"][-1] = -1
+    waitForWatcher(fpath)
+    with policy.open(fpath) as f:
+        assert f.driver == "core"
+        assert f["x"][-1] == -1
+    assert policy.stats()["images"] == 1
+
+
+def test_not_core(fpath, tmp_path):
+    # too big
+    policy = OpenPolicy()
+    policy.configure(coreMaxBytes=1024, coreMinOpens=1)
+    assert openDriver(policy, fpath) == "sec2"
+
+    # not opened often enough
+    policy.configure(coreMaxBytes=2 ** 20, coreMinOpens=2, coreWindow=0)
+    assert [openDriver(policy, fpath) for _ in range(3)] == ["sec2", "sec2", "sec2"]
+
+    # no room
+    policy.configure(coreWindow=60.0, coreCacheBytes=1024)
+    assert [openDriver(policy, fpath) for _ in range(3)] == ["sec2", "sec2", "sec2"]
+
+
+def test_evict(fpath, tmp_path):
+    other = str(tmp_path / "other.h5")
+    with h5py.File(other, "w") as h5file:
+        h5file["x"] = np.arange(10)
+    policy = OpenPolicy()
+    policy.configure(coreMaxBytes=2 ** 20, coreMinOpens=1)
+
+    assert openDriver(policy, fpath) == "core"
+    policy.configure(coreCacheBytes=policy.imageBytes)
+    assert openDriver(policy, other) == "core"
+    # the least recently used file made room
+    assert policy.stats()["images"] == 1
+    assert openDriver(policy, fpath) == "core"
+    assert policy.stats()["imageHits"] == 0
+
+
+def test_core_read_outside_lock(fpath, tmp_path, monkeypatch):
+    other = str(tmp_path / "other.h5")
+    with h5py.File(other, "w") as h5file:
+        h5file["x"] = np.arange(10)
+    policy = OpenPolicy()
+    policy.configure(coreMaxBytes=2 ** 20, coreMinOpens=1)
+
+    # hold up reading the file into memory
+    reading, proceed = threading.Event(), threading.Event()
+    File = h5py.File
+
+    def slowFile(*args, **kwargs):
+        if kwargs.get("driver") == "core" and args[0] == fpath:
+            reading.set()
+            proceed.wait(5)
+        return File(*args, **kwargs)
+
+    monkeypatch.setattr(policyModule.h5py, "File", slowFile)
+    drivers = []
+    readers = [threading.Thread(target=lambda: drivers.append(openDriver(policy, fpath))) for _ in range(2)]
+    for reader in readers:
+        reader.start()
+    assert reading.wait(5)
+
+    # other files and the stats don't wait on the read
+    opener = threading.Thread(target=lambda: drivers.append(openDriver(policy, other)) or policy.stats())
+    opener.start()
+    opener.join(2)
+    assert not opener.is_alive()
+    assert drivers == ["core"]
+
+    proceed.set()
+    for reader in readers:
+        reader.join(5)
+    # the file was read once, for both requests
+    assert drivers == ["core", "core", "core"]
+    assert policy.stats()["images"] == 2
+    assert policy.stats()["imageHits"] == 1
+
+
+def test_paged(tmp_path):
+    fpath = str(tmp_path / "paged.h5")
+    with h5py.File(fpath, "w", fs_strategy="page", fs_page_size=4096) as h5file:
+        h5file["x"] = np.arange(10)
+    policy = OpenPolicy()
+    policy.configure(pageBufferBytes=2 ** 20)
+
+    # whether a file is paged is only known once it has been opened
+    pageBuffers = []
+    for _ in range(2):
+        with policy.open(fpath) as f:
+            pageBuffers.append(f.id.get_access_plist().get_page_buffer_size()[0])
+            assert f.id.get_access_plist().get_cache()[2] == policy.chunkCacheBytes
+    assert pageBuffers == [0, 2 ** 20]
+
+    # unless the buffer can't hold a page
+    policy.configure(pageBufferBytes=1024)
+    assert policy.choose(fpath, policy._layouts[fpath][0]) == "default"
+
+
+def test_metrics(fpath):
+    policy = OpenPolicy()
+    policy.configure(coreMaxBytes=2 ** 20, coreMinOpens=2)
+    timer = RequestTimer()
+    with timerContext(timer):
+        for _ in range(3):
+            openDriver(policy, fpath)
+
+    assert timer.counts == {"coreOpens": 2, "defaultOpens": 1}
+
+
+class TestRequestOpens(ServerTest):
+    config = Config({"NotebookApp": {"nbserver_extensions": {"jupyterlab_hdf": True}}, "HdfConfig": {"core_max_bytes": 2 ** 20, "core_min_opens": 3}})
+
+    def setUp(self):
+        super().setUp()
+
+        with h5py.File(os.path.join(self.notebook_dir, "test_file.h5"), "w") as h5file:
+            h5file["x"] = np.arange(10)
+        waitForWatcher(os.path.join(self.notebook_dir, "test_file.h5"))
+
+    def test_one_open_per_request(self):
+        opens = dict(openPolicy.opens)
+        for _ in range(2):
+            self.tester.get(["meta", "test_file.h5"], params={"uri": "/x"})
+        # the check that the file can be opened isn't an open of its own
+        assert openPolicy.opens["default"] - opens["default"] == 2
+        assert openPolicy.opens["core"] == opens["core"]
+
+        # so the file is hot on the third request
+        self.tester.get(["meta", "test_file.h5"], params={"uri": "/x"})
+        assert openPolicy.opens["core"] - opens["core"] == 1
@@ -0,0 +1,61 @@
+import h5py
+import numpy as np
+import os
+import pytest
+from requests import HTTPError
+from traitlets.config import Config
+from jupyterlab_hdf.tests.utils import ServerTest
+
+TWO_D = np.arange(0, 10, dtype=np.float64).reshape(2, 5)
+
+
+class TestProfileDisabled(ServerTest):
+    def setUp(self):
+        super().setUp()
+
+        with h5py.File(os.path.join(self.notebook_dir, "test_file.h5"), "w") as h5file:
+            h5file["twoD_dataset"] = TWO_D
+
+    def test_profile_forbidden(self):
+        with pytest.raises(HTTPError) as e:
+            self.tester.get(["data", "test_file.h5"], params={"uri": "/twoD_dataset", "profile": 1})
+
+        assert e.value.response.status_code == 403
+
+
+class TestProfile(ServerTest):
+    config = Config({"NotebookApp": {"nbserver_extensions": {"jupyterlab_hdf": True}}, "HdfConfig": {"allow_profiling": True, "profile_top_n": 5}})
+
+    def setUp(self):
+        super().setUp()
+
+        with h5py.File(os.path.join(self.notebook_dir, "test_file.h5"), "w") as h5file:
+            h5file["twoD_dataset"] = TWO_D
+
+    def test_profile_body(self):
+        response = self.tester.get(["data", "test_file.h5"], params={"uri": "/twoD_dataset", "profile": 1})
+
+        assert response.status_code == 200
+        payload = response.json()
+        assert payload["result"] == TWO_D.tolist()
+        assert sorted(payload["profile"]["phases"]) == ["encode", "index", "jsonize", "open", "read", "resolve"]
+        # checking that h5py can read the file isn't counted, only the open that serves the request
+        assert payload["profile"]["counts"] == {"defaultOpens": 1, "readBytes": 80, "readElements": 10}
+        assert payload["profile"]["total"] > 0
+        assert payload["profile"]["cprofile"] is None
+        assert "read;dur=" in response.headers["Server-Timing"]
+
+    def test_profile_header(self):
+        response = self.tester.get(["data", "test_file.h5"], params={"uri": "/twoD_dataset", "profile": "header"})
+
+        assert response.status_code == 200
+        assert response.json() == TWO_D.tolist()
+        assert "total;dur=" in response.headers["Server-Timing"]
+
+    def test_cprofile(self):
+        response = self.tester.get(["meta", "test_file.h5"], params={"uri": "/twoD_dataset", "profile": "cprofile"})
+
+        assert response.status_code == 200
+        payload = response.json()
+        assert payload["result"]["name"] == "twoD_dataset"
+        assert "cumulative" in payload["profile"]["cprofile"]
@@ -0,0 +1,85 @@
+import asyncio
+import threading
+import pytest
+from jupyterlab_hdf.cancel import CancelGroup, CancelToken
+from jupyterlab_hdf.exception import JhdfCancelledError
+from jupyterlab_hdf.scheduler import HdfLane, HdfScheduler
+from jupyterlab_hdf.tests.utils import ServerTest
+
+
+def test_lane_is_fair_between_users():
+    lane = HdfLane("test", 1)
+    order = []
+    gate = threading.Event()
+
+    def job(name):
+        def _job():
+            gate.wait()
+            order.append(name)
+
+        return _job
+
+    async def main():
+        # alice queues a burst of reads before bob queues any of his
+        futs = [lane.submit(job(f"alice{i}"), user="alice") for i in range(4)]
+        futs += [lane.submit(job(f"bob{i}"), user="bob") for i in range(2)]
+        assert lane.running == 1
+        assert lane.queued == 5
+        gate.set()
+        await asyncio.gather(*futs)
+
+    asyncio.run(main())
+
+    assert order == ["alice0", "alice1", "bob0", "alice2", "bob1", "alice3"]
+    assert lane.stats()["completed"] == 6
+
+
+def test_lane_drops_cancelled_jobs():
+    lane = HdfLane("test", 1)
+    gate = threading.Event()
+    token = CancelToken()
+    group = CancelGroup()
+    group.add(token)
+
+    async def main():
+        first = lane.submit(gate.wait)
+        second = lane.submit(lambda: pytest.fail("cancelled job should not run"), group=group)
+        token.cancel()
+        gate.set()
+        await first
+        with pytest.raises(JhdfCancelledError):
+            await second
+
+    asyncio.run(main())
+
+    assert lane.dropped == 1
+
+
+def test_scheduler_lanes_are_independent():
+    sched = HdfScheduler()
+    sched.configure(meta=1, bulk=1)
+    gate = threading.Event()
+
+    async def main():
+        bulk = sched.submit("bulk", gate.wait)
+        # a metadata job completes even while the only bulk thread is busy
+        assert await sched.submit("meta", lambda: "meta") == "meta"
+        gate.set()
+        await bulk
+
+    asyncio.run(main())
+
+    with pytest.raises(ValueError):
+        sched.configure(stats=1)
+
+
+class TestStatus(ServerTest):
+    def test_status(self):
+        response = self.tester.get(["status"])
+
+        assert response.status_code == 200
+        payload = response.json()
+        assert sorted(payload["scheduler"]) == ["bulk", "meta"]
+        assert payload["scheduler"]["meta"]["concurrency"] == 4
+        assert payload["scheduler"]["bulk"]["concurrency"] == 2
+        assert sorted(payload["inflight"]) == ["hits", "inflight", "misses"]
@@ -0,0 +1,119 @@
+import h5py
+import numpy as np
+import os
+from traitlets.config import Config
+from jupyterlab_hdf.search import SearchIndex, queryMatcher, searchIndexes, walkObjects
+from jupyterlab_hdf.tests.utils import ServerTest, waitForWatcher
+from jupyterlab_hdf.util import fileIdentity
+
+
+def makeFile(fpath):
+    with h5py.File(fpath, "w") as h5file:
+        for run in range(3):
+            group = h5file.create_group(f"run{run}")
+            group.attrs["detector"] = "pilatus" if run else "eiger"
+            group.attrs["energy"] = 8.5 + run
+            group["temperature"] = np.arange(4.0)
+            group["image_data"] = np.zeros((2, 2))
+            group["image_data"].attrs["units"] = "counts"
+        h5file["run0/loop"] = h5file["run0"]
+        h5file["latest"] = h5py.SoftLink("/run2")
+
+
+class TestSearch(ServerTest):
+    config = Config({"NotebookApp": {"nbserver_extensions": {"jupyterlab_hdf": True}}, "HdfConfig": {"search_scan_limit": 100}})
+
+    def setUp(self):
+        super().setUp()
+
+        self.fpath = os.path.join(self.notebook_dir, "test_file.h5")
+        makeFile(self.fpath)
+        waitForWatcher(self.fpath)
+
+    def tearDown(self):
+        # let background index builds finish, so that the next test can rewrite the file
+        for future in list(searchIndexes._building.values()):
+            future.result()
+        super().tearDown()
+
+    def search(self, q, uri="/", **params):
+        return self.tester.get(["search", "test_file.h5"], params={"uri": uri, "q": q, **params}).json()
+
+    def searchIndexed(self, q, uri="/", **params):
+        searchIndexes.build(self.fpath, fileIdentity(self.fpath)).result()
+        result = self.search(q, uri=uri, **params)
+        assert result["indexed"]
+        return result
+
+    def test_scan_then_index(self):
+        scanned = self.search("TEMP")
+        assert not scanned["indexed"]
+        assert scanned["complete"]
+        assert [hit["uri"] for hit in scanned["hits"]] == ["/run0/temperature", "/run1/temperature", "/run2/temperature"]
+        assert scanned["hits"][0] == {"matches": ["name", "path"], "name": "temperature", "type": "dataset", "uri": "/run0/temperature"}
+
+        indexed = self.searchIndexed("TEMP")
+        assert indexed["hits"] == scanned["hits"]
+        assert indexed["total"] == 3
+
+    def test_modes(self):
+        for search in (self.search, self.searchIndexed):
+            assert [hit["uri"] for hit in search("image_*", mode="glob", fields="name")["hits"]] == ["/run0/image_data", "/run1/image_data", "/run2/image_data"]
+            assert [hit["uri"] for hit in search(r"^run\d$", mode="regex", fields="name")["hits"]] == ["/run0", "/run1", "/run2"]
+            assert [hit["uri"] for hit in search("eiger", fields="value")["hits"]] == ["/run0", "/run0/loop"]
+            assert [hit["uri"] for hit in search("units", fields="attr")["hits"]] == ["/run0/image_data", "/run1/image_data", "/run2/image_data"]
+            assert [hit["uri"] for hit in search("9.5", fields="value")["hits"]] == ["/run1"]
+            assert [hit["uri"] for hit in search("latest")["hits"]] == ["/latest"]
+
+    def test_scope_and_paging(self):
+        for search in (self.search, self.searchIndexed):
+            assert [hit["uri"] for hit in search("a", uri="/run1", fields="name")["hits"]] == ["/run1/image_data", "/run1/temperature"]
+            assert [hit["uri"] for hit in search("a", uri="/run1/", fields="name")["hits"]] == ["/run1/image_data", "/run1/temperature"]
+
+            page = search("run", fields="path", offset=2, limit=3)
+            assert [hit["uri"] for hit in page["hits"]] == ["/run2", "/run0/image_data", "/run0/loop"]
+
+    def test_partial_scan(self):
+        result = self.search("run", fields="path", limit=2)
+        assert not result["complete"]
+        assert result["total"] is None
+        assert len(result["hits"]) == 2
+
+    def test_revalidate_after_indexing(self):
+        params = {"uri": "/", "q": "run", "fields": "path", "limit": 2}
+        scanned = self.request("GET", "/hdf/search/test_file.h5", params=params)
+        assert not scanned.json()["complete"]
+
+        # the partial scan mustn't be revalidated once the index can give the full result
+        searchIndexes.build(self.fpath, fileIdentity(self.fpath)).result()
+        indexed = self.request("GET", "/hdf/search/test_file.h5", params=params, headers={"If-None-Match": scanned.headers["Etag"]})
+        assert indexed.status_code == 200
+        assert indexed.json()["indexed"]
+        assert indexed.json()["complete"]
+        assert indexed.json()["total"] == 10
+        assert indexed.headers["Etag"] != scanned.headers["Etag"]
+
+        response = self.request("GET", "/hdf/search/test_file.h5", params=params, headers={"If-None-Match": indexed.headers["Etag"]})
+        assert response.status_code == 304
+
+    def test_bad_queries(self):
+        for params in ({"q": ""}, {"q": "x", "mode": "fuzzy"}, {"q": "(", "mode": "regex"}, {"q": "x", "fields": "size"}, {"q": "x", "limit": "many"}):
+            response = self.request("GET", "/hdf/search/test_file.h5", params={"uri": "/", **params})
+            assert response.status_code == 400, params
+
+
+def test_index_candidates(tmp_path):
+    fpath = str(tmp_path / "test_file.h5")
+    makeFile(fpath)
+    with h5py.File(fpath, "r") as f:
+        index = SearchIndex.build(f, fileIdentity(f.filename))
+        walked = list(walkObjects(f))
+
+    # the hard link loop is listed, but isn't walked into
+    assert len(index.paths) == len(walked) == 11
+    assert "/run0/loop/loop" not in index.paths
+    # only strings holding every trigram of the literal get verified
+    assert [index.strings[sid] for sid in index._candidates("ima")] == ["image_data"]
+
+    matcher, literal = queryMatcher("IMAGE", "substring")
+    assert [index.paths[objId] for objId, _ in index.search("/run2", matcher, literal, ("name",))] == ["/run2/image_data"]
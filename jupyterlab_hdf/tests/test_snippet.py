@@ -0,0 +1,27 @@
+import h5py
+import numpy as np
+import os
+from jupyterlab_hdf.tests.utils import ServerTest
+
+
+class TestSnippet(ServerTest):
+    def setUp(self):
+        super().setUp()
+
+        with h5py.File(os.path.join(self.notebook_dir, "test_file.h5"), "w") as h5file:
+            grp = h5file.create_group("group")
+            grp["dataset"] = np.arange(0, 24, dtype=np.int64).reshape(2, 3, 4)
+
+    def test_dataset(self):
+        response = self.tester.get(["snippet", "test_file.h5"], params={"uri": "/group/dataset", "ixstr": ":, 1, :"})
+
+        assert response.status_code == 200
+        fpath = os.path.join(self.notebook_dir, "test_file.h5")
+        assert response.json() == f"with h5py.File('{fpath}', 'r') as f:\n    dataset = f['/group/dataset'][:, 1, :]"
+
+    def test_group(self):
+        response = self.tester.get(["snippet", "test_file.h5"], params={"uri": "/group"})
+
+        assert response.status_code == 200
+        fpath = os.path.join(self.notebook_dir, "test_file.h5")
+        assert response.json() == f"with h5py.File('{fpath}', 'r') as f:\n    group = f['/group']"
@@ -0,0 +1,79 @@
+import h5py
+import numpy as np
+import os
+import pytest
+from requests import HTTPError
+from jupyterlab_hdf.tests.utils import ServerTest
+
+
+class TestStorage(ServerTest):
+    def setUp(self):
+        super().setUp()
+
+        with h5py.File(os.path.join(self.notebook_dir, "test_file.h5"), "w") as h5file:
+            h5file["contiguous"] = np.arange(0, 24, dtype=np.int64).reshape(2, 3, 4)
+            h5file.create_dataset("chunked", data=np.zeros((1000, 1000)), chunks=(100, 50), compression="gzip", shuffle=True)
+            h5file["scalar"] = 56
+            h5file["empty"] = h5py.Empty(">f8")
+            h5file.create_group("group")
+
+    def test_contiguous_dataset(self):
+        response = self.tester.get(["storage", "test_file.h5"], params={"uri": "/contiguous"})
+
+        assert response.status_code == 200
+        payload = response.json()
+        assert payload == dict(
+            (
+                ("allocatedChunks", None),
+                ("chunks", None),
+                ("compressionRatio", 1.0),
+                ("filters", []),
+                ("layout", "contiguous"),
+                ("logicalSize", 192),
+                ("name", "contiguous"),
+                ("storageSize", 192),
+                ("tileChunks", None),
+                ("tileReadBytes", 96),
+                ("tileShape", [1, 3, 4]),
+            )
+        )
+
+    def test_chunked_dataset(self):
+        response = self.tester.get(["storage", "test_file.h5"], params={"uri": "/chunked"})
+
+        assert response.status_code == 200
+        payload = response.json()
+        assert payload["layout"] == "chunked"
+        assert payload["chunks"] == [100, 50]
+        assert [f["name"] for f in payload["filters"]] == ["shuffle", "deflate"]
+        assert payload["logicalSize"] == 8000000
+        assert payload["compressionRatio"] > 1
+        assert payload["allocatedChunks"] == 200
+        assert payload["tileShape"] == [100, 100]
+        # a 100x100 tile at a random offset crosses 1.99 row chunks and 2.98 column chunks
+        assert payload["tileChunks"] == pytest.approx(1.99 * 2.98)
+        assert payload["tileReadBytes"] == int(1.99 * 2.98 * 100 * 50 * 8)
+
+    def test_scalar_dataset(self):
+        response = self.tester.get(["storage", "test_file.h5"], params={"uri": "/scalar"})
+
+        assert response.status_code == 200
+        payload = response.json()
+        assert payload["layout"] == "contiguous"
+        assert payload["logicalSize"] == 8
+        assert payload["tileShape"] is None
+
+    def test_empty_dataset(self):
+        response = self.tester.get(["storage", "test_file.h5"], params={"uri": "/empty"})
+
+        assert response.status_code == 200
+        payload = response.json()
+        assert payload["logicalSize"] == 0
+        assert payload["compressionRatio"] is None
+        assert payload["tileShape"] is None
+
+    def test_group(self):
+        with pytest.raises(HTTPError) as e:
+            self.tester.get(["storage", "test_file.h5"], params={"uri": "/group"})
+
+        assert e.value.response.status_code == 400
@@ -0,0 +1,116 @@
+import asyncio
+import h5py
+import json
+import numpy as np
+import os
+import subprocess
+import sys
+from tornado.httpclient import HTTPRequest
+from tornado.websocket import websocket_connect
+from traitlets.config import Config
+from jupyterlab_hdf.swmr import SwmrFiles, swmrFiles
+from jupyterlab_hdf.tests.test_tiles import parseFrame
+from jupyterlab_hdf.tests.utils import ServerTest, waitForWatcher
+
+# writes a file in SWMR mode from another process (as an acquisition system would),
+# appending 5 rows of 2 to /frames for every line read from stdin
+WRITER = """
+import h5py, sys
+with h5py.File(sys.argv[1], "w", libver="latest") as f:
+    frames = f.create_dataset("frames", shape=(0, 2), maxshape=(None, 2), dtype="<f8", chunks=(5, 2))
+    f.swmr_mode = True
+    for n in range(0, 1000, 5):
+        frames.resize((n + 5, 2))
+        frames[n:] = [[i, -i] for i in range(n, n + 5)]
+        frames.flush()
+        print(n + 5, flush=True)
+        if not sys.stdin.readline():
+            break
+"""
+
+
+def frames(n):
+    return np.array([[i, -i] for i in range(n)], dtype="<f8")
+
+
+class TestSwmr(ServerTest):
+    config = Config({"NotebookApp": {"nbserver_extensions": {"jupyterlab_hdf": True}}, "HdfConfig": {"swmr": True}})
+
+    def setUp(self):
+        super().setUp()
+
+        self.writer = subprocess.Popen([sys.executable, "-c", WRITER, os.path.join(self.notebook_dir, "live.h5")], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        assert self.writer.stdout.readline().strip() == "5"
+
+    def tearDown(self):
+        self.writer.stdin.close()
+        self.writer.wait()
+        swmrFiles.close()
+        super().tearDown()
+
+    def append(self):
+        self.writer.stdin.write("\n")
+        self.writer.stdin.flush()
+        return int(self.writer.stdout.readline())
+
+    def test_growing_dataset(self):
+        opens = swmrFiles.opens
+        assert self.tester.get(["meta", "live.h5"], params={"uri": "/frames"}).json()["shape"] == [5, 2]
+
+        assert self.append() == 10
+        assert self.tester.get(["meta", "live.h5"], params={"uri": "/frames"}).json()["shape"] == [10, 2]
+        # only the new rows need fetching
+        assert self.tester.get(["data", "live.h5"], params={"uri": "/frames", "ixstr": "5:10, :"}).json() == frames(10)[5:].tolist()
+        # every request went through the same handle
+        assert swmrFiles.opens - opens == 1
+
+    def test_grew(self):
+        subscribe = {"type": "subscribe", "view": "v", "fpath": "live.h5", "uri": "/frames", "ixstr": ":, :"}
+
+        async def run():
+            url = self.base_url().replace("http://", "ws://") + "hdf/tiles"
+            conn = await websocket_connect(HTTPRequest(url, headers=self.auth_headers()))
+            await conn.write_message(json.dumps(subscribe))
+            subscribed = json.loads(await asyncio.wait_for(conn.read_message(), 10))
+            self.append()
+            grew = json.loads(await asyncio.wait_for(conn.read_message(), 10))
+            await conn.write_message(json.dumps({"type": "tile", "view": "v", "tile": 1, "subixstr": "5:10, 0:2"}))
+            tile = parseFrame(await asyncio.wait_for(conn.read_message(), 10))
+            conn.close()
+            return subscribed, grew, tile
+
+        subscribed, grew, (header, data) = asyncio.run(run())
+        assert subscribed["shape"] == [5, 2]
+        assert grew == {"previous": [5, 2], "shape": [10, 2], "type": "grew", "view": "v"}
+        assert header["shape"] == [5, 2]
+        assert (data == frames(10)[5:]).all()
+
+
+def test_handles(tmp_path):
+    fpath = str(tmp_path / "test_file.h5")
+    with h5py.File(fpath, "w") as h5file:
+        h5file["x"] = np.arange(3)
+    files = SwmrFiles(enabled=True)
+
+    with files.open(fpath) as f, files.open(fpath) as g:
+        assert f is g
+        assert f.swmr_mode
+        # writers aren't locked out by the handle
+        subprocess.run([sys.executable, "-c", f"import h5py; h5py.File({fpath!r}, 'a').close()"], check=True)
+    assert files.stats() == {"enabled": True, "handles": 1, "opens": 1, "reuses": 1}
+
+    # a replaced file gets opened again
+    os.replace(fpath, fpath + ".old")
+    with h5py.File(fpath, "w") as h5file:
+        h5file["x"] = np.arange(4)
+    waitForWatcher(fpath)
+    with files.open(fpath) as f:
+        assert f["x"].shape == (4,)
+    assert files.stats()["opens"] == 2
+
+    # and unused handles get closed
+    files.configure(idle=0)
+    with files.open(fpath + ".old"):
+        assert files.stats()["handles"] == 1
+    files.close()
+    assert files.stats()["handles"] == 0
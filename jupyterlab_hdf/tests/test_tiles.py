@@ -0,0 +1,109 @@
+import asyncio
+import h5py
+import json
+import numpy as np
+import os
+import struct
+from tornado.httpclient import HTTPRequest
+from tornado.websocket import websocket_connect
+from traitlets.config import Config
+from jupyterlab_hdf.tests.utils import ServerTest
+
+TWO_D = np.arange(0, 400, dtype=np.float64).reshape(20, 20)
+STRINGS = np.array([b"a", b"bc", b"def"])
+
+
+def parseFrame(frame):
+    (hlen,) = struct.unpack("<I", frame[:4])
+    header = json.loads(frame[4 : 4 + hlen])
+    payload = frame[4 + hlen :]
+    if header["format"] == "binary":
+        return header, np.frombuffer(payload, dtype=header["dtype"]).reshape(header["shape"])
+    return header, json.loads(payload)
+
+
+class TestTiles(ServerTest):
+    # one tile at a time, so that the order tiles are served in is deterministic
+    config = Config({"NotebookApp": {"nbserver_extensions": {"jupyterlab_hdf": True}}, "HdfConfig": {"tile_concurrency": 1}})
+
+    def setUp(self):
+        super().setUp()
+
+        with h5py.File(os.path.join(self.notebook_dir, "test_file.h5"), "w") as h5file:
+            h5file["twoD_dataset"] = TWO_D
+            h5file["strings"] = STRINGS
+
+    def converse(self, messages, nreplies):
+        """Send messages over a fresh tiles websocket, and collect the replies"""
+
+        async def run():
+            url = self.base_url().replace("http://", "ws://") + "hdf/tiles"
+            conn = await websocket_connect(HTTPRequest(url, headers=self.auth_headers()))
+            for msg in messages:
+                await conn.write_message(json.dumps(msg))
+            replies = []
+            while len(replies) < nreplies:
+                reply = await asyncio.wait_for(conn.read_message(), 10)
+                replies.append(parseFrame(reply) if isinstance(reply, bytes) else json.loads(reply))
+            conn.close()
+            return replies
+
+        return asyncio.run(run())
+
+    def test_tiles(self):
+        subscribe = {"type": "subscribe", "view": "v", "fpath": "test_file.h5", "uri": "/twoD_dataset", "ixstr": ":, :", "min_ndim": 2}
+        tiles = [{"type": "tile", "view": "v", "tile": i, "subixstr": f"{i * 10}:{i * 10 + 10}, 5:15"} for i in range(2)]
+        subscribed, *frames = self.converse([subscribe, *tiles], 3)
+
+        assert subscribed == {"dtype": "<f8", "shape": [20, 20], "type": "subscribed", "view": "v"}
+        for i, (header, data) in enumerate(frames):
+            assert header["tile"] == i
+            assert header["view"] == "v"
+            assert header["format"] == "binary"
+            assert (data == TWO_D[i * 10 : i * 10 + 10, 5:15]).all()
+
+    def test_priority_and_cancel(self):
+        subscribe = {"type": "subscribe", "view": "v", "fpath": "test_file.h5", "uri": "/twoD_dataset", "ixstr": ":, :"}
+        tiles = {"type": "tiles", "view": "v", "tiles": [{"tile": i, "subixstr": f"{i}:{i + 1}, 0:20", "priority": 10 - i} for i in range(5)]}
+        # by the time this arrives, tile 4 (the most urgent) is being read, and tile 0 (the least) is still queued
+        cancel = {"type": "cancel", "view": "v", "tiles": [0]}
+        subscribed, *frames = self.converse([subscribe, tiles, cancel], 5)
+
+        assert [header["tile"] for header, _ in frames] == [4, 3, 2, 1]
+        assert (frames[0][1] == TWO_D[4:5]).all()
+
+    def test_json_tiles(self):
+        subscribe = {"type": "subscribe", "view": "s", "fpath": "test_file.h5", "uri": "/strings", "ixstr": ":"}
+        tile = {"type": "tile", "view": "s", "tile": "t", "subixstr": "1:3"}
+        subscribed, (header, data) = self.converse([subscribe, tile], 2)
+
+        assert header["format"] == "json"
+        assert data == ["bc", "def"]
+
+    def test_errors(self):
+        messages = [
+            {"type": "subscribe", "view": "v", "fpath": "test_file.h5", "uri": "/not_there"},
+            {"type": "tile", "view": "nope", "tile": 0},
+            {"type": "bogus"},
+        ]
+        replies = self.converse(messages, 3)
+
+        assert [(reply["type"], reply["status"]) for reply in replies] == [("error", 404), ("error", 400), ("error", 400)]
+
+    def test_changed(self):
+        subscribe = {"type": "subscribe", "view": "v", "fpath": "test_file.h5", "uri": "/twoD_dataset"}
+
+        async def run():
+            url = self.base_url().replace("http://", "ws://") + "hdf/tiles"
+            conn = await websocket_connect(HTTPRequest(url, headers=self.auth_headers()))
+            await conn.write_message(json.dumps(subscribe))
+            subscribed = json.loads(await asyncio.wait_for(conn.read_message(), 10))
+            with h5py.File(os.path.join(self.notebook_dir, "test_file.h5"), "a") as h5file:
+                h5file["twoD_dataset"][0, 0] = -1
+            changed = json.loads(await asyncio.wait_for(conn.read_message(), 10))
+            conn.close()
+            return subscribed, changed
+
+        subscribed, changed = asyncio.run(run())
+        assert subscribed["type"] == "subscribed"
+        assert changed == {"type": "changed", "view": "v"}
@@ -0,0 +1,83 @@
+import h5py
+import numpy as np
+import os
+import tempfile
+import time
+from traitlets.config import Config
+from jupyterlab_hdf.tests.utils import ServerTest
+from jupyterlab_hdf.trace import TraceRecorder, readTrace, traceRecorder
+
+TRACE_DIR = tempfile.mkdtemp(prefix="jhdf-trace-")
+
+
+class TestTrace(ServerTest):
+    config = Config({"NotebookApp": {"nbserver_extensions": {"jupyterlab_hdf": True}}, "HdfConfig": {"trace_file": os.path.join(TRACE_DIR, "trace.jsonl")}})
+
+    def setUp(self):
+        super().setUp()
+
+        with h5py.File(os.path.join(self.notebook_dir, "test_file.h5"), "w") as h5file:
+            h5file["twoD_dataset"] = np.arange(0, 100, dtype=np.float64).reshape(10, 10)
+            h5file["twoD_dataset"].attrs["units"] = "m"
+
+    def test_trace(self):
+        self.tester.get(["data", "test_file.h5"], params={"uri": "/twoD_dataset", "ixstr": ":, :", "subixstr": "0:2, 0:3", "min_ndim": 2})
+        self.tester.get(["attrs", "test_file.h5"], params={"uri": "/twoD_dataset", "attr_keys": ["units"]})
+
+        # requests are recorded after their response is sent, so the last one may take a moment to show up
+        for _ in range(100):
+            recs = list(readTrace(traceRecorder.fpath))
+            if len(recs) >= 2:
+                break
+            time.sleep(0.05)
+        recs = recs[-2:]
+        assert [rec["endpoint"] for rec in recs] == ["data", "attrs"]
+        assert recs[0]["path"] == "test_file.h5"
+        assert recs[0]["uri"] == "/twoD_dataset"
+        assert recs[0]["ixstr"] == ":, :"
+        assert recs[0]["subixstr"] == "0:2, 0:3"
+        assert recs[0]["min_ndim"] == 2
+        assert recs[0]["status"] == 200
+        assert recs[0]["bytes"] > 0
+        assert recs[0]["ms"] > 0
+        assert recs[0]["t"] <= recs[1]["t"]
+        assert recs[1]["attr_keys"] == ["units"]
+        assert "ixstr" not in recs[1]
+
+    def test_trace_search(self):
+        self.tester.get(["search", "test_file.h5"], params={"uri": "/", "q": "two D", "fields": "name", "limit": 5})
+
+        for _ in range(100):
+            recs = [rec for rec in readTrace(traceRecorder.fpath) if rec["endpoint"] == "search"]
+            if recs:
+                break
+            time.sleep(0.05)
+        assert recs[-1]["q"] == "two D"
+        assert recs[-1]["mode"] == "substring"
+        assert recs[-1]["fields"] == ["name"]
+        assert recs[-1]["offset"] == 0
+        assert recs[-1]["limit"] == 5
+
+    def test_trace_stream(self):
+        self.tester.get(["data", "test_file.h5"], params={"uri": "/twoD_dataset", "stream": "binary", "shuffle": "1"})
+
+        for _ in range(100):
+            recs = [rec for rec in readTrace(traceRecorder.fpath) if rec.get("stream") is not None]
+            if recs:
+                break
+            time.sleep(0.05)
+        assert recs[-1]["stream"] == "binary"
+        assert recs[-1]["shuffle"] == "1"
+
+
+def test_recorder_disabled(tmp_path):
+    recorder = TraceRecorder()
+    recorder.record("data", "f.h5", "/x", dict(), 0.0, 0.1, 200)
+    assert not recorder.enabled
+
+    fpath = str(tmp_path / "trace.jsonl")
+    recorder.configure(fpath)
+    recorder.record("meta", "f.h5", "/x", dict((("ixstr", "0"), ("min_ndim", None))), 1.5, 0.25, 404)
+    recorder.close()
+
+    assert list(readTrace(fpath)) == [dict((("bytes", 0), ("endpoint", "meta"), ("ixstr", "0"), ("ms", 250.0), ("path", "f.h5"), ("status", 404), ("t", 1.5), ("uri", "/x")))]
@@ -0,0 +1,97 @@
+import os
+import pytest
+import time
+from jupyterlab_hdf.util import fileIdentity
+from jupyterlab_hdf.watch import FileWatcher, mountType
+
+
+def waitFor(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture(params=["inotify", "poll"])
+def watcher(request):
+    watcher = FileWatcher(mode=request.param, interval=0.05)
+    watcher.changed = []
+    watcher.subscribe(watcher.changed.append)
+    yield watcher
+    watcher.close()
+
+
+def test_identity_cached(tmp_path, watcher):
+    fpath = tmp_path / "test_file.h5"
+    fpath.write_bytes(b"0" * 10)
+
+    assert watcher.identity(str(fpath)) == fileIdentity(str(fpath))
+    for _ in range(5):
+        assert watcher.identity(str(fpath)) == fileIdentity(str(fpath))
+    assert watcher.stats()["hits"] == 5
+    assert watcher.stats()["polled"] == (watcher.mode == "poll")
+
+
+def test_modified(tmp_path, watcher):
+    fpath = str(tmp_path / "test_file.h5")
+    with open(fpath, "wb") as f:
+        f.write(b"0" * 10)
+    watcher.identity(fpath)
+
+    with open(fpath, "ab") as f:
+        f.write(b"1")
+    waitFor(lambda: watcher.changed)
+    assert watcher.changed[0] == fpath
+    assert watcher.identity(fpath) == fileIdentity(fpath)
+
+
+def test_replaced(tmp_path, watcher):
+    fpath = str(tmp_path / "test_file.h5")
+    with open(fpath, "wb") as f:
+        f.write(b"0" * 10)
+    old = watcher.identity(fpath)
+
+    # an atomic save: the new version is written elsewhere, then renamed over the old one
+    with open(fpath + ".tmp", "wb") as f:
+        f.write(b"1" * 10)
+    os.replace(fpath + ".tmp", fpath)
+    waitFor(lambda: fpath in watcher.changed)
+    assert watcher.identity(fpath) != old
+
+
+def test_missing_then_created(tmp_path):
+    watcher = FileWatcher(mode="inotify", interval=0.05)
+    fpath = str(tmp_path / "test_file.h5")
+    assert watcher.identity(fpath) is None
+
+    with open(fpath, "wb") as f:
+        f.write(b"0")
+    assert watcher.identity(fpath) == fileIdentity(fpath)
+    watcher.close()
+
+
+def test_idle_files_dropped(tmp_path):
+    watcher = FileWatcher(mode="inotify", interval=0.05, idle=0.1)
+    fpath = str(tmp_path / "test_file.h5")
+    with open(fpath, "wb") as f:
+        f.write(b"0")
+    watcher.identity(fpath)
+    assert watcher.stats()["watched"] == 1
+
+    waitFor(lambda: watcher.stats()["watched"] == 0)
+    assert not watcher._dirs
+    watcher.close()
+
+
+def test_off(tmp_path):
+    watcher = FileWatcher(mode="off")
+    fpath = str(tmp_path / "test_file.h5")
+    with open(fpath, "wb") as f:
+        f.write(b"0")
+    assert watcher.identity(fpath) == fileIdentity(fpath)
+    assert watcher.stats()["watched"] == 0
+    assert watcher._thread is None
+
+
+def test_mount_type():
+    assert mountType("/") is not None
@@ -1,6 +1,7 @@
 """Helpers for tests"""
 
 import json
+import time
 from typing import List
 from traitlets.config import Config
 
@@ -10,6 +11,17 @@ from notebook.utils import url_path_join
 NS = "/hdf"
 
 
+def waitForWatcher(fpath, timeout=5.0):
+    """Wait until the file watcher has caught up with changes to the file at fpath"""
+    from jupyterlab_hdf.util import fileIdentity
+    from jupyterlab_hdf.watch import fileWatcher
+
+    deadline = time.monotonic() + timeout
+    while fileWatcher.identity(fpath) != fileIdentity(fpath):
+        assert time.monotonic() < deadline, f"the file watcher missed a change to {fpath}"
+        time.sleep(0.01)
+
+
 class APITester(object):
     """Wrapper for REST API requests"""
 
@@ -35,6 +47,9 @@ class APITester(object):
     def get(self, path: List[str], body=None, params=None):
         return self._req("GET", path, body, params)
 
+    def post(self, path: List[str], body=None, params=None):
+        return self._req("POST", path, body, params)
+
 
 class ServerTest(ServerTestBase):
 
@@ -48,3 +63,10 @@ class ServerTest(ServerTestBase):
 
 class ServerTestWithLinkResolution(ServerTest):
     config = Config({"NotebookApp": {"nbserver_extensions": {"jupyterlab_hdf": True}}, "HdfConfig": {"resolve_links": True}})
+
+    def tearDown(self):
+        # held link targets would keep the next test from rewriting them
+        from jupyterlab_hdf.links import linkTargets
+
+        linkTargets.close()
+        super().tearDown()
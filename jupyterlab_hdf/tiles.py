@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import asyncio
+import heapq
+import itertools
+import json
+import numpy as np
+import os
+import struct
+from h5grove.encoders import orjson_encode
+from h5grove.models import LinkResolution
+from tornado import ioloop, web
+from tornado.httpclient import HTTPError
+from tornado.websocket import WebSocketClosedError, WebSocketHandler
+
+from notebook.base.handlers import IPythonHandler
+from notebook.base.zmqhandlers import WebSocketMixin
+from notebook.utils import url_path_join
+
+from .cancel import CancelToken
+from .config import HdfConfig
+from .data import HdfDataManager
+from .exception import JhdfCancelledError
+from .metrics import RequestTimer, metrics, phase, timerContext
+from .swmr import swmrFiles
+from .util import ixShape, jsonize, parseIndex
+from .watch import fileWatcher
+
+__all__ = ["HdfTilesHandler", "tileFrame"]
+
+
+def tileFrame(header, payload):
+    """A binary tile frame: the byte length of a json header (4 bytes, little-endian),
+    then the header, then the tile's data
+    """
+    header = orjson_encode(header)
+    return b"".join((struct.pack("<I", len(header)), header, payload))
+
+
+class _View:
+    """A dataset view that a client has subscribed to"""
+
+    def __init__(self, fpath, uri, ixstr, min_ndim, dtype, shape):
+        self.fpath = fpath
+        self.uri = uri
+        self.ixstr = ixstr
+        self.min_ndim = min_ndim
+        self.dtype = dtype
+        # shape of the view, before any padding to min_ndim
+        self.shape = shape
+        # tiles of numeric views are sent as raw values, any others as json
+        self.binary = dtype.kind in "biufc"
+        # whether the view's shape is being checked after a change to its file, and whether it changed again since
+        self.checking = False
+        self.recheck = False
+
+    def tileShape(self, subixstr):
+        # like the data endpoint, a subixstr only applies within an ixstr
+        shape = self.shape if subixstr is None or self.ixstr is None else ixShape(self.shape, parseIndex(subixstr))
+        if self.min_ndim is not None:
+            shape += (1,) * (self.min_ndim - len(shape))
+        return shape
+
+
+class _Tile:
+    """A requested tile, waiting to be read or being read"""
+
+    def __init__(self, viewId, tileId, subixstr, priority, seq):
+        self.viewId = viewId
+        self.tileId = tileId
+        self.subixstr = subixstr
+        self.priority = priority
+        self.seq = seq
+        self.token = CancelToken()
+
+    @property
+    def key(self):
+        return (self.viewId, self.tileId)
+
+
+## handler
+class HdfTilesHandler(WebSocketMixin, WebSocketHandler, IPythonHandler):
+    """Streams tiles of dataset views over one websocket.
+
+    Clients send json messages:
+        {"type": "subscribe", "view": id, "fpath": ..., "uri": ..., "ixstr": ..., "min_ndim": ...}
+        {"type": "tile", "view": id, "tile": id, "subixstr": ..., "priority": n}
+        {"type": "tiles", "view": id, "tiles": [{"tile": id, "subixstr": ..., "priority": n}, ...]}
+        {"type": "cancel", "view": id, "tiles": [ids]}  (all of the view's tiles if "tiles" is left out)
+        {"type": "unsubscribe", "view": id}
+
+    Tiles are read in order of priority (lowest first, then oldest first),
+    a few at a time, and each is pushed as a binary frame (see tileFrame) as
+    soon as it is ready. Sending a tile again with a new priority reorders
+    it, if it hasn't started yet. Errors come back as json messages of type
+    "error". When the file of a view changes on disk, the client is sent
+    {"type": "changed", "view": id}, and should subscribe to the view again.
+
+    In SWMR mode (see HdfConfig.swmr), files are expected to be appended to
+    while being viewed, so a view whose dataset grew is sent
+    {"type": "grew", "view": id, "previous": [...], "shape": [...]} instead,
+    and keeps its pending tiles. Clients then only need to request the tiles
+    covering the new rows
+    """
+
+    def set_default_headers(self):
+        # IPythonHandler's headers make no sense for websockets
+        pass
+
+    def initialize(self, notebook_dir):
+        self.notebook_dir = notebook_dir
+        self.hdf_config = hdf_config = HdfConfig(config=self.config)
+        self.manager = HdfDataManager(log=self.log, notebook_dir=notebook_dir, resolve_links=LinkResolution.ONLY_VALID if hdf_config.resolve_links else LinkResolution.NONE)
+        self.views = dict()
+        self.tiles = dict()
+        self.queue = []
+        self.running = set()
+        self._seq = itertools.count()
+
+    async def get(self, *args, **kwargs):
+        # authenticate before opening the websocket
+        if self.get_current_user() is None:
+            self.log.warning("Couldn't authenticate hdf tiles connection")
+            raise web.HTTPError(403)
+        return await super().get(*args, **kwargs)
+
+    def open(self, *args, **kwargs):
+        self._loop = ioloop.IOLoop.current()
+        fileWatcher.subscribe(self._fileChanged)
+        return super().open(*args, **kwargs)
+
+    async def on_message(self, message):
+        try:
+            msg = json.loads(message)
+            handler = getattr(self, "_on_" + msg["type"], None)
+            if handler is None:
+                raise ValueError(f"unknown message type {msg['type']!r}")
+            result = handler(msg)
+            if asyncio.iscoroutine(result):
+                await result
+        except (KeyError, TypeError, ValueError) as e:
+            self._sendError(None, None, 400, f"malformed message: {e}")
+
+    def on_close(self):
+        fileWatcher.unsubscribe(self._fileChanged)
+        for tile in self.tiles.values():
+            tile.token.cancel()
+        self.tiles.clear()
+        self.queue.clear()
+
+    async def _on_subscribe(self, msg):
+        viewId = msg["view"]
+        fpath, uri = msg["fpath"], "/" + msg["uri"].lstrip("/")
+        ixstr, min_ndim = msg.get("ixstr"), msg.get("min_ndim")
+        try:
+            layout = await self.manager.getAsync(fpath, uri, user=str(self.current_user), ixstr=ixstr, blockBytes=1)
+        except HTTPError as e:
+            self._sendError(viewId, None, e.code, e.message)
+            return
+
+        self._cancelTiles(viewId)
+        view = self.views[viewId] = _View(fpath, uri, ixstr, min_ndim, np.dtype(layout["dtype"]), tuple(layout["shape"] or ()))
+        self._sendJson(dict((("dtype", view.dtype.str), ("shape", view.tileShape(None)), ("type", "subscribed"), ("view", viewId))))
+
+    def _fileChanged(self, fpath):
+        # called from the watcher's thread
+        self._loop.add_callback(self._notifyChanged, fpath)
+
+    def _notifyChanged(self, fpath):
+        for viewId, view in list(self.views.items()):
+            if os.path.abspath(url_path_join(self.notebook_dir, view.fpath)) != fpath:
+                continue
+            if not swmrFiles.enabled:
+                self._viewChanged(viewId)
+            elif view.checking:
+                # SWMR writers flush often, so changes that come in while a view is checked are folded into one more check
+                view.recheck = True
+            else:
+                asyncio.ensure_future(self._checkView(viewId, view))
+
+    def _viewChanged(self, viewId):
+        self._cancelTiles(viewId)
+        self._sendJson(dict((("type", "changed"), ("view", viewId))))
+
+    async def _checkView(self, viewId, view):
+        """Tell the client whether a view grew (only rows or columns were appended
+        to it), or otherwise changed, after a change to its file
+        """
+        view.checking = True
+        try:
+            while self.views.get(viewId) is view:
+                view.recheck = False
+                try:
+                    layout = await self.manager.getAsync(view.fpath, view.uri, user=str(self.current_user), ixstr=view.ixstr, blockBytes=1)
+                except HTTPError:
+                    layout = None
+                if self.views.get(viewId) is not view:
+                    break
+
+                shape = None if layout is None else tuple(layout["shape"] or ())
+                if layout is None or np.dtype(layout["dtype"]) != view.dtype or len(shape) != len(view.shape) or any(n < m for n, m in zip(shape, view.shape)):
+                    self._viewChanged(viewId)
+                    break
+                if shape != view.shape:
+                    previous = view.tileShape(None)
+                    view.shape = shape
+                    self._sendJson(dict((("previous", previous), ("shape", view.tileShape(None)), ("type", "grew"), ("view", viewId))))
+                if not view.recheck:
+                    break
+        finally:
+            view.checking = False
+
+    def _on_unsubscribe(self, msg):
+        self._cancelTiles(msg["view"])
+        self.views.pop(msg["view"], None)
+
+    def _on_tile(self, msg):
+        self._queueTile(msg["view"], msg)
+        self._pump()
+
+    def _on_tiles(self, msg):
+        # queue the whole batch before starting any of it, so that priorities hold within the batch
+        for tileMsg in msg["tiles"]:
+            self._queueTile(msg["view"], tileMsg)
+        self._pump()
+
+    def _queueTile(self, viewId, msg):
+        tileId = msg["tile"]
+        if viewId not in self.views:
+            self._sendError(viewId, tileId, 400, "not subscribed to this view")
+            return
+
+        old = self.tiles.get((viewId, tileId))
+        if old is not None and old in self.running:
+            # already being read, too late to reprioritize
+            return
+        tile = _Tile(viewId, tileId, msg.get("subixstr"), float(msg.get("priority", 0)), next(self._seq))
+        self.tiles[tile.key] = tile
+        heapq.heappush(self.queue, (tile.priority, tile.seq, tile.key))
+
+    def _on_cancel(self, msg):
+        self._cancelTiles(msg["view"], msg.get("tiles"))
+
+    def _cancelTiles(self, viewId, tileIds=None):
+        keys = [key for key in self.tiles if key[0] == viewId] if tileIds is None else [(viewId, tileId) for tileId in tileIds]
+        for key in keys:
+            tile = self.tiles.pop(key, None)
+            if tile is not None:
+                tile.token.cancel()
+
+    def _pump(self):
+        """Start reading the most urgent tiles, up to HdfConfig.tile_concurrency at once"""
+        while self.queue and len(self.running) < self.hdf_config.tile_concurrency:
+            _, seq, key = heapq.heappop(self.queue)
+            tile = self.tiles.get(key)
+            if tile is None or tile.seq != seq:
+                # cancelled, or requeued with a new priority
+                continue
+            self.running.add(tile)
+            asyncio.ensure_future(self._serveTile(tile)).add_done_callback(lambda _, tile=tile: self._tileDone(tile))
+
+    def _tileDone(self, tile):
+        self.running.discard(tile)
+        self._pump()
+
+    async def _serveTile(self, tile):
+        timer = RequestTimer()
+        status, sentBytes = 200, 0
+        try:
+            with timerContext(timer):
+                view = self.views[tile.viewId]
+                shape = view.tileShape(tile.subixstr)
+                kwargs = dict((("ixstr", view.ixstr), ("min_ndim", view.min_ndim), ("subixstr", tile.subixstr)))
+                if view.binary:
+                    payload = await self.manager.getAsync(view.fpath, view.uri, token=tile.token, user=str(self.current_user), fmt="binary", **kwargs)
+                else:
+                    result = await self.manager.getAsync(view.fpath, view.uri, token=tile.token, user=str(self.current_user), **kwargs)
+                    with phase("encode"):
+                        payload = orjson_encode(result, default=jsonize)
+                tile.token.check()
+
+                header = dict(
+                    (
+                        ("dtype", view.dtype.newbyteorder("<").str if view.binary else view.dtype.str),
+                        ("format", "binary" if view.binary else "json"),
+                        ("shape", shape),
+                        ("tile", tile.tileId),
+                        ("view", tile.viewId),
+                    )
+                )
+                frame = tileFrame(header, payload)
+                with timer.phase("write"):
+                    await self.write_message(frame, binary=True)
+                sentBytes = len(frame)
+        except (JhdfCancelledError, WebSocketClosedError):
+            status = 499
+        except HTTPError as e:
+            status = e.code
+            self._sendError(tile.viewId, tile.tileId, e.code, e.message)
+        except (KeyError, ValueError) as e:
+            status = 400
+            self._sendError(tile.viewId, tile.tileId, 400, f"malformed tile request: {e}")
+        finally:
+            if self.tiles.get(tile.key) is tile:
+                del self.tiles[tile.key]
+            metrics.observe("tiles", status, timer, sentBytes=sentBytes)
+
+    def _sendJson(self, msg):
+        try:
+            self.write_message(orjson_encode(msg).decode())
+        except WebSocketClosedError:
+            pass
+
+    def _sendError(self, viewId, tileId, status, message):
+        self._sendJson(dict((("message", message), ("status", status), ("tile", tileId), ("type", "error"), ("view", viewId))))
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import json
+import threading
+from h5grove.encoders import orjson_encode
+
+__all__ = ["HANDLER_PARAMS", "TRACE_PARAMS", "TraceRecorder", "readTrace", "traceRecorder"]
+
+# the request params kept in a trace, in addition to the endpoint, path, and uri
+TRACE_PARAMS = ("attr_keys", "columnar", "dtype", "fields", "ixstr", "limit", "min_ndim", "mode", "offset", "precision", "q", "shuffle", "stream", "subixstr")
+# the traced params that only change how the handler sends the response, and aren't passed on to the manager
+HANDLER_PARAMS = ("shuffle", "stream")
+
+
+class TraceRecorder:
+    """Appends a record of every request to a trace file, one json object
+    per line, for later replay. Does nothing unless given a file
+    """
+
+    def __init__(self, fpath=""):
+        self._lock = threading.Lock()
+        self._f = None
+        self.fpath = ""
+        self.configure(fpath)
+
+    def configure(self, fpath):
+        with self._lock:
+            if fpath == self.fpath:
+                return
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+            self.fpath = fpath
+            if fpath:
+                self._f = open(fpath, "ab")
+
+    @property
+    def enabled(self):
+        return self._f is not None
+
+    def record(self, endpoint, path, uri, params, start, elapsed, status, sentBytes=0):
+        """Write one request to the trace. start is the request's wall clock
+        time in seconds, elapsed is its duration in seconds
+        """
+        if self._f is None:
+            return
+
+        rec = dict(
+            (
+                ("bytes", sentBytes),
+                ("endpoint", endpoint),
+                ("ms", round(elapsed * 1000, 3)),
+                ("path", path),
+                ("status", status),
+                ("t", round(start, 6)),
+                ("uri", uri),
+            )
+        )
+        # leave out unset params, to keep the trace compact
+        rec.update((k, params[k]) for k in TRACE_PARAMS if params.get(k) is not None)
+        line = orjson_encode(dict(sorted(rec.items()))) + b"\n"
+        with self._lock:
+            if self._f is not None:
+                self._f.write(line)
+                self._f.flush()
+
+    def close(self):
+        self.configure("")
+
+
+def readTrace(fpath):
+    """Yield the records of a trace file, in the order they were written"""
+    with open(fpath, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+traceRecorder = TraceRecorder()
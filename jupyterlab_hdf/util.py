@@ -5,12 +5,42 @@
 
 import ast
 import h5py
+import os
 import re
+import threading
 import numpy as np
 
 from .exception import JhdfError
-
-__all__ = ["atleast_nd", "attrMetaDict", "dsetChunk", "hobjType", "jsonize", "parseIndex", "parseSubindex", "slicelen", "shapemeta", "uriJoin"]
+from .metrics import countRead, phase
+
+__all__ = [
+    "REDUCED_DTYPES",
+    "atleast_nd",
+    "attrMetaDict",
+    "complexPairs",
+    "dsetChunk",
+    "dsetIndex",
+    "dsetStorageMeta",
+    "fieldColumns",
+    "fieldsDtype",
+    "fileIdentity",
+    "hobjType",
+    "ixBlock",
+    "ixShape",
+    "ixSize",
+    "jsonize",
+    "packStrings",
+    "parseIndex",
+    "parseSubindex",
+    "reduceFloats",
+    "reduction",
+    "roundSignificant",
+    "shortestFloats",
+    "slicelen",
+    "shapemeta",
+    "stringList",
+    "uriJoin",
+]
 
 
 ## array handling
@@ -37,7 +67,7 @@ def atleast_nd(ary, ndim, pos=0):
         so for example a 2-D array of shape ``(M, N)`` becomes a view of
         shape ``(M, N, 1, 1)`` when ``ndim=4``.
     """
-    ary = np.array(ary, copy=False, subok=True)
+    ary = np.asanyarray(ary)
     if ary.ndim:
         pos = np.core.multiarray.normalize_axis_index(pos, ary.ndim + 1)
     extra = ndim - ary.ndim
@@ -48,14 +78,16 @@ def atleast_nd(ary, ndim, pos=0):
 
 
 ## chunk handling
-def dsetChunk(dset, ixstr=None, subixstr=None, min_ndim=None):
-    if ixstr is None:
-        chunk = dset[...]
-    elif subixstr is None:
-        chunk = dset[parseIndex(ixstr)]
-    else:
-        validateSubindex(dset.shape, dset.size, ixstr, subixstr)
-        chunk = dset[parseSubindex(dset.shape, dset.size, ixstr, subixstr)]
+def dsetChunk(dset, ixstr=None, subixstr=None, min_ndim=None, block=None, fields=None):
+    with phase("index"):
+        ix = dsetIndex(dset.shape, dset.size, ixstr=ixstr, subixstr=subixstr)
+        if block is not None:
+            ix = ixBlock(dset.shape, ix, *block)
+
+    with phase("read"):
+        # with fields, HDF5 only reads (and converts) the selected fields of each record
+        chunk = dset[ix] if fields is None else dset.fields(list(fields))[ix]
+    countRead(chunk)
 
     if min_ndim is not None:
         chunk = atleast_nd(chunk, min_ndim, pos=-1)
@@ -63,6 +95,99 @@ def dsetChunk(dset, ixstr=None, subixstr=None, min_ndim=None):
     return chunk
 
 
+def fieldColumns(chunk):
+    """A chunk of compound data as one array per field, keyed by field name, in
+    field order. Complex data gets split into its real and imaginary planes
+    """
+    if isinstance(chunk, h5py.Empty):
+        return chunk
+    if chunk.dtype.kind == "c":
+        return dict((("real", chunk.real), ("imag", chunk.imag)))
+    return dict((name, chunk[name]) for name in chunk.dtype.names)
+
+
+def fieldsDtype(dtype, fields=None, columnar=None):
+    """The dtype that a data request with the given fields (names of fields of a
+    compound dtype) and columnar flag reads dtype as: just the selected fields,
+    packed, in the order given. Complex data read in columnar layout comes as
+    real and imaginary planes. Raises a JhdfError if the request doesn't fit dtype
+    """
+    if columnar and fields is None and dtype.kind == "c":
+        part = np.dtype(f"{dtype.byteorder}f{dtype.itemsize // 2}")
+        return np.dtype([("real", part), ("imag", part)])
+    if (fields is not None or columnar) and dtype.names is None:
+        msg = dict(
+            (
+                ("message", f"fields only apply to compound datasets, and columnar to compound and complex ones, not to dtype {dtype.str}."),
+                ("debugVars", {"columnar": columnar, "dtype": dtype.str, "fields": fields}),
+            )
+        )
+        raise JhdfError(msg)
+    if fields is None:
+        return dtype
+
+    unknown = [name for name in fields if name not in dtype.names]
+    if unknown or not fields or len(set(fields)) != len(fields):
+        msg = dict(
+            (
+                ("message", f"malformed fields: should be distinct names of fields of the dataset, which are {', '.join(dtype.names)}."),
+                ("debugVars", {"fields": fields, "unknown": unknown}),
+            )
+        )
+        raise JhdfError(msg)
+    return np.dtype([(name, dtype[name]) for name in fields])
+
+
+def dsetIndex(shape, size, ixstr=None, subixstr=None):
+    """The index into a dataset that a data request resolves to"""
+    if ixstr is None:
+        return ...
+    elif subixstr is None:
+        return parseIndex(ixstr)
+    else:
+        validateSubindex(shape, size, ixstr, subixstr)
+        return parseSubindex(shape, size, ixstr, subixstr)
+
+
+def ixNormalize(shape, ix):
+    """Index ix, expanded to one int or slice per dimension of shape"""
+    if ix is ...:
+        ix = ()
+    elif not isinstance(ix, tuple):
+        ix = (ix,)
+
+    for i, dix in enumerate(ix):
+        if dix is ...:
+            ix = ix[:i] + (slice(None),) * (len(shape) - len(ix) + 1) + ix[i + 1 :]
+            break
+
+    return tuple(ix[d] if d < len(ix) else slice(None) for d in range(len(shape)))
+
+
+def ixShape(shape, ix):
+    """Shape of the result of applying index ix to an array of the given shape"""
+    return tuple(slicelen(dix, dlen) for dix, dlen in zip(ixNormalize(shape, ix), shape) if isinstance(dix, slice))
+
+
+def ixSize(shape, ix):
+    """Count of elements selected by applying index ix to an array of the given shape"""
+    return int(np.prod(ixShape(shape, ix), dtype=np.int64))
+
+
+def ixBlock(shape, ix, start, stop):
+    """The part of index ix that selects only rows start:stop of its result,
+    where rows run along the result's first axis
+    """
+    ix = ixNormalize(shape, ix)
+    for d, dix in enumerate(ix):
+        if isinstance(dix, slice):
+            dstart, dstop, dstep = dix.indices(shape[d])
+            return ix[:d] + (slice(dstart + start * dstep, min(dstop, dstart + stop * dstep), dstep),) + ix[d + 1 :]
+
+    # the result is a scalar, which can't be split
+    return ix
+
+
 def hobjType(hobj):
     if isinstance(hobj, h5py.Dataset):
         return "dataset"
@@ -82,7 +207,96 @@ def attrMetaDict(attrId):
     )
 
 
+## storage handling
+_layoutNames = {
+    h5py.h5d.COMPACT: "compact",
+    h5py.h5d.CONTIGUOUS: "contiguous",
+    h5py.h5d.CHUNKED: "chunked",
+    h5py.h5d.VIRTUAL: "virtual",
+}
+
+# edge length of the blocks fetched by the dataset grid (see `_blockSize` in src/dataset.ts)
+TILE_SIZE = 100
+
+
+def dsetStorageMeta(dset, tileSize=TILE_SIZE):
+    """Describe how a dataset is laid out on disk, and estimate what a
+    single grid tile read costs. Only reads the dataset's creation
+    property list and chunk index, never the data itself
+    """
+    plist = dset.id.get_create_plist()
+    layout = _layoutNames.get(plist.get_layout(), "other")
+    filters = [
+        dict(
+            (
+                ("id", fid),
+                ("name", fname.decode(errors="replace")),
+                ("options", list(fopts)),
+            )
+        )
+        for fid, _, fopts, fname in (plist.get_filter(i) for i in range(plist.get_nfilters()))
+    ]
+
+    itemsize = dset.dtype.itemsize
+    logicalSize = 0 if dset.shape is None else dset.size * itemsize
+    storageSize = dset.id.get_storage_size()
+
+    meta = dict(
+        (
+            ("allocatedChunks", None),
+            ("chunks", dset.chunks),
+            ("compressionRatio", logicalSize / storageSize if storageSize else None),
+            ("filters", filters),
+            ("layout", layout),
+            ("logicalSize", logicalSize),
+            ("storageSize", storageSize),
+            ("tileChunks", None),
+            ("tileReadBytes", None),
+            ("tileShape", None),
+        )
+    )
+
+    if dset.shape is None or not dset.shape:
+        return meta
+
+    tile = tileShape(dset.shape, tileSize)
+    meta["tileShape"] = tile
+    if dset.chunks is None:
+        # contiguous and compact datasets are read with exactly one I/O per tile row
+        meta["tileReadBytes"] = int(np.prod(tile)) * itemsize
+        return meta
+
+    meta["allocatedChunks"] = dset.id.get_num_chunks()
+    meta["tileChunks"] = tileChunkCount(dset.shape, dset.chunks, tile)
+    meta["tileReadBytes"] = int(meta["tileChunks"] * np.prod(dset.chunks) * itemsize)
+    return meta
+
+
+def tileShape(shape, tileSize=TILE_SIZE):
+    """The shape of a typical grid tile: a tileSize x tileSize block spanning
+    the last (at most two) dimensions, with every other index held fixed
+    """
+    nvis = min(2, len(shape))
+    return tuple(1 for _ in shape[: len(shape) - nvis]) + tuple(min(tileSize, n) for n in shape[len(shape) - nvis :])
+
+
+def tileChunkCount(shape, chunks, tile):
+    """Expected number of chunks touched by a read of shape `tile` at a
+    random offset. Along each dimension a run of t elements crosses on
+    average 1 + (t - 1)/c chunks of length c, bounded by the chunk count
+    """
+    count = 1.0
+    for n, c, t in zip(shape, chunks, tile):
+        count *= min(1 + (t - 1) / c, -(-n // c))
+    return count
+
+
 ## index parsing and handling
+# some versions of cpython (eg 3.11.7) can fail to build an ast in one thread while another
+# thread builds one too, and index strings are parsed by several reader threads at once
+_parseLock = threading.Lock()
+
+
 class _Guard:
     def __init__(self):
         self.val = False
@@ -103,7 +317,8 @@ def parseIndex(node_or_string):
         if "," not in node_or_string:
             # handle ndim <= 1 case
             node_or_string += ","
-        node_or_string = ast.parse("dummy[{}]".format(node_or_string.lstrip(" \t")), mode="eval")
+        with _parseLock:
+            node_or_string = ast.parse("dummy[{}]".format(node_or_string.lstrip(" \t")), mode="eval")
     if isinstance(node_or_string, ast.Expression):
         node_or_string = node_or_string.body
     if isinstance(node_or_string, ast.Subscript):
@@ -249,11 +464,187 @@ def validateSubindex(shape, size, ixstr, subixstr):
         raise JhdfError(msg)
 
 
+## precision handling
+# the dtypes that data requests can cast float data to, for display
+REDUCED_DTYPES = dict((("float16", np.float16), ("float32", np.float32)))
+
+
+def reduction(dtype, reduce=None, precision=None):
+    """The dtype that data of dtype is read as by a data request that asks for
+    floats to be cast to reduce (a key of REDUCED_DTYPES) and/or rounded to
+    precision significant digits, along with the transforms that apply to it,
+    as a dict (None if none do). Only float and complex data get reduced
+    """
+    if reduce is not None and reduce not in REDUCED_DTYPES:
+        msg = dict(
+            (
+                ("message", f"malformed dtype: should be one of {', '.join(REDUCED_DTYPES)}."),
+                ("debugVars", {"dtype": reduce}),
+            )
+        )
+        raise JhdfError(msg)
+    if precision is not None and not 1 <= precision <= 17:
+        msg = dict(
+            (
+                ("message", "malformed precision: should be a count of significant digits, from 1 to 17."),
+                ("debugVars", {"precision": precision}),
+            )
+        )
+        raise JhdfError(msg)
+    if dtype.kind not in "fc":
+        return dtype, None
+
+    transform = dict()
+    if reduce is not None:
+        # there's no complex float16
+        target = np.dtype(np.complex64 if dtype.kind == "c" else REDUCED_DTYPES[reduce])
+        if target.itemsize < dtype.itemsize:
+            dtype = target
+            transform["dtype"] = target.str
+    if precision is not None:
+        transform["precision"] = precision
+    return dtype, transform or None
+
+
+def roundSignificant(ary, digits):
+    """Float or complex data rounded to digits significant digits, as float64
+    (or complex128). Values too small to scale up (below ~1e-300) are left as is
+    """
+    ary = np.asarray(ary)
+    if ary.dtype.kind == "c":
+        return roundSignificant(ary.real, digits) + 1j * roundSignificant(ary.imag, digits)
+
+    x = ary.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        shift = digits - 1 - np.floor(np.log10(np.abs(x)))
+        keep = ~np.isfinite(shift) | (shift > 300)
+        shift = np.where(keep, 0, shift)
+        # scale by exact powers of ten, multiplying or dividing depending on the sign of the shift
+        scale = 10.0 ** np.abs(shift)
+        rounded = np.where(shift >= 0, np.round(x * scale) / scale, np.round(x / scale) * scale)
+    # rounding up values close to the float64 max can overflow, those are left as is too
+    return np.where(keep | ~np.isfinite(rounded), x, rounded)
+
+
+def reduceFloats(chunk, dtype, precision=None):
+    """A chunk of float or complex data, rounded to precision significant digits,
+    then cast to dtype. Raises a JhdfError if finite values are too large for dtype
+    """
+    if isinstance(chunk, h5py.Empty):
+        return chunk
+    if precision is not None:
+        chunk = roundSignificant(chunk, precision)
+    chunk = np.asarray(chunk)
+    with np.errstate(over="ignore"):
+        reduced = chunk.astype(dtype, copy=False)
+    # finite values that came out infinite overflowed (.imag of real data is all zeros)
+    overflow = (np.isinf(reduced.real) & np.isfinite(chunk.real)) | (np.isinf(reduced.imag) & np.isfinite(chunk.imag))
+    if np.any(overflow):
+        msg = dict(
+            (
+                ("message", f"values out of range: some values are too large for dtype {np.dtype(dtype).name}, ask for a wider one."),
+                ("debugVars", {"dtype": np.dtype(dtype).str}),
+            )
+        )
+        raise JhdfError(msg)
+    # [()] keeps scalars scalars
+    return reduced[()]
+
+
+def shortestFloats(v, precision=None):
+    """Reduced data (see reduceFloats) made json-ready without more digits than its
+    precision holds: float32 is left for orjson, which prints it with the fewest
+    digits that tell float32 values apart, while float16, which orjson can't
+    print, goes as float64 rounded to at most 5 significant digits (enough to
+    tell float16 values apart)
+    """
+    if isinstance(v, dict):
+        return dict((k, shortestFloats(w, precision)) for k, w in v.items())
+    if not isinstance(v, (np.ndarray, np.generic)) or not v.ndim or v.dtype.kind not in "fc" or v.dtype.itemsize > (8 if v.dtype.kind == "c" else 4):
+        # 0-d and float64 data have nothing to gain (float64 rounded to a precision prints short already)
+        return jsonize(v)
+
+    if v.dtype.kind == "c":
+        pairs = np.empty(v.shape + (2,), dtype=np.float32)
+        pairs[..., 0] = v.real
+        pairs[..., 1] = v.imag
+        return pairs
+    if v.dtype.itemsize == 2:
+        return roundSignificant(v, min(precision or 5, 5))
+    return np.ascontiguousarray(v, dtype=np.float32)
+
+
+## string handling
+def stringList(ary):
+    """An array of fixed or variable length strings as (nested) lists of str.
+    Decodes every string in one pass over the flattened array, which is several
+    times faster than walking the array element by element
+    """
+    if not ary.size:
+        return ary.tolist()
+
+    strings = [s.decode() if isinstance(s, bytes) else s for s in ary.ravel().tolist()]
+    if not ary.ndim:
+        return strings[0]
+    for n in ary.shape[:0:-1]:
+        strings = [strings[i : i + n] for i in range(0, len(strings), n)]
+    return strings
+
+
+def packStrings(ary):
+    """An array of fixed or variable length strings, packed as bytes: the byte
+    length of each string (4 bytes, little-endian) followed by its bytes, in C
+    order. The strings are sent as stored, without decoding them
+    """
+    ary = np.asarray(ary)
+    if ary.dtype.kind == "S":
+        # fixed length: lay each string out after its length, then drop the padding
+        width = ary.dtype.itemsize
+        lengths = np.char.str_len(ary).ravel().astype("<u4")
+        rows = np.empty((lengths.size, 4 + width), dtype=np.uint8)
+        rows[:, :4] = lengths.view(np.uint8).reshape(-1, 4)
+        rows[:, 4:] = np.ascontiguousarray(ary).reshape(-1).view(np.uint8).reshape(-1, width)
+        return rows[np.arange(4 + width) < 4 + lengths[:, None]].tobytes()
+
+    # variable length: scatter the lengths and the joined strings into place
+    items = [s.encode() if isinstance(s, str) else s for s in ary.ravel().tolist()]
+    lengths = np.fromiter(map(len, items), dtype="<u4", count=len(items))
+    starts = np.cumsum(4 + lengths.astype(np.int64)) - (4 + lengths)
+    prefixes = (starts[:, None] + np.arange(4)).ravel()
+    packed = np.empty(4 * len(items) + int(lengths.sum(dtype=np.int64)), dtype=np.uint8)
+    isString = np.ones(packed.size, dtype=bool)
+    isString[prefixes] = False
+    packed[prefixes] = lengths.view(np.uint8)
+    packed[isString] = np.frombuffer(b"".join(items), dtype=np.uint8)
+    return packed.tobytes()
+
+
 ## json handling
+def complexPairs(ary):
+    """A complex array as a float64 array of [real, imag] pairs (ie with one more
+    dimension, of length 2), which orjson serializes natively
+    """
+    pairs = np.empty(ary.shape + (2,), dtype=np.float64)
+    pairs[..., 0] = ary.real
+    pairs[..., 1] = ary.imag
+    return pairs
+
+
 def jsonize(v):
-    """Turns a value into a JSON serializable version"""
+    """Turns a value into a JSON serializable version. Float and complex arrays
+    are left as float64 arrays, for orjson to serialize natively (with
+    OPT_SERIALIZE_NUMPY, as h5grove's orjson_encode does), which gives the same
+    json as their tolist() several times faster
+    """
     if isinstance(v, (int, float, str)) or v is None:
         return v
+    if isinstance(v, np.ndarray) and h5py.check_string_dtype(v.dtype) is not None:
+        return stringList(v)
+    # orjson can't serialize 0-d arrays, which are left to tolist()
+    if isinstance(v, np.ndarray) and v.ndim and v.dtype.kind == "f" and v.dtype.itemsize <= 8:
+        return np.ascontiguousarray(v, dtype=np.float64)
+    if isinstance(v, np.ndarray) and v.ndim and v.dtype.kind == "c" and v.dtype.itemsize <= 16:
+        return complexPairs(v)
     if isinstance(v, bytes):
         return v.decode()
     if isinstance(v, dict):
@@ -277,6 +668,19 @@ def jsonize(v):
     raise TypeError("Cannot jsonize {}".format(type(v)))
 
 
+## file handling
+def fileIdentity(fpath):
+    """A tuple that changes whenever the file at fpath is replaced or rewritten,
+    or None if the file can't be stat'ed
+    """
+    try:
+        st = os.stat(fpath)
+    except OSError:
+        return None
+
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
 ## uri handling
 _emptyUriRe = re.compile("//")
 
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import time
+
+from .util import fileIdentity
+
+__all__ = ["FileWatcher", "fileWatcher"]
+
+WATCH_MODES = ("auto", "inotify", "off", "poll")
+
+# filesystems whose changes made on other machines never show up as inotify events
+NETWORK_FS = ("9p", "afs", "ceph", "cifs", "fuse", "gpfs", "lustre", "nfs", "nfs4", "smb3", "smbfs")
+
+# inotify(7) event masks
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+# a watch is put on the dir of each watched file, so that files replaced by a rename are caught too
+DIR_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+_eventHeader = struct.Struct("iIII")
+
+
+class Inotify:
+    """Minimal ctypes binding of the Linux inotify api, watching dirs"""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def addWatch(self, dpath):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dpath), DIR_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {dpath}")
+        return wd
+
+    def rmWatch(self, wd):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout):
+        """Yield (wd, mask, name) for every event that arrives within timeout seconds"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        pos = 0
+        while pos < len(buf):
+            wd, mask, _, nameLen = _eventHeader.unpack_from(buf, pos)
+            pos += _eventHeader.size
+            name = os.fsdecode(buf[pos : pos + nameLen].rstrip(b"\0"))
+            pos += nameLen
+            yield wd, mask, name
+
+    def close(self):
+        os.close(self.fd)
+
+
+def mountType(fpath):
+    """The filesystem type of the mount holding fpath, or None if unknown"""
+    try:
+        with open("/proc/self/mounts") as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return None
+    fpath = os.path.realpath(fpath)
+    best, fsType = "", None
+    for mountPoint, tipe in mounts:
+        mountPoint = mountPoint.replace("\\040", " ")
+        if (fpath == mountPoint or fpath.startswith(mountPoint.rstrip("/") + "/")) and len(mountPoint) >= len(best):
+            best, fsType = mountPoint, tipe
+    return fsType
+
+
+class _Watched:
+    """A file being watched, and its last known identity"""
+
+    def __init__(self, fpath, polled):
+        self.fpath = fpath
+        self.polled = polled
+        self.fident = None
+        # bumped on every change, so that a stat racing with a change is never cached
+        self.generation = 0
+        self.lastUsed = time.monotonic()
+
+
+class FileWatcher:
+    """Keeps track of the identity (see util.fileIdentity) of the files that
+    the server is serving, so that requests needn't stat them over and over.
+    Files are watched with inotify where possible, else (or on network
+    filesystems, whose remote changes inotify can't see) by a background
+    thread that stats each of them every `interval` seconds. Files that
+    haven't been asked about for `idle` seconds stop being watched.
+
+    Callbacks given to subscribe are called with the path of every file that
+    changed, from the watcher's thread
+    """
+
+    def __init__(self, mode="auto", interval=1.0, idle=300.0, log=None):
+        self.mode = mode
+        self.interval = interval
+        self.idle = idle
+        self.log = log or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._files = dict()
+        self._dirs = dict()
+        self._wds = dict()
+        self._subscribers = []
+        self._inotify = None
+        self._thread = None
+        self._closed = False
+        self._fsTypes = dict()
+
+        self.hits = 0
+        self.misses = 0
+        self.changes = 0
+
+    def configure(self, mode=None, interval=None, idle=None):
+        with self._lock:
+            if mode is not None:
+                if mode not in WATCH_MODES:
+                    raise ValueError(f"unknown watch mode {mode!r}, should be one of {', '.join(WATCH_MODES)}")
+                self.mode = mode
+                self._files.clear()
+            if interval is not None:
+                self.interval = interval
+            if idle is not None:
+                self.idle = idle
+
+    @property
+    def enabled(self):
+        return self.mode != "off"
+
+    def identity(self, fpath):
+        """The identity of the file at fpath (None if it can't be stat'ed), from
+        the watcher's records if the file is being watched
+        """
+        if not self.enabled:
+            return fileIdentity(fpath)
+
+        fpath = os.path.abspath(fpath)
+        with self._lock:
+            watched = self._files.get(fpath)
+            if watched is not None:
+                watched.lastUsed = time.monotonic()
+                if watched.fident is not None:
+                    self.hits += 1
+                    return watched.fident
+            self.misses += 1
+        if watched is None:
+            watched = self._watch(fpath)
+
+        # stat only once the watch is in place, so that no change can slip in between
+        generation = watched.generation
+        fident = fileIdentity(fpath)
+        with self._lock:
+            if watched.generation == generation and fident is not None:
+                watched.fident = fident
+        return fident
+
+    def invalidate(self, fpath, notify=True):
+        """Forget the identity of the file at fpath, eg after writing to it"""
+        fpath = os.path.abspath(fpath)
+        with self._lock:
+            watched = self._files.get(fpath)
+            if watched is not None:
+                watched.fident = None
+                watched.generation += 1
+            self.changes += 1
+            subscribers = list(self._subscribers)
+        if notify:
+            for callback in subscribers:
+                try:
+                    callback(fpath)
+                except Exception:
+                    self.log.exception(f"error handling a change of {fpath}")
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                (
+                    ("changes", self.changes),
+                    ("hits", self.hits),
+                    ("misses", self.misses),
+                    ("mode", self.mode),
+                    ("polled", sum(watched.polled for watched in self._files.values())),
+                    ("watched", len(self._files)),
+                )
+            )
+
+    def _usePolling(self, fpath):
+        if self.mode == "poll":
+            return True
+        if self._inotify is None:
+            try:
+                self._inotify = Inotify()
+            except (AttributeError, OSError) as e:
+                # AttributeError if libc has no inotify, ie not on linux
+                self.log.info(f"inotify is not available ({e}), watching hdf5 files by polling instead")
+                self.mode = "poll"
+                return True
+        if self.mode == "inotify":
+            return False
+
+        dpath = os.path.dirname(fpath)
+        if dpath not in self._fsTypes:
+            self._fsTypes[dpath] = mountType(dpath)
+        return self._fsTypes[dpath] in NETWORK_FS
+
+    def _watch(self, fpath):
+        with self._lock:
+            watched = self._files.get(fpath)
+            if watched is not None:
+                return watched
+            polled = self._usePolling(fpath)
+            watched = self._files[fpath] = _Watched(fpath, polled)
+            if not polled:
+                dpath = os.path.dirname(fpath)
+                if dpath not in self._dirs:
+                    try:
+                        wd = self._inotify.addWatch(dpath)
+                    except OSError as e:
+                        # eg out of inotify watches
+                        self.log.warning(f"couldn't watch {dpath} with inotify ({e}), polling it instead")
+                        watched.polled = True
+                    else:
+                        self._dirs[dpath] = wd
+                        self._wds[wd] = dpath
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="jhdf-watch", daemon=True)
+                self._thread.start()
+            return watched
+
+    def close(self):
+        """Stop watching any files"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def _run(self):
+        lastPoll = lastSweep = time.monotonic()
+        while not self._closed:
+            try:
+                changed = set()
+                if self._inotify is not None and self._wds:
+                    for wd, mask, name in self._inotify.read(min(self.interval, 1.0)):
+                        changed.update(self._changedBy(wd, mask, name))
+                else:
+                    time.sleep(min(self.interval, 1.0))
+
+                now = time.monotonic()
+                if now - lastPoll >= self.interval:
+                    lastPoll = now
+                    changed.update(self._poll())
+                if now - lastSweep >= min(self.idle, 60.0):
+                    lastSweep = now
+                    self._sweep(now)
+
+                for fpath in changed:
+                    self.invalidate(fpath)
+            except Exception:
+                self.log.exception("error watching hdf5 files")
+                time.sleep(1.0)
+
+    def _changedBy(self, wd, mask, name):
+        """The watched files that an inotify event tells of a change to"""
+        with self._lock:
+            if mask & IN_Q_OVERFLOW:
+                # events were lost, so anything may have changed
+                return list(self._files)
+            dpath = self._wds.get(wd)
+            if dpath is None:
+                return []
+            if mask & IN_IGNORED:
+                # the dir itself is gone
+                self._wds.pop(wd, None)
+                self._dirs.pop(dpath, None)
+            if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                return [fpath for fpath in self._files if os.path.dirname(fpath) == dpath]
+            fpath = os.path.join(dpath, name)
+            return [fpath] if fpath in self._files else []
+
+    def _poll(self):
+        with self._lock:
+            polled = [watched for watched in self._files.values() if watched.polled and watched.fident is not None]
+        return [watched.fpath for watched in polled if fileIdentity(watched.fpath) != watched.fident]
+
+    def _sweep(self, now):
+        """Stop watching the files that haven't been asked about in a while"""
+        with self._lock:
+            for fpath, watched in list(self._files.items()):
+                if now - watched.lastUsed > self.idle:
+                    del self._files[fpath]
+            used = {os.path.dirname(fpath) for fpath, watched in self._files.items() if not watched.polled}
+            for dpath in [dpath for dpath in self._dirs if dpath not in used]:
+                wd = self._dirs.pop(dpath)
+                self._wds.pop(wd, None)
+                self._inotify.rmWatch(wd)
+
+
+fileWatcher = FileWatcher()
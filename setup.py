@@ -45,12 +45,18 @@ setup_dict = dict(
         "tornado",
     ],
     extras_require={
+        "bench": [
+            "pytest-benchmark",
+        ],
         "dev": [
             "black",
             "bump2version",
             "pytest",
             "requests",
-        ]
+        ],
+        "zstd": [
+            "zstandard",
+        ],
     },
 )
 